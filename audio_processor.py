@@ -1,42 +1,58 @@
 import numpy as np
-import noisereduce as nr
-import librosa
-import io
-import soundfile as sf
 import gc
+import collections
+import time
+from streaming_denoiser import StreamingDenoiser
+from pcm_ring import PCMScratch
 
 class AudioProcessor:
-    def __init__(self, sample_rate=16000):
+    def __init__(self, sample_rate=16000, streaming=True, executor=None, metrics=None):
         """
-        Initialize audio processor with given sample rate
+        Initialize audio processor with given sample rate.
+        With streaming=True the noise spectrum is computed once and chunks are
+        filtered by a StreamingDenoiser that keeps STFT overlap between calls;
+        otherwise every chunk goes through noisereduce on its own.
+        If a DSPExecutor is given, processing runs on its worker lanes
+        instead of the event loop.
+        With metrics (metrics.ChannelMetrics) the time per chunk is recorded.
         """
         self.sample_rate = sample_rate
+        self.streaming = streaming
+        self.denoiser = None
+        self.executor = executor
+        self.executor_key = executor.new_key() if executor is not None else None
+        self.dsp_seconds = metrics.dsp_seconds if metrics is not None else None
         self.noise_sample = None
         self.noise_collected = False
         self.initial_chunks = []
         self.initial_chunks_duration = 0
         self.target_noise_duration = 1  # 1 second of noise for profile
         self.max_chunk_size = 32768  # Maximum chunk size to process (32KB)
+        # Preallocated conversion buffers; the noise-profile flush is the
+        # largest single output (max chunk plus one second of audio)
+        self._scratch = PCMScratch(
+            max_samples=self.max_chunk_size // 2 + sample_rate * self.target_noise_duration
+        )
 
     def _bytes_to_float_array(self, audio_bytes):
-        """Convert raw audio bytes to float array"""
+        """
+        Convert raw audio bytes (any bytes-like, e.g. a ring buffer view) to
+        a float array. The result is a reused scratch buffer, valid until the
+        next call.
+        """
         try:
-            # Convert bytes to numpy array (16-bit PCM)
-            audio_array = np.frombuffer(audio_bytes, dtype=np.int16)
-            # Convert to float32 and normalize to [-1, 1]
-            return audio_array.astype(np.float32) / 32768.0
+            return self._scratch.to_float(audio_bytes)
         except Exception as e:
             print(f"Error converting bytes to float array: {e}")
             return None
 
     def _float_array_to_bytes(self, audio_array):
-        """Convert float array back to bytes"""
+        """
+        Convert float array back to 16-bit PCM. The array is clipped in
+        place and the result is a memoryview of a rotating output slot.
+        """
         try:
-            # Ensure the array is within [-1, 1]
-            audio_array = np.clip(audio_array, -1, 1)
-            # Convert to 16-bit PCM
-            audio_int = (audio_array * 32768).astype(np.int16)
-            return audio_int.tobytes()
+            return self._scratch.to_pcm(audio_array)
         except Exception as e:
             print(f"Error converting float array to bytes: {e}")
             return None
@@ -44,8 +60,55 @@ class AudioProcessor:
     async def process_chunk(self, chunk):
         """
         Process an audio chunk with noise reduction
-        Returns processed audio chunk or None if still collecting noise profile
+        Returns processed audio chunk or None if still collecting noise profile.
+        The result is a bytes-like memoryview that stays valid for the next
+        few calls (see PCMScratch); copy it if it must be kept longer.
+        """
+        if not chunk:
+            return None
+        if self.executor is not None:
+            return await self.executor.submit_chunk(self, chunk)
+        return self.process_chunk_sync(chunk)
+
+    async def process_stream(self, chunks):
+        """
+        Process an async iterable of chunks and yield the non-empty results in
+        order. With an executor, up to max_in_flight chunks are processed
+        while the next ones are being read.
         """
+        dsp_seconds = self.dsp_seconds
+        if self.executor is None:
+            async for chunk in chunks:
+                started = time.perf_counter()
+                processed = self.process_chunk_sync(chunk)
+                if dsp_seconds is not None:
+                    dsp_seconds.observe(time.perf_counter() - started)
+                if processed is not None:
+                    yield processed
+            return
+
+        # Submit times of the chunks in flight; results come back in order
+        submitted = collections.deque()
+
+        def submit(chunk):
+            submitted.append(time.perf_counter())
+            return self.executor.submit_chunk(self, chunk)
+
+        async for processed in self.executor.map_ordered(submit, chunks):
+            started = submitted.popleft()
+            if dsp_seconds is not None:
+                dsp_seconds.observe(time.perf_counter() - started)
+            if processed is not None:
+                yield processed
+
+    async def drain(self):
+        """Flush held-back audio, on the executor if one is used"""
+        if self.executor is not None:
+            return await self.executor.submit_flush(self)
+        return self.flush()
+
+    def process_chunk_sync(self, chunk):
+        """Blocking implementation of process_chunk"""
         if not chunk:
             return None
 
@@ -62,7 +125,7 @@ class AudioProcessor:
 
             if not self.noise_collected:
                 # Collect initial audio for noise profile
-                self.initial_chunks.append(audio_array)
+                self.initial_chunks.append(audio_array.copy())
                 chunk_duration = len(audio_array) / self.sample_rate
                 self.initial_chunks_duration += chunk_duration
 
@@ -71,6 +134,14 @@ class AudioProcessor:
                     try:
                         self.noise_sample = np.concatenate(self.initial_chunks)
                         self.noise_collected = True
+                        if self.streaming:
+                            self.denoiser = StreamingDenoiser(
+                                self.noise_sample,
+                                sample_rate=self.sample_rate,
+                                prop_decrease=0.75,
+                                n_fft=1024,
+                                hop_length=256
+                            )
                         print("Noise profile collected")
                         # Process and return the collected audio
                         processed_audio = self._process_with_noise_reduction(
@@ -78,27 +149,59 @@ class AudioProcessor:
                         )
                         self.initial_chunks = []  # Clear the buffer
                         gc.collect()  # Force garbage collection
-                        return self._float_array_to_bytes(processed_audio)
+                        return self._to_output(processed_audio)
                     except Exception as e:
                         print(f"Error processing noise profile: {e}")
-                        self.cleanup()
+                        self.reset()
                         return None
                 return None
 
             # Process chunk with noise reduction
             processed_audio = self._process_with_noise_reduction(audio_array)
-            return self._float_array_to_bytes(processed_audio)
+            return self._to_output(processed_audio)
 
         except Exception as e:
             print(f"Error processing audio chunk: {e}")
             return None
 
+    def _to_output(self, audio_array):
+        """Convert processed audio to bytes; None while the denoiser is still filling its latency"""
+        if audio_array is None or len(audio_array) == 0:
+            return None
+        return self._float_array_to_bytes(audio_array)
+
+    def flush(self):
+        """
+        Return the audio still held back by the streaming denoiser's latency
+        (or the uncollected noise-profile audio), or None if nothing is pending
+        """
+        if self.denoiser is not None:
+            return self._to_output(self.denoiser.flush())
+        if self.initial_chunks:
+            audio = np.concatenate(self.initial_chunks)
+            self.initial_chunks = []
+            self.initial_chunks_duration = 0
+            return self._to_output(audio)
+        return None
+
     def _process_with_noise_reduction(self, audio_array):
         """Apply noise reduction to audio array"""
         if self.noise_sample is None:
             return audio_array
 
+        if self.denoiser is not None:
+            try:
+                return self.denoiser.process(audio_array)
+            except Exception as e:
+                print(f"Error in streaming noise reduction: {e}")
+                self.denoiser.reset()
+                return audio_array
+
         try:
+            # Imported on first use: noisereduce pulls in scipy, which only
+            # the non-streaming path needs
+            import noisereduce as nr
+
             # Apply noise reduction with optimized parameters for streaming
             reduced_noise = nr.reduce_noise(
                 y=audio_array,
@@ -116,10 +219,17 @@ class AudioProcessor:
             print(f"Error in noise reduction: {e}")
             return audio_array  # Return original audio if noise reduction fails
 
-    def cleanup(self):
-        """Clean up resources and reset state"""
+    def reset(self):
+        """Drop the noise profile so a new one is collected from the next chunks"""
         self.noise_sample = None
         self.noise_collected = False
+        self.denoiser = None
         self.initial_chunks = []
         self.initial_chunks_duration = 0
         gc.collect()  # Force garbage collection
+
+    def cleanup(self):
+        """Clean up resources and reset state; the executor key is released, so call it at teardown only"""
+        self.reset()
+        if self.executor is not None:
+            self.executor.release(self)
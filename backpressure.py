@@ -0,0 +1,317 @@
+"""
+Bounded queues between the ingest, DSP and send stages of a live source,
+governed by a per-channel latency budget.
+
+Ingest copies decoded PCM into a queue as fast as the source delivers it;
+the DSP stage denoises into a small queue that the sender drains, so a
+slow sender holds back DSP (backpressure) and the delay accumulates where
+it can be measured. The delay of a chunk is the time since it was read
+from the source. While the delay exceeds the budget the pipeline degrades
+one step every `step_interval`:
+  1. skip_denoise  audio bypasses AudioProcessor
+  2. drop_silence  chunks without speech are dropped before DSP
+  3. shed_oldest   audio older than the budget is discarded
+and steps back once the delay has stayed below `recover_ratio` of the budget
+for `recover_interval` seconds.
+Dropped and shed audio are recorded in `timeline` (sent time -> source
+time) so caption times still refer to the source.
+
+Only meaningful for live sources: a file decoded faster than real time
+would look like a huge delay.
+"""
+
+import asyncio
+import collections
+import time
+from vad import TimelineMap, VoiceActivityGate
+
+NORMAL, SKIP_DENOISE, DROP_SILENCE, SHED_OLDEST = range(4)
+LEVELS = ('normal', 'skip_denoise', 'drop_silence', 'shed_oldest')
+
+
+class DegradationController:
+    """Per-channel latency budget -> degradation level, with counters"""
+
+    def __init__(self, budget=3.0, step_interval=2.0, recover_ratio=0.5, recover_interval=10.0,
+                 name='stream', metrics=None):
+        """
+        Args:
+            budget: maximum seconds between reading audio and sending it
+            step_interval: minimum seconds between level changes, so each
+                           step has time to take effect
+            recover_ratio: step back when the delay stays below budget * ratio
+            recover_interval: for this many seconds without interruption,
+                              so a cleared backlog does not flap straight back
+            name: label used in reports
+            metrics: optional metrics.ChannelMetrics
+        """
+        self.budget = budget
+        self.step_interval = step_interval
+        self.recover_ratio = recover_ratio
+        self.recover_interval = recover_interval
+        self.name = name
+        self.metrics = metrics
+        self.level = NORMAL
+        self.delay = 0.0
+        self.max_delay = 0.0
+        self.escalations = 0
+        self.skipped_denoise_chunks = 0
+        self.dropped_silence_seconds = 0.0
+        self.shed_seconds = 0.0
+        self._changed_at = None
+        self._low_since = None
+
+    def update(self, delay, now=None):
+        """Record the current delay; returns the (possibly changed) level"""
+        now = time.monotonic() if now is None else now
+        self.delay = delay
+        self.max_delay = max(self.max_delay, delay)
+        if self._changed_at is None:
+            self._changed_at = now
+        if delay < self.budget * self.recover_ratio:
+            if self._low_since is None:
+                self._low_since = now
+        else:
+            self._low_since = None
+        if now - self._changed_at < self.step_interval:
+            return self.level
+        if delay > self.budget and self.level < SHED_OLDEST:
+            self._set_level(self.level + 1, now)
+        elif (self.level > NORMAL and self._low_since is not None
+              and now - max(self._low_since, self._changed_at) >= self.recover_interval):
+            self._set_level(self.level - 1, now)
+        return self.level
+
+    def _set_level(self, level, now):
+        if level > self.level:
+            self.escalations += 1
+        print(f"[{self.name}] delay {self.delay:.2f}s (budget {self.budget:.1f}s): "
+              f"{LEVELS[self.level]} -> {LEVELS[level]}")
+        self.level = level
+        self._changed_at = now
+        if self.metrics is not None:
+            self.metrics.degradation_level.set(level)
+
+    def count_skipped_denoise(self):
+        self.skipped_denoise_chunks += 1
+        if self.metrics is not None:
+            self.metrics.skipped_denoise.inc()
+
+    def count_dropped_silence(self, seconds):
+        self.dropped_silence_seconds += seconds
+        if self.metrics is not None:
+            self.metrics.dropped_silence_seconds.inc(seconds)
+
+    def count_shed(self, seconds):
+        self.shed_seconds += seconds
+        if self.metrics is not None:
+            self.metrics.shed_seconds.inc(seconds)
+
+    def report(self):
+        return (f"[{self.name}] latency budget {self.budget:.1f}s: max delay {self.max_delay:.2f}s, "
+                f"{self.escalations} escalations, denoise skipped for {self.skipped_denoise_chunks} chunks, "
+                f"dropped {self.dropped_silence_seconds:.1f}s of silence, shed {self.shed_seconds:.1f}s")
+
+
+class AudioQueue:
+    """FIFO of (chunk, source_time, read_at) bounded by the audio it holds"""
+
+    def __init__(self, max_seconds, bytes_per_second=32000):
+        self.max_seconds = max_seconds
+        self.bytes_per_second = bytes_per_second
+        self.seconds = 0.0
+        self.closed = False
+        self._items = collections.deque()
+        self._changed = asyncio.Event()
+
+    def __len__(self):
+        return len(self._items)
+
+    def _notify(self):
+        self._changed.set()
+
+    async def _wait(self):
+        self._changed.clear()
+        await self._changed.wait()
+
+    def _append(self, chunk, source_time, read_at):
+        self._items.append((chunk, source_time, read_at))
+        self.seconds += len(chunk) / self.bytes_per_second
+        self._notify()
+
+    def put_nowait(self, chunk, source_time, read_at):
+        """Append; evicts the oldest audio beyond max_seconds and returns the seconds evicted"""
+        self._append(chunk, source_time, read_at)
+        evicted = 0.0
+        while self.seconds > self.max_seconds and len(self._items) > 1:
+            evicted += len(self._popleft()[0]) / self.bytes_per_second
+        return evicted
+
+    async def put(self, chunk, source_time, read_at):
+        """Append, waiting while the queue is full (never evicts)"""
+        while self.seconds >= self.max_seconds and self._items and not self.closed:
+            await self._wait()
+        self._append(chunk, source_time, read_at)
+
+    def _popleft(self):
+        item = self._items.popleft()
+        self.seconds -= len(item[0]) / self.bytes_per_second
+        return item
+
+    async def get(self):
+        """Next item, or None once the queue is closed and empty"""
+        while not self._items:
+            if self.closed:
+                return None
+            await self._wait()
+        item = self._popleft()
+        self._notify()
+        return item
+
+    def close(self):
+        self.closed = True
+        self._notify()
+
+
+class BackpressurePipeline:
+    """
+    Ingest -> DSP -> send for one source under a DegradationController.
+    Iterate chunks() to run it; it yields the audio to send.
+    """
+
+    def __init__(self, chunks, processor, controller, sample_rate=16000,
+                 max_queue_seconds=None, send_queue_seconds=1.0, timeline=None, metrics=None,
+                 source_clock=None):
+        """
+        Args:
+            chunks: async iterable of raw 16-bit mono PCM (e.g. ring buffer views)
+            processor: AudioProcessor for the DSP stage
+            controller: DegradationController with the channel's budget
+            max_queue_seconds: ingest queue bound, evicting the oldest audio
+                               (default: twice the budget, at least 10s)
+            send_queue_seconds: DSP -> send queue bound (blocks the DSP stage)
+            timeline: TimelineMap to record gaps in (default: a new one)
+            metrics: optional metrics.ChannelMetrics
+            source_clock: callable giving the source time of the chunk just
+                          received, when the source has gaps of its own
+                          (default: the audio received so far)
+        """
+        self.source = chunks
+        self.source_clock = source_clock
+        self.processor = processor
+        self.controller = controller
+        self.bytes_per_second = sample_rate * 2
+        self.metrics = metrics
+        if max_queue_seconds is None:
+            max_queue_seconds = max(10.0, 2 * controller.budget)
+        self.ingest_queue = AudioQueue(max_queue_seconds, self.bytes_per_second)
+        self.send_queue = AudioQueue(send_queue_seconds, self.bytes_per_second)
+        # Frame classifier for drop_silence; its noise floor only tracks
+        # the audio it is asked about
+        self.gate = VoiceActivityGate(sample_rate=sample_rate, mode='suppress')
+        self.timeline = timeline if timeline is not None else TimelineMap()
+
+    def _duration(self, chunk):
+        return len(chunk) / self.bytes_per_second
+
+    async def _ingest(self):
+        source_time = 0.0
+        try:
+            async for chunk in self.source:
+                if self.source_clock is not None:
+                    source_time = self.source_clock()
+                evicted = self.ingest_queue.put_nowait(bytes(chunk), source_time, time.monotonic())
+                if evicted:
+                    self.controller.count_shed(evicted)
+                source_time += self._duration(chunk)
+                if self.metrics is not None:
+                    self.metrics.queue_depth.set(len(self.ingest_queue))
+        finally:
+            self.ingest_queue.close()
+
+    async def _dsp(self):
+        controller = self.controller
+        denoising = True
+        out_time = 0.0      # source time of the next denoised output sample
+        in_time = None      # source time the next denoised input chunk should have
+        last_read = time.monotonic()
+        try:
+            while True:
+                item = await self.ingest_queue.get()
+                if item is None:
+                    break
+                chunk, source_time, read_at = item
+                last_read = read_at
+                delay = time.monotonic() - read_at
+                level = controller.update(delay)
+                duration = self._duration(chunk)
+                if level >= SHED_OLDEST and delay > controller.budget:
+                    controller.count_shed(duration)
+                    continue
+                if level >= DROP_SILENCE and not self.gate.has_speech(chunk):
+                    controller.count_dropped_silence(duration)
+                    continue
+                if level >= SKIP_DENOISE:
+                    if denoising:
+                        # Emit what the denoiser holds back before bypassing it
+                        tail = await self.processor.drain()
+                        if tail is not None and len(tail):
+                            await self.send_queue.put(bytes(tail), out_time, read_at)
+                        denoising = False
+                    controller.count_skipped_denoise()
+                    await self.send_queue.put(chunk, source_time, read_at)
+                    continue
+                if not denoising:
+                    denoising = True
+                    out_time = source_time
+                elif in_time is None or abs(source_time - in_time) > 1e-3:
+                    # Audio went missing upstream (evicted, shed, dropped, or a
+                    # source gap): flush what the denoiser holds so its output
+                    # restarts at the new source time and chunks() sees the gap
+                    if in_time is not None:
+                        tail = await self.processor.drain()
+                        if tail is not None and len(tail):
+                            await self.send_queue.put(bytes(tail), out_time, read_at)
+                    out_time = source_time
+                in_time = source_time + duration
+                processed = await self.processor.process_chunk(chunk)
+                if processed is not None and len(processed):
+                    await self.send_queue.put(bytes(processed), out_time, read_at)
+                    out_time += self._duration(processed)
+            if denoising:
+                tail = await self.processor.drain()
+                if tail is not None and len(tail):
+                    await self.send_queue.put(bytes(tail), out_time, last_read)
+        finally:
+            self.send_queue.close()
+
+    async def chunks(self):
+        """Run the stages and yield the audio to send, shedding audio over budget"""
+        tasks = [asyncio.create_task(self._ingest()), asyncio.create_task(self._dsp())]
+        controller = self.controller
+        sent = 0.0
+        expected = None
+        try:
+            while True:
+                item = await self.send_queue.get()
+                if item is None:
+                    break
+                chunk, source_time, read_at = item
+                delay = time.monotonic() - read_at
+                duration = self._duration(chunk)
+                if controller.update(delay) >= SHED_OLDEST and delay > controller.budget:
+                    controller.count_shed(duration)
+                    continue
+                if expected is None or abs(source_time - expected) > 1e-3:
+                    self.timeline.add(sent, source_time)
+                yield chunk
+                sent += duration
+                expected = source_time + duration
+            for task in tasks:
+                if task.done() and not task.cancelled() and task.exception() is not None:
+                    print(f"[{controller.name}] pipeline stage failed: {task.exception()}")
+        finally:
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            print(controller.report())
@@ -0,0 +1,262 @@
+"""
+Faster-than-real-time transcription of a directory of recorded audio.
+
+Every file is split at silences into pieces of roughly `target_seconds`.
+All pieces of all files are transcribed concurrently, with at most
+`max_sessions` Transcribe sessions open at once. Each piece is sent faster
+than real time (burst pacing). Piece results are shifted back by the
+piece's start time and stitched into one SRT per file.
+
+Usage: python batch_transcribe.py audios/ --output-dir captions/ [--max-sessions 8] [--endpoint URL]
+"""
+
+import argparse
+import asyncio
+import os
+import time
+import numpy as np
+import soundfile as sf
+from amazon_transcribe.handlers import TranscriptResultStreamHandler
+from caption_segmenter import CaptionSegmenter, Cue
+from pacer import Pacer
+from resampler import StreamingResampler
+from subtitle_sink import SubtitleSink
+from transcribe_audio import check_aws_credentials, create_client, SAMPLE_RATE, BYTES_PER_SAMPLE, CHUNK_SIZE
+
+BYTES_PER_SECOND = SAMPLE_RATE * BYTES_PER_SAMPLE
+AUDIO_EXTENSIONS = ('.wav', '.flac', '.ogg', '.mp3')
+DECODE_BLOCK_SECONDS = 1.0
+
+
+def _decoded_blocks(path):
+    """(sample_rate, iterator of float32 (frames, channels) blocks of about a second)"""
+    try:
+        info = sf.info(path)
+    except RuntimeError:
+        # Formats libsndfile cannot read (older builds and mp3) are decoded whole
+        import librosa
+        audio, sr = librosa.load(path, sr=None, mono=False)
+        audio = np.atleast_2d(audio).T
+        block = int(sr * DECODE_BLOCK_SECONDS)
+        return sr, (audio[i:i + block] for i in range(0, len(audio), block))
+    block = int(info.samplerate * DECODE_BLOCK_SECONDS)
+    return info.samplerate, sf.blocks(path, blocksize=block, dtype='float32', always_2d=True)
+
+
+def load_audio(path, sample_rate=SAMPLE_RATE):
+    """
+    Decode an audio file to mono 16-bit PCM bytes at sample_rate. Decoding,
+    downmix and resampling go block by block, so memory stays at the 16 kHz
+    output plus one block however long the file is.
+    """
+    sr, blocks = _decoded_blocks(path)
+    resampler = StreamingResampler(sr, sample_rate) if sr != sample_rate else None
+    out = []
+    for block in blocks:
+        audio = block.mean(axis=1)
+        if resampler is not None:
+            audio = resampler.process(audio)
+        out.append((np.clip(audio, -1, 32767 / 32768) * 32768).astype(np.int16).tobytes())
+    return b''.join(out)
+
+
+def _silent_runs(silent):
+    """(start, end) frame index pairs of runs of True"""
+    edges = np.diff(np.concatenate(([0], silent.astype(np.int8), [0])))
+    return list(zip(np.flatnonzero(edges == 1), np.flatnonzero(edges == -1)))
+
+
+def find_split_points(pcm, sample_rate=SAMPLE_RATE, target_seconds=60.0, max_seconds=120.0,
+                      min_silence=0.3, frame_ms=20, margin_db=10.0):
+    """
+    Split PCM into pieces of about target_seconds (never longer than
+    max_seconds), cutting in the middle of silences. A frame is silent when
+    it is within margin_db of the file's noise floor (10th percentile level).
+    Returns a list of (start_sample, end_sample).
+    """
+    samples = np.frombuffer(pcm, dtype=np.int16)
+    frame = int(sample_rate * frame_ms / 1000)
+    n_frames = len(samples) // frame
+    if n_frames == 0:
+        return [(0, len(samples))] if len(samples) else []
+    frames = samples[:n_frames * frame].reshape(n_frames, frame).astype(np.float32)
+    level = 10 * np.log10(np.mean(frames * frames, axis=1) + 1.0)
+    silent = level < np.percentile(level, 10) + margin_db
+
+    min_frames = int(min_silence * 1000 / frame_ms)
+    # Candidate cut points: centres of long enough silent runs, with their length
+    cuts = [((a + b) // 2, b - a) for a, b in _silent_runs(silent) if b - a >= min_frames]
+    per_second = 1000 / frame_ms
+
+    pieces = []
+    start = 0
+    while (n_frames - start) / per_second > max_seconds:
+        low = start + int(target_seconds * 0.5 * per_second)
+        high = start + int(max_seconds * per_second)
+        target = start + int(target_seconds * per_second)
+        window = [c for c in cuts if low <= c[0] <= high]
+        if window:
+            # Prefer long silences close to the target length
+            cut = max(window, key=lambda c: c[1] - abs(c[0] - target) / per_second)[0]
+        else:
+            cut = high
+        pieces.append((start * frame, cut * frame))
+        start = cut
+    pieces.append((start * frame, len(samples)))
+    return pieces
+
+
+class _ResultCollector(TranscriptResultStreamHandler):
+    def __init__(self, transcript_result_stream, offset):
+        super().__init__(transcript_result_stream)
+        self.offset = offset
+        self.segmenter = CaptionSegmenter()
+        self.cues = []
+
+    async def handle_transcript_event(self, transcript_event):
+        for result in transcript_event.transcript.results:
+            if not result.is_partial:
+                self.cues.extend(self.segmenter.feed(result))
+
+    def shifted_cues(self):
+        return [Cue(c.start + self.offset, c.end + self.offset, c.text, c.result_id)
+                for c in self.cues]
+
+
+class BatchTranscriber:
+    """Transcribes files piece by piece under a global session limit"""
+
+    def __init__(self, language_code="zh-CN", max_sessions=4, target_seconds=60.0,
+                 max_seconds=120.0, speed=4.0, endpoint=None, retries=2):
+        """
+        Args:
+            language_code: Transcribe language of all files
+            max_sessions: concurrent Transcribe sessions across all files
+            target_seconds, max_seconds: piece length (see find_split_points)
+            speed: real-time multiple each piece is sent at
+            endpoint: optional endpoint URL override
+            retries: extra attempts for a failed piece
+        """
+        self.language_code = language_code
+        self.target_seconds = target_seconds
+        self.max_seconds = max_seconds
+        self.speed = speed
+        self.retries = retries
+        self.client = create_client(endpoint)
+        self._sessions = asyncio.Semaphore(max_sessions)
+        self.audio_seconds = 0.0
+        self.failed_pieces = 0
+
+    async def transcribe_piece(self, pcm, offset):
+        """
+        Transcribe one piece; returns its cues on the file timeline. A retry
+        keeps the cues a failed attempt already finalized and resumes at the
+        end of the last one.
+        """
+        cues = []
+        start = 0
+        for attempt in range(self.retries + 1):
+            async with self._sessions:
+                try:
+                    await self._transcribe_once(pcm[start:], offset + start / BYTES_PER_SECOND, cues)
+                    return cues
+                except Exception as e:
+                    print(f"Piece at {offset:.1f}s failed (attempt {attempt + 1}): {e}")
+            if cues:
+                resume = int((cues[-1].end - offset) * SAMPLE_RATE) * BYTES_PER_SAMPLE
+                start = min(max(start, resume), len(pcm))
+        self.failed_pieces += 1
+        return cues
+
+    async def _transcribe_once(self, pcm, offset, cues):
+        """Transcribe pcm, extending `cues` with its finals even when the session fails"""
+        stream = await self.client.start_stream_transcription(
+            language_code=self.language_code,
+            media_sample_rate_hz=SAMPLE_RATE,
+            media_encoding="pcm",
+        )
+
+        async def send():
+            pacer = Pacer(mode="burst", bytes_per_second=SAMPLE_RATE * BYTES_PER_SAMPLE, speed=self.speed)
+            view = memoryview(pcm)
+            for i in range(0, len(view), CHUNK_SIZE):
+                chunk = view[i:i + CHUNK_SIZE]
+                await stream.input_stream.send_audio_event(audio_chunk=chunk)
+                await pacer.pace(len(chunk))
+            await stream.input_stream.end_stream()
+
+        collector = _ResultCollector(stream.output_stream, offset)
+        tasks = [asyncio.create_task(send()), asyncio.create_task(collector.handle_events())]
+        try:
+            # The first failure ends the attempt; the other task must not be left behind
+            done, _ = await asyncio.wait(tasks, return_when=asyncio.FIRST_EXCEPTION)
+            for task in done:
+                if task.exception() is not None:
+                    raise task.exception()
+        finally:
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            cues.extend(collector.shifted_cues())
+
+    async def transcribe_file(self, path, output_base):
+        try:
+            pcm = await asyncio.to_thread(load_audio, path)
+        except Exception as e:
+            print(f"{path}: could not decode audio: {e}")
+            return 0
+        duration = len(pcm) / (SAMPLE_RATE * BYTES_PER_SAMPLE)
+        self.audio_seconds += duration
+        pieces = find_split_points(pcm, SAMPLE_RATE, self.target_seconds, self.max_seconds)
+        print(f"{path}: {duration:.1f}s in {len(pieces)} pieces")
+
+        results = await asyncio.gather(*(
+            self.transcribe_piece(pcm[start * 2:end * 2], start / SAMPLE_RATE)
+            for start, end in pieces
+        ))
+        cues = sorted((cue for piece in results for cue in piece), key=lambda c: c.start)
+        sink = SubtitleSink(output_base, formats=('srt',))
+        for cue in cues:
+            sink.write(cue)
+        await sink.close()
+        print(f"{path}: {len(cues)} cues -> {output_base}.srt")
+        return len(cues)
+
+    async def transcribe_directory(self, directory, output_dir):
+        paths = sorted(
+            os.path.join(directory, name) for name in os.listdir(directory)
+            if name.lower().endswith(AUDIO_EXTENSIONS)
+        )
+        os.makedirs(output_dir, exist_ok=True)
+        started = time.monotonic()
+        await asyncio.gather(*(
+            self.transcribe_file(path, os.path.join(output_dir, os.path.splitext(os.path.basename(path))[0]))
+            for path in paths
+        ))
+        elapsed = time.monotonic() - started
+        print(f"Transcribed {len(paths)} files, {self.audio_seconds:.1f}s of audio in {elapsed:.1f}s "
+              f"({self.audio_seconds / max(elapsed, 1e-9):.1f}x real time), "
+              f"{self.failed_pieces} failed pieces")
+
+
+async def main():
+    parser = argparse.ArgumentParser(description='Batch transcription of an audio directory')
+    parser.add_argument('directory', nargs='?', default='audios')
+    parser.add_argument('--output-dir', default='captions')
+    parser.add_argument('--language', default='zh-CN')
+    parser.add_argument('--max-sessions', type=int, default=4, help='Concurrent Transcribe sessions')
+    parser.add_argument('--target-seconds', type=float, default=60.0, help='Preferred piece length')
+    parser.add_argument('--max-seconds', type=float, default=120.0, help='Longest piece')
+    parser.add_argument('--speed', type=float, default=4.0, help='Real-time multiple per session')
+    parser.add_argument('--endpoint', default=None, help='Transcribe endpoint URL override')
+    args = parser.parse_args()
+
+    if not args.endpoint and not await check_aws_credentials():
+        return
+    transcriber = BatchTranscriber(args.language, args.max_sessions, args.target_seconds,
+                                   args.max_seconds, args.speed, args.endpoint)
+    await transcriber.transcribe_directory(args.directory, args.output_dir)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
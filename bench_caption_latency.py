@@ -0,0 +1,117 @@
+"""
+Replay recorded Transcribe result streams through caption segmentation and
+measure caption latency.
+
+Each corpus file in corpus/captions/ is a JSON-lines log of TranscriptEvents
+with their arrival time "t" (seconds from audio start). For every word of a
+final result we measure the delay from the end of the word in the audio to
+the moment a cue containing it is emitted.
+
+Usage: python bench_caption_latency.py [corpus.jsonl ...] [--max-latency S] [--max-chars N]
+"""
+
+import argparse
+import glob
+from caption_segmenter import CaptionSegmenter, Cue
+from transcript_events import load_event_log
+
+DEFAULT_CORPUS = "corpus/captions/*.jsonl"
+
+
+class LegacySegmenter:
+    """Previous MyEventHandler behaviour: a cue is written when the transcript gets shorter"""
+
+    def __init__(self):
+        self.previous_sentence = ''
+        self.previous_result = None
+
+    def feed(self, result, now=None):
+        alt = result.alternatives[0]
+        cues = []
+        if len(alt.transcript) < len(self.previous_sentence):
+            items = self.previous_result.alternatives[0].items
+            cues.append(Cue(items[0].start_time, items[-1].end_time, self.previous_sentence))
+        self.previous_sentence = alt.transcript
+        self.previous_result = result
+        return cues
+
+    def flush(self):
+        return []
+
+
+def percentile(values, p):
+    if not values:
+        return float('nan')
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(p / 100.0 * (len(values) - 1))))]
+
+
+def replay(events, segmenter):
+    """Feed events at their recorded times; return [(emit_time, cue)]"""
+    emitted = []
+    now = 0.0
+    for t, event in events:
+        now = t
+        for result in event.transcript.results:
+            for cue in segmenter.feed(result, now=t):
+                emitted.append((t, cue))
+    for cue in segmenter.flush():
+        emitted.append((now, cue))
+    return emitted
+
+
+def measure(events, emitted):
+    """Per-word latency (seconds) and number of final words never captioned"""
+    final_words = []
+    for _, event in events:
+        for result in event.transcript.results:
+            if not result.is_partial:
+                final_words.extend(
+                    item for item in result.alternatives[0].items
+                    if item.item_type != 'punctuation'
+                )
+
+    latencies = []
+    dropped = 0
+    for word in final_words:
+        emit_time = next(
+            (t for t, cue in emitted
+             if cue.start <= word.start_time and word.end_time <= cue.end + 1e-6
+             and word.content in cue.text),
+            None
+        )
+        if emit_time is None:
+            dropped += 1
+        else:
+            latencies.append(emit_time - word.end_time)
+    return latencies, dropped, len(final_words)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Caption latency replay benchmark')
+    parser.add_argument('corpus', nargs='*')
+    parser.add_argument('--max-latency', type=float, default=1.5)
+    parser.add_argument('--max-chars', type=int, default=42)
+    args = parser.parse_args()
+
+    paths = args.corpus or sorted(glob.glob(DEFAULT_CORPUS))
+    for path in paths:
+        events = load_event_log(path)
+        print(f"{path}: {len(events)} events")
+        for name, make in (
+            ("legacy (length drop)", LegacySegmenter),
+            ("caption segmenter", lambda: CaptionSegmenter(
+                max_latency=args.max_latency, max_chars=args.max_chars, clock=lambda: 0.0)),
+        ):
+            emitted = replay(events, make())
+            latencies, dropped, total = measure(events, emitted)
+            first = emitted[0][0] if emitted else float('nan')
+            longest = max((len(cue.text) for _, cue in emitted), default=0)
+            print(f"  {name:22s} first caption at {first:5.2f}s  "
+                  f"word latency p50 {percentile(latencies, 50):5.2f}s "
+                  f"p95 {percentile(latencies, 95):5.2f}s  "
+                  f"dropped {dropped}/{total} words  cues {len(emitted)} (longest {longest} chars)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,175 @@
+"""
+Load test for caption_server.py.
+
+Starts the caption server in its own process publishing synthetic cues on
+channel "demo" (--rate per second), connects N subscribers over WebSocket
+and/or SSE from client processes, and reports:
+  - delivery latency: client receive time minus the update's publish time
+    (p50 / p99 / max), over all messages of all subscribers
+  - messages delivered and lost (per-subscriber buffer drops, seen as seq gaps)
+  - server CPU, and the subscribers one core could serve at this update rate
+
+Clients and server share the machine, so run the clients on another host
+(--url) for clean per-core numbers.
+
+Usage: python bench_caption_server.py [--subscribers 2000] [--protocol ws|sse|mixed]
+       [--rate 4] [--duration 20] [--client-procs 2]
+"""
+
+import argparse
+import asyncio
+import json
+import multiprocessing
+import os
+import subprocess
+import sys
+import time
+import aiohttp
+from bench_caption_latency import percentile
+
+
+async def _ws_client(session, url, record):
+    async with session.ws_connect(url) as ws:
+        async for message in ws:
+            if message.type != aiohttp.WSMsgType.TEXT:
+                break
+            record(json.loads(message.data))
+
+
+async def _sse_client(session, url, record):
+    async with session.get(url, timeout=aiohttp.ClientTimeout(total=None)) as response:
+        data = []
+        async for line in response.content:
+            line = line.rstrip(b'\n')
+            if line.startswith(b'data: '):
+                data.append(line[6:])
+            elif not line and data:
+                record(json.loads(b'\n'.join(data)))
+                data = []
+
+
+async def _client_proc(base_url, protocols, duration, queue, start):
+    latencies = []
+    state = {'received': 0, 'gaps': 0, 'errors': 0}
+    connected = set()
+
+    def recorder():
+        last = [None]
+
+        def record(update):
+            connected.add(id(last))
+            latencies.append(time.time() - update['published'])
+            state['received'] += 1
+            if last[0] is not None and update['seq'] > last[0] + 1:
+                state['gaps'] += update['seq'] - last[0] - 1
+            last[0] = update['seq']
+        return record
+
+    async def run(protocol):
+        try:
+            if protocol == 'ws':
+                await _ws_client(session, f"{base_url}/channels/demo/ws", recorder())
+            else:
+                await _sse_client(session, f"{base_url}/channels/demo/events", recorder())
+        except Exception:
+            state['errors'] += 1
+
+    connector = aiohttp.TCPConnector(limit=0)
+    async with aiohttp.ClientSession(connector=connector) as session:
+        tasks = []
+        for protocol in protocols:
+            tasks.append(asyncio.create_task(run(protocol)))
+            if len(tasks) % 100 == 0:
+                await asyncio.sleep(0.05)  # Don't SYN-flood the listen backlog
+        # Measure once every subscriber is receiving and the replay went out
+        deadline = time.monotonic() + 60
+        while len(connected) + state['errors'] < len(protocols) and time.monotonic() < deadline:
+            await asyncio.sleep(0.2)
+        queue.put('ready')
+        await asyncio.get_running_loop().run_in_executor(None, start.wait)
+        latencies.clear()
+        state['received'] = state['gaps'] = 0
+        await asyncio.sleep(duration)
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+    queue.put((latencies, state))
+
+
+def _client_main(base_url, protocols, duration, queue, start):
+    asyncio.run(_client_proc(base_url, protocols, duration, queue, start))
+
+
+def _cpu_seconds(pid):
+    with open(f'/proc/{pid}/stat') as f:
+        fields = f.read().rsplit(')', 1)[1].split()
+    return (int(fields[11]) + int(fields[12])) / os.sysconf('SC_CLK_TCK')
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Caption fan-out load test')
+    parser.add_argument('--subscribers', type=int, default=2000)
+    parser.add_argument('--protocol', choices=['ws', 'sse', 'mixed'], default='mixed')
+    parser.add_argument('--rate', type=float, default=4.0, help='Cues published per second')
+    parser.add_argument('--duration', type=float, default=20.0)
+    parser.add_argument('--client-procs', type=int, default=2)
+    parser.add_argument('--port', type=int, default=8091)
+    parser.add_argument('--url', default=None, help='Use a running server (publishing on "demo")')
+    args = parser.parse_args()
+
+    server = None
+    base_url = args.url
+    if base_url is None:
+        server = subprocess.Popen([sys.executable, 'caption_server.py', '--port', str(args.port),
+                                   '--demo-rate', str(args.rate)],
+                                  stdout=subprocess.DEVNULL, cwd=os.path.dirname(os.path.abspath(__file__)))
+        base_url = f"http://127.0.0.1:{args.port}"
+        time.sleep(1.5)
+    try:
+        if args.protocol == 'mixed':
+            protocols = ['ws' if i % 2 else 'sse' for i in range(args.subscribers)]
+        else:
+            protocols = [args.protocol] * args.subscribers
+        queue = multiprocessing.Queue()
+        start = multiprocessing.Event()
+        procs = [multiprocessing.Process(target=_client_main, args=(
+                     base_url, protocols[i::args.client_procs], args.duration, queue, start))
+                 for i in range(args.client_procs)]
+        for p in procs:
+            p.start()
+        for _ in procs:
+            queue.get()
+        # Server CPU over the measured part only
+        start.set()
+        cpu = _cpu_seconds(server.pid) if server else None
+        measured = time.monotonic()
+        results = [queue.get() for _ in procs]
+        if server:
+            cpu = _cpu_seconds(server.pid) - cpu
+            measured = time.monotonic() - measured
+        for p in procs:
+            p.join()
+    finally:
+        if server is not None:
+            server.terminate()
+            server.wait()
+
+    latencies = sorted(x for r in results for x in r[0])
+    received = sum(r[1]['received'] for r in results)
+    gaps = sum(r[1]['gaps'] for r in results)
+    errors = sum(r[1]['errors'] for r in results)
+    expected = args.subscribers * args.rate * args.duration
+    print(f"{args.subscribers} {args.protocol} subscribers, {args.rate:g} cues/s for {args.duration:g}s")
+    print(f"delivered {received} messages ({received / max(expected, 1):.1%} of {expected:.0f}), "
+          f"{gaps} dropped for slow clients, {errors} client errors")
+    print(f"latency: p50 {percentile(latencies, 50) * 1000:.1f} ms  p99 {percentile(latencies, 99) * 1000:.1f} ms  "
+          f"max {(latencies[-1] if latencies else float('nan')) * 1000:.1f} ms")
+    if server:
+        usage = cpu / measured
+        print(f"server CPU: {usage:.1%} of a core -> ~{args.subscribers / max(usage, 1e-9):,.0f} subscribers "
+              f"per core at {args.rate:g} cues/s ({args.subscribers * args.rate / max(cpu / measured, 1e-9):,.0f} "
+              f"deliveries per core-second)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,147 @@
+"""
+Benchmark: CaptionStore vs rescanning an SRT file for time-range queries.
+
+Writes N synthetic cues (about 2.5 s each, like a 24/7 channel) to a
+CaptionStore and to an SRT file, then measures:
+  - append throughput (cues/s) and bytes per cue
+  - reopen time (index repair check + mmap + max duration scan)
+  - range query latency for random 10 s windows (p50 / p99)
+  - bulk export of a one-hour window to SRT
+  - the same 10 s query answered by parsing the whole SRT file
+
+Usage: python bench_caption_store.py [--cues 2000000] [--queries 1000] [--dir /tmp/cuebench]
+"""
+
+import argparse
+import os
+import random
+import re
+import shutil
+import statistics
+import tempfile
+import time
+from caption_segmenter import Cue
+from caption_store import CaptionStore
+from subtitle_sink import SRTFormat
+
+WORDS = ("the", "match", "goal", "keeper", "strikes", "again", "crowd", "roars", "first", "half",
+         "进球", "比赛", "精彩", "射门")
+SRT_TIME = re.compile(r'(\d+):(\d\d):(\d\d),(\d\d\d) --> (\d+):(\d\d):(\d\d),(\d\d\d)')
+
+
+def synthetic_cues(n, seed=1):
+    rng = random.Random(seed)
+    t = 0.0
+    for _ in range(n):
+        duration = rng.uniform(1.0, 4.0)
+        text = ' '.join(rng.choice(WORDS) for _ in range(rng.randint(3, 9)))
+        yield Cue(t, t + duration, text)
+        t += duration + rng.uniform(0.0, 0.5)
+
+
+def srt_range(path, start, end):
+    """The naive way: parse the whole SRT file and filter"""
+    cues = []
+    with open(path, encoding='utf-8') as f:
+        for block in f.read().split('\n\n'):
+            lines = block.split('\n')
+            if len(lines) < 3:
+                continue
+            m = SRT_TIME.match(lines[1])
+            if not m:
+                continue
+            g = [int(x) for x in m.groups()]
+            cue_start = g[0] * 3600 + g[1] * 60 + g[2] + g[3] / 1000
+            cue_end = g[4] * 3600 + g[5] * 60 + g[6] + g[7] / 1000
+            if cue_end > start and cue_start < end:
+                cues.append(Cue(cue_start, cue_end, '\n'.join(lines[2:])))
+    return cues
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Caption store benchmark')
+    parser.add_argument('--cues', type=int, default=2000000)
+    parser.add_argument('--queries', type=int, default=1000)
+    parser.add_argument('--window', type=float, default=10.0, help='Query window in seconds')
+    parser.add_argument('--dir', default=None, help='Working directory (default: a temporary one)')
+    args = parser.parse_args()
+
+    directory = args.dir or tempfile.mkdtemp(prefix='cuebench')
+    os.makedirs(directory, exist_ok=True)
+    base = os.path.join(directory, 'channel')
+    srt_path = base + '.srt'
+    for path in (base + '.cuelog', base + '.cueidx', srt_path):
+        if os.path.exists(path):
+            os.remove(path)
+    try:
+        started = time.perf_counter()
+        for cue in synthetic_cues(args.cues):
+            pass
+        generate = time.perf_counter() - started
+        store = CaptionStore(base, flush_every=4096)
+        started = time.perf_counter()
+        for cue in synthetic_cues(args.cues):
+            store.write(cue)
+        store.close_sync()
+        append = time.perf_counter() - started - generate
+        store_bytes = os.path.getsize(base + '.cuelog') + os.path.getsize(base + '.cueidx')
+
+        srt = SRTFormat()
+        with open(srt_path, 'w', encoding='utf-8') as f:
+            parts = []
+            for i, cue in enumerate(synthetic_cues(args.cues), 1):
+                parts.append(srt.cue(i, cue))
+                if len(parts) == 4096:
+                    f.write(''.join(parts))
+                    parts = []
+            f.write(''.join(parts))
+        print(f"append: {args.cues} cues in {append:.2f}s ({args.cues / append:,.0f} cues/s, "
+              f"excluding cue generation), {store_bytes / args.cues:.1f} bytes/cue "
+              f"(SRT {os.path.getsize(srt_path) / args.cues:.1f})")
+
+        started = time.perf_counter()
+        store = CaptionStore(base)
+        print(f"reopen: {(time.perf_counter() - started) * 1000:.1f} ms for {len(store)} cues "
+              f"({store.end_time / 3600:.0f} h of captions)")
+
+        rng = random.Random(2)
+        latencies = []
+        found = 0
+        for _ in range(args.queries):
+            start = rng.uniform(0, store.end_time - args.window)
+            t = time.perf_counter()
+            found += len(store.range(start, start + args.window))
+            latencies.append(time.perf_counter() - t)
+        latencies.sort()
+        print(f"range({args.window:.0f}s): p50 {statistics.median(latencies) * 1e6:.1f} us, "
+              f"p99 {latencies[int(len(latencies) * 0.99) - 1] * 1e6:.1f} us, "
+              f"{found / args.queries:.1f} cues per query")
+
+        start = store.end_time / 2
+        t = time.perf_counter()
+        count = store.export(os.path.join(directory, 'hour.srt'), start, start + 3600, rebase=True)
+        print(f"export 1 h window: {count} cues in {(time.perf_counter() - t) * 1000:.1f} ms")
+        t = time.perf_counter()
+        count = store.export(os.path.join(directory, 'all.vtt'))
+        export_all = time.perf_counter() - t
+        print(f"export all to WebVTT: {count} cues in {export_all:.2f}s ({count / export_all:,.0f} cues/s)")
+
+        start = rng.uniform(0, store.end_time - args.window)
+        t = time.perf_counter()
+        naive = srt_range(srt_path, start, start + args.window)
+        scan = time.perf_counter() - t
+        t = time.perf_counter()
+        indexed = store.range(start, start + args.window)
+        lookup = time.perf_counter() - t
+        if [c.text for c in indexed] != [c.text for c in naive]:
+            print("warning: store and SRT returned different cues")
+        print(f"same {args.window:.0f}s query by parsing the SRT: {scan:.2f}s "
+              f"({scan / max(lookup, 1e-9):,.0f}x slower than the index)")
+        store.close_sync()
+    finally:
+        if args.dir is None:
+            shutil.rmtree(directory, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
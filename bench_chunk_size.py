@@ -0,0 +1,156 @@
+"""
+Benchmark: audio event size against sender overhead and added latency.
+
+Sends synthetic audio through the SDK's own AudioStream (event-stream
+framing and chained SigV4 event signatures with static credentials,
+written to an in-memory stream, so no network or AWS account is needed)
+and reports, for fixed event durations and for ChunkSizer latency targets:
+  - sender time per audio event and per second of audio (overhead)
+  - wire bytes beyond the PCM itself (framing and signature headers)
+  - latency added by chunking: how long the first sample of an event
+    waits for the event to fill, plus the send, on average and at most
+Source audio arrives in --frame-ms frames; --network-ms adds a fixed wait
+per event to stand in for the HTTP/2 write on a real connection.
+
+Usage: python bench_chunk_size.py [--seconds 60] [--frame-ms 20] [--network-ms 0]
+"""
+
+import argparse
+import asyncio
+import time
+from amazon_transcribe.auth import Credentials
+from amazon_transcribe.eventstream import EventSigner
+from amazon_transcribe.model import AudioStream
+from amazon_transcribe.serialize import AudioEventSerializer
+from amazon_transcribe.structures import BufferableByteStream
+from pacer import ChunkSizer
+
+BYTES_PER_SECOND = 32000
+FIXED_MS = (10, 20, 50, 100, 200, 500, 1000)
+TARGETS_MS = (50, 100, 200, 400)
+BAR = 30
+
+
+class _StaticCredentials:
+    async def get_credentials(self):
+        return Credentials('AKIDEXAMPLE', 'wJalrXUtnFEMI/K7MDENG/bPxRfiCYEXAMPLEKEY')
+
+
+class _WireCounter(BufferableByteStream):
+    """Counts what the SDK would put on the wire and discards it"""
+
+    def __init__(self):
+        super().__init__()
+        self.bytes = 0
+
+    def write(self, b):
+        self.bytes += len(b)
+        return len(b)
+
+
+def _audio_stream():
+    wire = _WireCounter()
+    stream = AudioStream(input_stream=wire, event_serializer=AudioEventSerializer(),
+                         event_signer=EventSigner('transcribe', 'us-west-2'),
+                         initial_signature=b'0' * 64, credential_resolver=_StaticCredentials())
+    return stream, wire
+
+
+async def run(seconds, frame_ms, network_ms, event_ms=None, target_ms=None):
+    """
+    Send `seconds` of audio in events of event_ms, or sized by a ChunkSizer
+    for target_ms. Latency is counted on the audio clock (frames arrive
+    every frame_ms) plus the measured send time.
+    """
+    stream, wire = _audio_stream()
+    frame = bytes(BYTES_PER_SECOND * frame_ms // 1000)
+    if target_ms is not None:
+        sizer = ChunkSizer(latency_target=target_ms / 1000, bytes_per_second=BYTES_PER_SECOND)
+    else:
+        sizer = ChunkSizer(latency_target=event_ms / 1000, bytes_per_second=BYTES_PER_SECOND,
+                           min_seconds=event_ms / 1000, max_seconds=event_ms / 1000)
+    pcm_bytes = 0
+    send_time = 0.0
+    events = 0
+    waits = []
+    frame_seconds = frame_ms / 1000
+    arrived = 0.0           # audio clock: end of the last frame received
+    n_frames = int(seconds * 1000 / frame_ms)
+
+    def available(position):
+        """Audio clock at which the frame holding `position` has arrived"""
+        return (int(position / frame_seconds + 1e-9) + 1) * frame_seconds
+
+    async def send(event):
+        nonlocal pcm_bytes, send_time, events
+        first_sample = available(pcm_bytes / BYTES_PER_SECOND)
+        started = time.perf_counter()
+        await stream.send_audio_event(audio_chunk=event)
+        if network_ms:
+            await asyncio.sleep(network_ms / 1000)
+        elapsed = time.perf_counter() - started
+        if target_ms is not None:
+            sizer.observe(elapsed, len(event))
+        send_time += elapsed
+        pcm_bytes += len(event)
+        events += 1
+        waits.append(arrived - first_sample + elapsed)
+
+    for _ in range(n_frames):
+        arrived += frame_seconds
+        for event in sizer.feed(frame, now=arrived):
+            await send(event)
+    tail = sizer.flush()
+    if tail:
+        await send(tail)
+    return {
+        'events': events,
+        'event_ms': pcm_bytes / BYTES_PER_SECOND / events * 1000,
+        'send_us': send_time / events * 1e6,
+        'overhead': send_time / seconds,
+        'wire': (wire.bytes - pcm_bytes) / pcm_bytes,
+        'latency_avg': sum(waits) / len(waits),
+        'latency_max': max(waits),
+        'limited': sizer.limited if target_ms is not None else None,
+    }
+
+
+def _bar(value, scale):
+    filled = min(BAR, int(round(value / scale * BAR))) if scale else 0
+    return '#' * filled + ' ' * (BAR - filled)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Audio event size sweep: overhead against latency')
+    parser.add_argument('--seconds', type=float, default=60.0, help='Audio per run')
+    parser.add_argument('--frame-ms', type=int, default=20, help='Source frame duration')
+    parser.add_argument('--network-ms', type=float, default=0.0, help='Extra wait per event (network write)')
+    args = parser.parse_args()
+
+    async def sweep():
+        rows = []
+        for ms in FIXED_MS:
+            rows.append((f"fixed {ms} ms", await run(args.seconds, args.frame_ms, args.network_ms, event_ms=ms)))
+        for ms in TARGETS_MS:
+            rows.append((f"target {ms} ms", await run(args.seconds, args.frame_ms, args.network_ms, target_ms=ms)))
+        return rows
+
+    rows = asyncio.run(sweep())
+    print(f"{args.seconds:g}s of 16 kHz audio in {args.frame_ms} ms frames, "
+          f"{args.network_ms:g} ms network wait per event\n")
+    print(f"{'':15s} {'event ms':>8s} {'events':>7s} {'send us':>8s} {'sender %':>9s} {'wire +%':>8s} "
+          f"{'latency ms avg/max':>19s}")
+    for label, r in rows:
+        print(f"{label:15s} {r['event_ms']:8.0f} {r['events']:7d} {r['send_us']:8.0f} {r['overhead']:9.2%} "
+              f"{r['wire']:8.2%} {r['latency_avg'] * 1000:9.0f}/{r['latency_max'] * 1000:.0f}"
+              + (f"  ({r['limited']} limited)" if r['limited'] else ""))
+
+    overhead_scale = max(r['overhead'] for _, r in rows)
+    latency_scale = max(r['latency_max'] for _, r in rows)
+    print(f"\n{'':15s} {'sender time per audio second':{BAR}s}   {'added latency (avg)':{BAR}s}")
+    for label, r in rows:
+        print(f"{label:15s} {_bar(r['overhead'], overhead_scale)}   {_bar(r['latency_avg'], latency_scale)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,70 @@
+"""
+Benchmark: CPU time per second of audio for AudioProcessor noise reduction.
+
+Compares the per-chunk noisereduce path (streaming=False) with the
+StreamingDenoiser path (streaming=True), feeding 4KB chunks as TSPlayer does.
+
+Usage: python bench_denoise.py [audio_file] [--repeat N]
+"""
+
+import argparse
+import asyncio
+import time
+import numpy as np
+import soundfile as sf
+import librosa
+from audio_processor import AudioProcessor
+
+SAMPLE_RATE = 16000
+CHUNK_SIZE = 1024 * 4
+DEFAULT_AUDIO = "audios/arabac.wav"
+
+
+def load_pcm(path, sample_rate=SAMPLE_RATE):
+    """Load an audio file as 16 kHz mono 16-bit PCM bytes"""
+    audio, sr = sf.read(path, dtype='float32', always_2d=True)
+    audio = audio.mean(axis=1)
+    if sr != sample_rate:
+        audio = librosa.resample(audio, orig_sr=sr, target_sr=sample_rate)
+    return (np.clip(audio, -1, 32767 / 32768) * 32768).astype(np.int16).tobytes()
+
+
+async def run_processor(pcm, streaming):
+    """Feed all chunks through a fresh AudioProcessor, return (cpu seconds, output bytes)"""
+    processor = AudioProcessor(sample_rate=SAMPLE_RATE, streaming=streaming)
+    out_bytes = 0
+    start = time.process_time()
+    for i in range(0, len(pcm), CHUNK_SIZE):
+        processed = await processor.process_chunk(pcm[i:i + CHUNK_SIZE])
+        if processed is not None:
+            out_bytes += len(processed)
+    tail = processor.flush()
+    if tail is not None:
+        out_bytes += len(tail)
+    elapsed = time.process_time() - start
+    processor.cleanup()
+    return elapsed, out_bytes
+
+
+async def main():
+    parser = argparse.ArgumentParser(description='AudioProcessor denoise benchmark')
+    parser.add_argument('audio', nargs='?', default=DEFAULT_AUDIO)
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    pcm = load_pcm(args.audio)
+    audio_seconds = len(pcm) / (SAMPLE_RATE * 2)
+    print(f"Input: {args.audio} ({audio_seconds:.1f}s at {SAMPLE_RATE} Hz, {CHUNK_SIZE} byte chunks)")
+
+    for name, streaming in (("per-chunk noisereduce", False), ("streaming denoiser", True)):
+        best = None
+        for _ in range(args.repeat):
+            cpu, out_bytes = await run_processor(pcm, streaming)
+            best = cpu if best is None else min(best, cpu)
+        per_second = best / audio_seconds
+        print(f"{name:24s} cpu/audio-second: {per_second * 1000:8.2f} ms  "
+              f"realtime factor: {1 / per_second:7.1f}x  output: {out_bytes} bytes")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
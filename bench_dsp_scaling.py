@@ -0,0 +1,87 @@
+"""
+Benchmark: how many real-time channels one host can denoise.
+
+Runs C channels concurrently through AudioProcessor.process_stream as fast
+as possible (4KB chunks, as TSPlayer feeds them) and reports:
+  - capacity: seconds of audio processed per wall second, i.e. how many
+    real-time channels the configuration sustains
+  - ingest CPU: CPU seconds the event-loop process spends per audio second,
+    the part that stays GIL-bound however many workers there are
+
+Modes: inline (event loop), thread and process (DSPExecutor; process
+pickles every chunk) and shm (SharedMemoryDSPPool).
+
+Usage: python bench_dsp_scaling.py [audio_file] [--workers 1,2,4] [--channels-per-worker 2]
+"""
+
+import argparse
+import asyncio
+import os
+import time
+from audio_processor import AudioProcessor
+from bench_denoise import load_pcm, DEFAULT_AUDIO, SAMPLE_RATE, CHUNK_SIZE
+from dsp_executor import create_executor
+
+
+async def _chunks(pcm):
+    for i in range(0, len(pcm), CHUNK_SIZE):
+        yield pcm[i:i + CHUNK_SIZE]
+        await asyncio.sleep(0)
+
+
+async def _run_channel(pcm, executor):
+    processor = AudioProcessor(sample_rate=SAMPLE_RATE, executor=executor)
+    out_bytes = 0
+    async for processed in processor.process_stream(_chunks(pcm)):
+        out_bytes += len(processed)
+    tail = await processor.drain()
+    if tail is not None:
+        out_bytes += len(tail)
+    processor.cleanup()
+    return out_bytes
+
+
+async def run(pcm, mode, workers, channels):
+    executor = create_executor(mode, workers)
+    try:
+        # Warm up the workers (imports, first processor) outside the measurement
+        await _run_channel(pcm[:SAMPLE_RATE * 4], executor)
+        wall = time.perf_counter()
+        cpu = time.process_time()
+        await asyncio.gather(*(_run_channel(pcm, executor) for _ in range(channels)))
+        return time.perf_counter() - wall, time.process_time() - cpu
+    finally:
+        if executor is not None:
+            executor.shutdown()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Denoise channels-per-host scaling benchmark')
+    parser.add_argument('audio', nargs='?', default=DEFAULT_AUDIO)
+    parser.add_argument('--workers', default=None,
+                        help='Comma separated worker counts (default: 1, 2, 4 ... CPU count)')
+    parser.add_argument('--channels-per-worker', type=int, default=2)
+    parser.add_argument('--modes', default='inline,thread,process,shm')
+    args = parser.parse_args()
+
+    cores = os.cpu_count() or 1
+    if args.workers:
+        worker_counts = [int(w) for w in args.workers.split(',')]
+    else:
+        worker_counts = sorted({min(cores, 2 ** i) for i in range(cores.bit_length() + 1)})
+
+    pcm = load_pcm(args.audio)
+    audio_seconds = len(pcm) / (SAMPLE_RATE * 2)
+    print(f"Input: {args.audio} ({audio_seconds:.1f}s), {cores} CPUs")
+    print(f"{'mode':8s} {'workers':>7s} {'channels':>8s} {'wall':>7s} {'capacity':>10s} {'ingest CPU':>11s}")
+    for mode in args.modes.split(','):
+        for workers in ([1] if mode == 'inline' else worker_counts):
+            channels = workers * args.channels_per_worker
+            wall, cpu = asyncio.run(run(pcm, mode, workers, channels))
+            total = audio_seconds * channels
+            print(f"{mode:8s} {workers:7d} {channels:8d} {wall:6.2f}s {total / wall:8.1f}x "
+                  f"{cpu / total * 1000:8.2f} ms/s")
+
+
+if __name__ == "__main__":
+    main()
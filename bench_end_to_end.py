@@ -0,0 +1,190 @@
+"""
+End-to-end benchmark against the local Transcribe stand-in.
+
+Starts local_transcribe.LocalTranscribeServer in a separate process and
+runs C channels concurrently, each TSPlayer (ffmpeg decode + denoise) ->
+transcribe_network_stream -> SubtitleSink (SRT). Reports:
+  - latency: from the moment the audio at a cue's end time entered
+    transcribe_network_stream to the moment the cue was written, as
+    percentiles over all cues (includes the stand-in's scripted delays)
+  - throughput: audio seconds per wall second for each stream
+  - CPU per channel: CPU time of this process and its ffmpeg children per
+    audio second (the stand-in's CPU is not counted)
+
+Usage: python bench_end_to_end.py [source ...] [--channels 4] [--pacing file|burst]
+       [--final-delay 0.5] [--endpoint ws://host:port]
+"""
+
+import argparse
+import asyncio
+import bisect
+import multiprocessing
+import os
+import resource
+import shutil
+import time
+from bench_caption_latency import percentile
+from local_transcribe import LocalTranscribeServer
+from subtitle_sink import SubtitleSink
+from transcribe_audio import transcribe_network_stream, SAMPLE_RATE, BYTES_PER_SAMPLE
+from ts_player import TSPlayer
+
+DEFAULT_SOURCE = "audios/chinese.wav"
+BYTES_PER_SECOND = SAMPLE_RATE * BYTES_PER_SAMPLE
+
+
+class ArrivalTap:
+    """Passes audio through, recording when each audio time entered the pipeline"""
+
+    def __init__(self, audio_stream):
+        self.audio_stream = audio_stream
+        self.audio_times = []
+        self.wall_times = []
+        self.audio_seconds = 0.0
+
+    async def __aiter__(self):
+        async for chunk in self.audio_stream:
+            self.audio_seconds += len(chunk) / BYTES_PER_SECOND
+            self.audio_times.append(self.audio_seconds)
+            self.wall_times.append(time.perf_counter())
+            yield chunk
+
+    def time_of(self, audio_time):
+        """Wall time at which audio up to audio_time had been passed on"""
+        i = bisect.bisect_left(self.audio_times, audio_time - 1e-6)
+        return self.wall_times[min(i, len(self.wall_times) - 1)]
+
+
+class TimedSink:
+    """Caption sink wrapper recording the wall time every cue is written"""
+
+    def __init__(self, sink):
+        self.sink = sink
+        self.emitted = []
+
+    def write(self, cue):
+        self.emitted.append((time.perf_counter(), cue))
+        self.sink.write(cue)
+
+    async def close(self):
+        await self.sink.close()
+
+
+async def run_channel(index, source, endpoint, pacing, language_code, output_dir):
+    player = TSPlayer(source)
+    tap = ArrivalTap(player.get_audio_stream())
+    sink = TimedSink(SubtitleSink(os.path.join(output_dir, f"channel{index}"), formats=('srt',)))
+    started = time.perf_counter()
+    await transcribe_network_stream(tap, pacing=pacing, language_code=language_code,
+                                    endpoint=endpoint, sink=sink)
+    wall = time.perf_counter() - started
+    latencies = [emitted - tap.time_of(cue.end) for emitted, cue in sink.emitted] if tap.wall_times else []
+    return {
+        'channel': index,
+        'audio_seconds': tap.audio_seconds,
+        'wall': wall,
+        'cues': len(sink.emitted),
+        'latencies': latencies,
+    }
+
+
+def _serve(options, port):
+    async def serve():
+        server = await LocalTranscribeServer(port=port, **options).start()
+        await asyncio.Event().wait()
+    asyncio.run(serve())
+
+
+async def _wait_listening(port, timeout=10.0):
+    deadline = time.monotonic() + timeout
+    while True:
+        try:
+            _, writer = await asyncio.open_connection('127.0.0.1', port)
+            writer.close()
+            return
+        except OSError:
+            if time.monotonic() > deadline:
+                raise
+            await asyncio.sleep(0.05)
+
+
+def _cpu_seconds():
+    own = resource.getrusage(resource.RUSAGE_SELF)
+    children = resource.getrusage(resource.RUSAGE_CHILDREN)
+    return own.ru_utime + own.ru_stime + children.ru_utime + children.ru_stime
+
+
+async def run(args):
+    server_process = None
+    endpoint = args.endpoint
+    if endpoint is None:
+        options = {
+            'utterance_seconds': args.utterance_seconds,
+            'partial_delay': args.partial_delay,
+            'final_delay': args.final_delay,
+        }
+        server_process = multiprocessing.Process(target=_serve, args=(options, args.port), daemon=True)
+        server_process.start()
+        await _wait_listening(args.port)
+        endpoint = f"ws://127.0.0.1:{args.port}"
+
+    os.makedirs(args.output_dir, exist_ok=True)
+    sources = args.sources or [DEFAULT_SOURCE]
+    try:
+        cpu = _cpu_seconds()
+        wall = time.perf_counter()
+        results = await asyncio.gather(*(
+            run_channel(i, sources[i % len(sources)], endpoint, args.pacing, args.language, args.output_dir)
+            for i in range(args.channels)
+        ))
+        wall = time.perf_counter() - wall
+        # Measured before the stand-in process is reaped, so its CPU is not included
+        cpu = _cpu_seconds() - cpu
+    finally:
+        if server_process is not None:
+            server_process.terminate()
+            server_process.join()
+    return results, wall, cpu
+
+
+def report(results, wall, cpu):
+    print(f"\n{'channel':>7s} {'audio':>7s} {'wall':>7s} {'throughput':>10s} {'cues':>5s} "
+          f"{'p50':>6s} {'p90':>6s}")
+    for r in results:
+        print(f"{r['channel']:7d} {r['audio_seconds']:6.1f}s {r['wall']:6.1f}s "
+              f"{r['audio_seconds'] / max(r['wall'], 1e-9):9.2f}x {r['cues']:5d} "
+              f"{percentile(r['latencies'], 50):5.2f}s {percentile(r['latencies'], 90):5.2f}s")
+
+    latencies = [x for r in results for x in r['latencies']]
+    audio = sum(r['audio_seconds'] for r in results)
+    print(f"\nAudio-in to caption-out latency over {len(latencies)} cues: "
+          f"p50 {percentile(latencies, 50):.3f}s  p90 {percentile(latencies, 90):.3f}s  "
+          f"p99 {percentile(latencies, 99):.3f}s  max {max(latencies, default=float('nan')):.3f}s")
+    print(f"{len(results)} channels, {audio:.1f}s of audio in {wall:.1f}s wall")
+    print(f"CPU: {cpu:.2f}s total, {cpu / max(len(results), 1):.2f}s per channel, "
+          f"{cpu / max(audio, 1e-9) * 1000:.1f} ms per audio second")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='End-to-end caption latency benchmark')
+    parser.add_argument('sources', nargs='*', help=f'TS URLs or media files (default {DEFAULT_SOURCE})')
+    parser.add_argument('--channels', type=int, default=4)
+    parser.add_argument('--pacing', default='file', choices=['live', 'file', 'burst'])
+    parser.add_argument('--language', default='zh-CN')
+    parser.add_argument('--endpoint', default=None, help='Use a running stand-in instead of starting one')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--utterance-seconds', type=float, default=3.0)
+    parser.add_argument('--partial-delay', type=float, default=0.2)
+    parser.add_argument('--final-delay', type=float, default=0.5)
+    parser.add_argument('--output-dir', default='bench_captions')
+    args = parser.parse_args()
+
+    if shutil.which('ffmpeg') is None:
+        print("ffmpeg not found; TSPlayer needs it to decode the sources")
+        return
+    results, wall, cpu = asyncio.run(run(args))
+    report(results, wall, cpu)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,126 @@
+"""
+Measure the cost of refreshing a large multi-period live manifest.
+
+A synthetic dynamic MPD with many periods is refreshed repeatedly; each
+refresh changes the last period (new segments) and occasionally appends a
+period. Compared:
+  - full parse: ElementTree.fromstring + dash_player.MPD, as DashPlayer does
+  - MPDLoader.parse: only new/changed periods are parsed
+  - conditional fetch over HTTP when the manifest did not change (304)
+
+Usage: python bench_mpd_refresh.py [--periods N] [--refreshes N]
+"""
+
+import argparse
+import asyncio
+import os
+import shutil
+import tempfile
+import time
+import xml.etree.ElementTree as ET
+from dash_player import MPD
+from dash_fetcher import serve_directory
+from mpd_loader import MPDLoader
+
+
+def make_period(index, segments, adaptation_sets=3, representations=6):
+    parts = [f' <Period id="p{index}" start="PT{index * 60}S">\n']
+    for a in range(adaptation_sets):
+        mime = 'audio/mp4' if a else 'video/mp4'
+        parts.append(f'  <AdaptationSet id="{a}" mimeType="{mime}" lang="en">\n')
+        parts.append('   <SegmentTemplate timescale="1000" media="$RepresentationID$/$Number$.m4s" '
+                     'initialization="$RepresentationID$/init.mp4">\n    <SegmentTimeline>\n')
+        parts.extend(f'     <S t="{s * 2000}" d="2000"/>\n' for s in range(segments))
+        parts.append('    </SegmentTimeline>\n   </SegmentTemplate>\n')
+        for r in range(representations):
+            parts.append(f'   <Representation id="p{index}a{a}r{r}" bandwidth="{(r + 1) * 100000}" '
+                         f'codecs="mp4a.40.2"><BaseURL>p{index}/a{a}/r{r}/</BaseURL>'
+                         f'<SegmentBase indexRange="600-2000"><Initialization range="0-599"/>'
+                         f'</SegmentBase></Representation>\n')
+        parts.append('  </AdaptationSet>\n')
+    parts.append(' </Period>\n')
+    return ''.join(parts)
+
+
+def make_manifest(periods, last_segments, publish_time):
+    body = [make_period(i, 30) for i in range(periods - 1)]
+    body.append(make_period(periods - 1, last_segments))
+    return ('<?xml version="1.0" encoding="UTF-8"?>\n'
+            '<MPD xmlns="urn:mpeg:dash:schema:mpd:2011" type="dynamic" '
+            f'publishTime="{publish_time}" minimumUpdatePeriod="PT2S">\n'
+            ' <BaseURL>https://example.com/live/</BaseURL>\n'
+            + ''.join(body) + '</MPD>\n').encode('utf-8')
+
+
+def refresh_sequence(periods, refreshes):
+    """Manifest versions: the live period grows, a new period starts every 10 refreshes"""
+    versions = []
+    count, segments = periods, 1
+    for i in range(refreshes):
+        if i and i % 10 == 0:
+            count, segments = count + 1, 1
+        versions.append(make_manifest(count, segments, f"2024-01-01T00:00:{i:02d}Z"))
+        segments += 1
+    return versions
+
+
+def bench_full(versions):
+    started = time.perf_counter()
+    for content in versions:
+        mpd = MPD(ET.fromstring(content), 'https://example.com/')
+        mpd.periods[-1].adaptation_sets[1].representations[0].base_url
+    return (time.perf_counter() - started) / len(versions)
+
+
+def bench_incremental(versions):
+    loader = MPDLoader('https://example.com/live.mpd')
+    loader.parse(versions[0])
+    started = time.perf_counter()
+    for content in versions[1:]:
+        loader.parse(content)
+        loader.document.periods[-1].adaptation_sets[1].representations[0].base_url
+    elapsed = (time.perf_counter() - started) / (len(versions) - 1)
+    return elapsed, loader.periods_parsed, loader.periods_reused
+
+
+async def bench_not_modified(content, refreshes):
+    workdir = tempfile.mkdtemp(prefix='mpd-bench-')
+    try:
+        with open(os.path.join(workdir, 'live.mpd'), 'wb') as f:
+            f.write(content)
+        runner, base_url = await serve_directory(workdir)
+        loader = MPDLoader(base_url + 'live.mpd')
+        await loader.refresh()
+        started = time.perf_counter()
+        for _ in range(refreshes):
+            await loader.refresh()
+        elapsed = (time.perf_counter() - started) / refreshes
+        not_modified = loader.not_modified
+        await loader.close()
+        await runner.cleanup()
+        return elapsed, not_modified
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='MPD refresh cost benchmark')
+    parser.add_argument('--periods', type=int, default=50)
+    parser.add_argument('--refreshes', type=int, default=40)
+    args = parser.parse_args()
+
+    versions = refresh_sequence(args.periods, args.refreshes)
+    print(f"Manifest: {args.periods}+ periods, {len(versions[-1]) / 1024:.0f} KiB, "
+          f"{args.refreshes} refreshes")
+    full = bench_full(versions)
+    incremental, parsed, reused = bench_incremental(versions)
+    print(f"  full parse (ET.fromstring + MPD)  {full * 1000:8.2f} ms/refresh")
+    print(f"  MPDLoader.parse                   {incremental * 1000:8.2f} ms/refresh "
+          f"({parsed} periods parsed, {reused} reused)")
+    not_modified, count = asyncio.run(bench_not_modified(versions[-1], args.refreshes))
+    print(f"  unchanged manifest over HTTP      {not_modified * 1000:8.2f} ms/refresh "
+          f"({count}/{args.refreshes} answered 304)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,103 @@
+"""
+Benchmark: allocations and copies on the PCM ingest -> conversion -> send path.
+
+Compares the previous path (stdout.read() bytes per chunk, astype/clip/astype
+copies, tobytes) with PCMRingBuffer.readinto + PCMScratch views. Denoising
+itself is left out so only buffer handling is measured.
+
+Usage: python bench_pcm_path.py [audio_file]
+"""
+
+import argparse
+import io
+import time
+import tracemalloc
+import numpy as np
+from bench_denoise import load_pcm, DEFAULT_AUDIO, SAMPLE_RATE, CHUNK_SIZE
+from pcm_ring import PCMRingBuffer, PCMScratch
+
+
+def legacy_path(source):
+    """Previous behaviour: new bytes per read, five array copies per chunk"""
+    while True:
+        chunk = source.read(CHUNK_SIZE)
+        if not chunk:
+            return
+        audio = np.frombuffer(chunk, dtype=np.int16).astype(np.float32) / 32768.0
+        audio = np.clip(audio, -1, 1)
+        yield (audio * 32768).astype(np.int16).tobytes()
+
+
+def ring_path(source):
+    """Ring buffer reads in place, conversions reuse preallocated buffers"""
+    ring = PCMRingBuffer(chunk_size=CHUNK_SIZE, n_chunks=32)
+    scratch = PCMScratch(max_samples=CHUNK_SIZE // 2)
+    while True:
+        chunk = ring.next_chunk()
+        if chunk is None:
+            if ring.eof:
+                return
+            ring.readinto(source)
+            continue
+        yield scratch.to_pcm(scratch.to_float(chunk))
+
+
+def measure(path, pcm):
+    """Return (chunks, allocated bytes, peak transient bytes per chunk, seconds)"""
+    source = io.BytesIO(pcm)
+    chunks = 0
+    allocated = 0
+    peak = 0
+    tracemalloc.start()
+    start = time.perf_counter()
+    gen = path(source)
+    while True:
+        tracemalloc.reset_peak()
+        before, _ = tracemalloc.get_traced_memory()
+        out = next(gen, None)
+        if out is None:
+            break
+        _, chunk_peak = tracemalloc.get_traced_memory()
+        # Skip warm-up chunks that allocate the long-lived buffers
+        if chunks >= 2:
+            allocated += chunk_peak - before
+            peak = max(peak, chunk_peak - before)
+        chunks += 1
+        del out
+    elapsed = time.perf_counter() - start
+    tracemalloc.stop()
+    return chunks, allocated, peak, elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description='PCM path allocation benchmark')
+    parser.add_argument('audio', nargs='?', default=DEFAULT_AUDIO)
+    args = parser.parse_args()
+
+    pcm = load_pcm(args.audio)
+    audio_seconds = len(pcm) / (SAMPLE_RATE * 2)
+    print(f"Input: {audio_seconds:.1f}s of audio, {CHUNK_SIZE} byte chunks")
+
+    for name, path in (("bytes + numpy copies", legacy_path), ("ring buffer + scratch", ring_path)):
+        chunks, allocated, peak, elapsed = measure(path, pcm)
+        print(f"{name:22s} allocated/audio-second: {allocated / audio_seconds / 1024:9.1f} KB  "
+              f"peak/chunk: {peak:7d} B  time/chunk: {elapsed / chunks * 1e6:6.1f} us")
+
+    # Explicit copy accounting for the ring path
+    ring = PCMRingBuffer(chunk_size=CHUNK_SIZE)
+    scratch = PCMScratch(max_samples=CHUNK_SIZE // 2)
+    source = io.BytesIO(pcm)
+    while not ring.eof or ring.available():
+        chunk = ring.next_chunk()
+        if chunk is None:
+            ring.readinto(source)
+            continue
+        scratch.to_pcm(scratch.to_float(chunk))
+    stats = ring.stats()
+    print(f"ring: {stats['read_calls'] / audio_seconds:.1f} reads/s, "
+          f"{stats['bytes_read'] / audio_seconds / 1024:.1f} KB/s read in place, "
+          f"{scratch.bytes_copied / audio_seconds / 1024:.1f} KB/s copied into output slots")
+
+
+if __name__ == "__main__":
+    main()
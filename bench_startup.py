@@ -0,0 +1,114 @@
+"""
+Startup benchmark: time from process launch to the first audio sent.
+
+Launches the pipeline in fresh child processes against the local
+Transcribe stand-in and reports, per run:
+  - imports: launch until the pipeline modules are imported
+  - first audio: launch until the first chunk has been sent by
+    transcribe_network_stream (the source's second chunk is requested)
+
+Sources: "synthetic" (a tone, no decoding) isolates our own startup; a
+TS URL or media file runs TSPlayer, whose noise profile holds back the
+first second of audio. --eager imports noisereduce, librosa and boto3 up
+front as the modules used to, for comparison. --aws uses the real service
+(credential check and connection) instead of the stand-in.
+
+Usage: python bench_startup.py [--source synthetic|URL] [--runs 5] [--eager] [--aws]
+"""
+
+import argparse
+import asyncio
+import json
+import statistics
+import sys
+import time
+
+CHUNK_BYTES = 4096
+
+
+async def _synthetic_source(seconds=2.0):
+    import numpy as np
+    t = np.arange(int(16000 * seconds)) / 16000
+    pcm = (np.sin(2 * np.pi * 440 * t) * 8000).astype(np.int16).tobytes()
+    for i in range(0, len(pcm), CHUNK_BYTES):
+        yield pcm[i:i + CHUNK_BYTES]
+
+
+async def _first_send_tap(audio_stream, marks):
+    """Records when the chunk after the first is requested, i.e. the first send finished"""
+    async for chunk in audio_stream:
+        yield chunk
+        if 'first_audio' not in marks:
+            marks['first_audio'] = time.time()
+
+
+async def _child(args):
+    marks = {}
+    if args.eager:
+        import boto3, librosa, noisereduce  # noqa: F401
+    from transcribe_audio import transcribe_network_stream, prewarm
+    from ts_player import TSPlayer
+    marks['imports'] = time.time()
+
+    endpoint = None if args.aws else args.endpoint
+    warm = asyncio.create_task(prewarm(endpoint))
+    if args.source == 'synthetic':
+        source = _synthetic_source()
+    else:
+        source = TSPlayer(args.source).get_audio_stream()
+    await transcribe_network_stream(_first_send_tap(source, marks), pacing='burst', endpoint=endpoint)
+    warm.cancel()
+    print('STARTUP ' + json.dumps(marks))
+
+
+async def _run_child(args, endpoint):
+    command = [sys.executable, __file__, '--child', '--source', args.source, '--endpoint', endpoint]
+    if args.eager:
+        command.append('--eager')
+    if args.aws:
+        command.append('--aws')
+    launched = time.time()
+    process = await asyncio.create_subprocess_exec(*command, stdout=asyncio.subprocess.PIPE,
+                                                   stderr=asyncio.subprocess.DEVNULL)
+    output, _ = await process.communicate()
+    for line in output.decode(errors='replace').splitlines():
+        if line.startswith('STARTUP '):
+            marks = json.loads(line[len('STARTUP '):])
+            return {name: t - launched for name, t in marks.items()}
+    return None
+
+
+async def _parent(args):
+    from local_transcribe import LocalTranscribeServer
+    server = await LocalTranscribeServer(port=0).start()
+    runs = []
+    try:
+        for i in range(args.runs):
+            result = await _run_child(args, server.endpoint)
+            if result is None or 'first_audio' not in result:
+                print(f"run {i + 1}: no audio was sent")
+                continue
+            runs.append(result)
+            print(f"run {i + 1}: imports {result['imports']:.3f}s  first audio {result['first_audio']:.3f}s")
+    finally:
+        await server.stop()
+    if runs:
+        print(f"\nmedian over {len(runs)} runs ({'eager' if args.eager else 'lazy'} imports, "
+              f"source {args.source}): imports {statistics.median(r['imports'] for r in runs):.3f}s, "
+              f"time to first audio sent {statistics.median(r['first_audio'] for r in runs):.3f}s")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Time to first audio sent')
+    parser.add_argument('--source', default='synthetic', help='"synthetic" or a TS URL / media file')
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--eager', action='store_true', help='Import the heavy modules up front')
+    parser.add_argument('--aws', action='store_true', help='Use Amazon Transcribe instead of the stand-in')
+    parser.add_argument('--child', action='store_true', help=argparse.SUPPRESS)
+    parser.add_argument('--endpoint', default=None, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    asyncio.run(_child(args) if args.child else _parent(args))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,72 @@
+"""
+Benchmark: cues per second written by SubtitleSink versus the previous
+write_srt() approach (three open/append/close calls per cue).
+
+Usage: python bench_subtitle_sink.py [--cues N] [--fsync]
+"""
+
+import argparse
+import asyncio
+import datetime
+import os
+import tempfile
+import time
+from caption_segmenter import Cue
+from subtitle_sink import SubtitleSink
+
+
+def convert_to_srt_time(seconds):
+    """Previous datetime-based timestamp formatting"""
+    dt = datetime.datetime(1900, 1, 1) + datetime.timedelta(seconds=seconds)
+    ms = dt.microsecond // 1000
+    return f"{dt.hour:02d}:{dt.minute:02d}:{dt.second:02d},{ms:03d}"
+
+
+def write_srt(filename, text):
+    """Previous per-line append"""
+    with open(filename, 'a', encoding='utf-8') as f:
+        f.write(text + '\n')
+
+
+def make_cues(n):
+    return [Cue(i * 2.0, i * 2.0 + 1.8, f"字幕测试 caption line number {i}") for i in range(n)]
+
+
+def bench_legacy(directory, cues):
+    path = os.path.join(directory, "legacy.srt")
+    start = time.perf_counter()
+    for cue in cues:
+        write_srt(path, f"{convert_to_srt_time(cue.start)} --> {convert_to_srt_time(cue.end)}")
+        write_srt(path, cue.text)
+        write_srt(path, "\n\n")
+    return time.perf_counter() - start
+
+
+async def bench_sink(directory, cues, formats, fsync):
+    sink = SubtitleSink(os.path.join(directory, "sink"), formats=formats, fsync=fsync)
+    start = time.perf_counter()
+    for cue in cues:
+        sink.write(cue)
+    loop_time = time.perf_counter() - start
+    await sink.close()
+    return time.perf_counter() - start, loop_time
+
+
+async def main():
+    parser = argparse.ArgumentParser(description='Subtitle sink throughput benchmark')
+    parser.add_argument('--cues', type=int, default=20000)
+    parser.add_argument('--fsync', action='store_true', help='fsync after every flush')
+    args = parser.parse_args()
+
+    cues = make_cues(args.cues)
+    with tempfile.TemporaryDirectory() as directory:
+        elapsed = bench_legacy(directory, cues)
+        print(f"write_srt (srt)          {args.cues / elapsed:10.0f} cues/s")
+        for formats in (('srt',), ('srt', 'vtt'), ('srt', 'vtt', 'ttml')):
+            elapsed, loop_time = await bench_sink(directory, cues, formats, args.fsync)
+            print(f"SubtitleSink ({'+'.join(formats):12s}) {args.cues / elapsed:10.0f} cues/s  "
+                  f"event-loop time/cue {loop_time / args.cues * 1e6:6.2f} us")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,221 @@
+import time
+from amazon_transcribe.handlers import TranscriptResultStreamHandler
+from vad import remap_result_times
+
+# Items ending with these close a caption line early
+SENTENCE_END = set('.!?。！？；;')
+# Slack when matching item times against the committed end (seconds)
+TIME_EPSILON = 1e-3
+
+
+class Cue:
+    """One caption cue on the source timeline (seconds)"""
+
+    __slots__ = ('start', 'end', 'text', 'result_id', 'final')
+
+    def __init__(self, start, end, text, result_id=None, final=True):
+        self.start = start
+        self.end = end
+        self.text = text
+        self.result_id = result_id
+        self.final = final
+
+    def __repr__(self):
+        return f"Cue({self.start:.3f}-{self.end:.3f} {self.text!r})"
+
+
+def _is_cjk(text):
+    return any('　' <= ch <= '鿿' or '가' <= ch <= '힯' or '＀' <= ch <= '￯'
+               for ch in text)
+
+
+def join_items(items):
+    """Join Transcribe items into display text (no spaces between CJK words or before punctuation)"""
+    parts = []
+    previous = None
+    for item in items:
+        content = item.content or ''
+        if parts and item.item_type != 'punctuation' and not (
+            _is_cjk(content[:1]) and previous is not None and _is_cjk(previous[-1:])
+        ):
+            parts.append(' ')
+        parts.append(content)
+        previous = content
+    return ''.join(parts)
+
+
+class _ResultState:
+    """Per result_id progress: up to which source time items were already emitted as cues"""
+
+    __slots__ = ('committed_end', 'pending_since', 'result')
+
+    def __init__(self):
+        self.result = None
+        self.committed_end = None
+        self.pending_since = None
+
+
+class CaptionSegmenter:
+    """
+    Builds caption cues from Transcribe results as early as possible.
+
+    Partial results are tracked per result_id. Items the service marks as
+    stable (partial results stabilization) are committed once the pending
+    text reaches `max_chars`, ends a sentence, or has waited `max_latency`
+    seconds. A final result commits everything left immediately. What was
+    committed is remembered by item time, not position, so a final that
+    splits or merges words differently continues after the committed audio.
+    """
+
+    def __init__(self, max_latency=1.5, max_chars=42, clock=time.monotonic):
+        """
+        Args:
+            max_latency: longest a stable word waits before it is emitted (seconds)
+            max_chars: maximum characters per cue
+            clock: time source, replaceable for replaying recorded sessions
+        """
+        self.max_latency = max_latency
+        self.max_chars = max_chars
+        self.clock = clock
+        self._results = {}
+
+    def feed(self, result, now=None):
+        """Process one Transcribe Result and return the cues it completes"""
+        if not result.alternatives:
+            return []
+        now = self.clock() if now is None else now
+        items = result.alternatives[0].items or []
+        state = self._results.get(result.result_id)
+        if state is None:
+            state = self._results[result.result_id] = _ResultState()
+
+        if not result.is_partial:
+            cues = self._commit(result, state, items, len(items), final=True)
+            transcript = result.alternatives[0].transcript
+            if not items and transcript:
+                cues.append(Cue(result.start_time, result.end_time, transcript, result.result_id))
+            del self._results[result.result_id]
+            return cues
+
+        state.result = result
+        done = self._committed_count(state, items)
+        stable = self._stable_count(items)
+        if stable <= done:
+            state.pending_since = None
+            return []
+        if state.pending_since is None:
+            state.pending_since = now
+
+        pending = items[done:stable]
+        cut = self._cut_point(pending)
+        if cut is None and now - state.pending_since >= self.max_latency:
+            cut = len(pending)
+        if cut is None:
+            return []
+        cues = self._commit(result, state, items, done + cut, final=False)
+        state.pending_since = now if done + cut < stable else None
+        return cues
+
+    def flush(self):
+        """At end of stream, emit what is left of results that never became final"""
+        cues = []
+        for state in self._results.values():
+            if state.result is not None:
+                items = state.result.alternatives[0].items or []
+                cues.extend(self._commit(state.result, state, items, len(items), final=True))
+        self._results.clear()
+        return cues
+
+    @staticmethod
+    def _stable_count(items):
+        """Length of the prefix of items the service marked stable"""
+        count = 0
+        while count < len(items) and items[count].stable is True:
+            count += 1
+        # Punctuation right after the stable prefix belongs to it
+        while 0 < count < len(items) and items[count].item_type == 'punctuation':
+            count += 1
+        return count
+
+    @staticmethod
+    def _committed_count(state, items):
+        """Length of the prefix of items whose audio was already emitted"""
+        if state.committed_end is None:
+            return 0
+        count = 0
+        for item in items:
+            if item.start_time is not None and item.end_time is not None:
+                # A revised word straddling the boundary goes with the side holding most of it
+                if (item.start_time + item.end_time) / 2 > state.committed_end + TIME_EPSILON:
+                    break
+            elif count == 0:
+                break       # Untimed items follow the item before them
+            count += 1
+        return count
+
+    def _cut_point(self, pending):
+        """Number of pending items that form a complete line, or None"""
+        length = 0
+        for i, item in enumerate(pending):
+            length += len(item.content or '') + (item.item_type != 'punctuation')
+            if length > self.max_chars + 1:
+                # Punctuation stays with the word before it
+                return i + 1 if item.item_type == 'punctuation' or i == 0 else i
+            if item.content and item.content[-1] in SENTENCE_END:
+                return i + 1
+        return None
+
+    def _commit(self, result, state, items, upto, final):
+        """Emit the not yet committed items before items[upto] as cues of at most max_chars"""
+        cues = []
+        done = self._committed_count(state, items)
+        while done < upto:
+            pending = items[done:upto]
+            cut = self._cut_point(pending) or len(pending)
+            chunk = pending[:cut]
+            start = chunk[0].start_time if chunk[0].start_time is not None else result.start_time
+            end = chunk[-1].end_time if chunk[-1].end_time is not None else result.end_time
+            text = join_items(chunk).strip()
+            if text:
+                cues.append(Cue(start, end, text, result.result_id, final))
+            if end is not None:
+                state.committed_end = max(end, state.committed_end or end)
+            done += cut
+        return cues
+
+
+class CaptionHandler(TranscriptResultStreamHandler):
+    """Turns one session's results into cues for its sink"""
+
+    def __init__(self, transcript_result_stream, sink, segmenter=None, timelines=(), label=''):
+        """
+        Args:
+            sink: object with write(cue) and async close()
+            timelines: TimelineMaps applied in order to map result times
+                       back to the source timeline
+            label: prefix for printed captions
+        """
+        super().__init__(transcript_result_stream)
+        self.sink = sink
+        self.segmenter = segmenter or CaptionSegmenter()
+        self.timelines = [t for t in timelines if t is not None]
+        self.label = label
+
+    async def handle_events(self):
+        try:
+            await super().handle_events()
+            for cue in self.segmenter.flush():
+                self.write_cue(cue)
+        finally:
+            await self.sink.close()
+
+    def write_cue(self, cue):
+        print(f"[{self.label}] {cue.text}")
+        self.sink.write(cue)
+
+    async def handle_transcript_event(self, transcript_event):
+        for result in transcript_event.transcript.results:
+            for timeline in self.timelines:
+                remap_result_times(result, timeline)
+            for cue in self.segmenter.feed(result):
+                self.write_cue(cue)
@@ -0,0 +1,300 @@
+"""
+Live caption fan-out over WebSocket and Server-Sent Events.
+
+Each channel's cue stream is published to any number of subscribers:
+  GET /channels                       channel names and subscriber counts
+  GET /channels/{name}/ws             WebSocket, one JSON text message per cue
+  GET /channels/{name}/events         SSE, `event: cue` with the same JSON;
+                                      Last-Event-ID resumes within the replay window
+An update is serialized once when it is published (JSON text, its UTF-8
+bytes for WebSocket frames and the complete SSE event), and the same
+objects are queued to every subscriber. Each subscriber has a bounded
+buffer: a client that cannot keep up loses its oldest updates rather
+than holding up the channel or growing memory. A late joiner first gets
+the updates of the last `replay_seconds`.
+
+Message: {"seq": 12, "start": 61.2, "end": 63.9, "text": "...", "final": true,
+          "published": 1700000000.123}
+
+A CaptionChannel is a caption sink (write(cue), async close()), so it can
+be fed by CaptionHandler directly or next to files through SinkGroup.
+
+Usage: python caption_server.py [--port 8090] [--demo-rate 2]
+"""
+
+import argparse
+import asyncio
+import collections
+import json
+import time
+from aiohttp import web, WSMsgType
+
+SSE_HEARTBEAT = 15.0
+
+
+class Update:
+    """One published cue, serialized once for every subscriber"""
+
+    __slots__ = ('seq', 'published', 'text', 'frame', 'sse')
+
+    def __init__(self, seq, cue, published):
+        self.seq = seq
+        self.published = published
+        self.text = json.dumps({
+            'seq': seq, 'start': round(cue.start, 3), 'end': round(cue.end, 3),
+            'text': cue.text, 'final': getattr(cue, 'final', True), 'published': round(published, 6),
+        }, ensure_ascii=False)
+        self.frame = self.text.encode('utf-8')
+        self.sse = b'id: %d\nevent: cue\ndata: %s\n\n' % (seq, self.frame)
+
+
+class Subscriber:
+    """Bounded per-client buffer; the oldest updates are dropped when it is full"""
+
+    __slots__ = ('buffer', 'dropped', 'delivered', '_wakeup', 'closed')
+
+    def __init__(self, max_buffer):
+        self.buffer = collections.deque(maxlen=max_buffer)
+        self.dropped = 0
+        self.delivered = 0
+        self.closed = False
+        self._wakeup = None
+
+    def push(self, update):
+        if len(self.buffer) == self.buffer.maxlen:
+            self.dropped += 1
+        self.buffer.append(update)
+        if self._wakeup is not None and not self._wakeup.done():
+            self._wakeup.set_result(None)
+
+    async def take(self, timeout=None):
+        """All buffered updates, waiting up to timeout for one (empty list on timeout)"""
+        if not self.buffer and not self.closed:
+            self._wakeup = asyncio.get_running_loop().create_future()
+            try:
+                await asyncio.wait_for(self._wakeup, timeout)
+            except asyncio.TimeoutError:
+                pass
+            finally:
+                self._wakeup = None
+        updates = list(self.buffer)
+        self.buffer.clear()
+        self.delivered += len(updates)
+        return updates
+
+    def close(self):
+        self.closed = True
+        if self._wakeup is not None and not self._wakeup.done():
+            self._wakeup.set_result(None)
+
+
+class CaptionChannel:
+    """The cue stream of one channel with its subscribers and replay window"""
+
+    def __init__(self, name, replay_seconds=30.0, max_replay=256, max_buffer=64):
+        """
+        Args:
+            name: channel name in URLs
+            replay_seconds: how far back (wall time) late joiners are replayed
+            max_replay: most updates kept for replay
+            max_buffer: per-subscriber buffer in updates (drop oldest)
+        """
+        self.name = name
+        self.replay_seconds = replay_seconds
+        self.max_buffer = max_buffer
+        self.replay = collections.deque(maxlen=max_replay)
+        self.subscribers = set()
+        self.seq = 0
+        self.published = 0
+
+    def write(self, cue):
+        """Publish a cue to every subscriber (caption sink interface)"""
+        if cue.start is None or cue.end is None:
+            return
+        self.seq += 1
+        update = Update(self.seq, cue, time.time())
+        self.replay.append(update)
+        for subscriber in self.subscribers:
+            subscriber.push(update)
+        self.published += 1
+
+    async def close(self):
+        """A pipeline run ended; the channel and its subscribers stay for the next one"""
+
+    def subscribe(self, after_seq=None):
+        """New subscriber, pre-filled with the replay window (or what came after after_seq)"""
+        subscriber = Subscriber(self.max_buffer)
+        horizon = time.time() - self.replay_seconds
+        for update in self.replay:
+            if after_seq is not None:
+                if update.seq > after_seq:
+                    subscriber.push(update)
+            elif update.published >= horizon:
+                subscriber.push(update)
+        self.subscribers.add(subscriber)
+        return subscriber
+
+    def unsubscribe(self, subscriber):
+        self.subscribers.discard(subscriber)
+        subscriber.close()
+
+    def stats(self):
+        return {
+            'subscribers': len(self.subscribers),
+            'published': self.published,
+            'dropped': sum(s.dropped for s in self.subscribers),
+        }
+
+
+class CaptionServer:
+    """aiohttp server for the caption channels of this process"""
+
+    def __init__(self, host='127.0.0.1', port=8090, replay_seconds=30.0, max_buffer=64):
+        self.host = host
+        self.port = port
+        self.replay_seconds = replay_seconds
+        self.max_buffer = max_buffer
+        self.channels = {}
+        self._runner = None
+
+    def channel(self, name):
+        """Get or create a channel (usable as a caption sink)"""
+        channel = self.channels.get(name)
+        if channel is None:
+            channel = self.channels[name] = CaptionChannel(
+                name, replay_seconds=self.replay_seconds, max_buffer=self.max_buffer)
+        return channel
+
+    async def start(self):
+        app = web.Application()
+        app.router.add_get('/channels', self.handle_channels)
+        app.router.add_get('/channels/{name}/ws', self.handle_websocket)
+        app.router.add_get('/channels/{name}/events', self.handle_events)
+        self._runner = web.AppRunner(app)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, self.host, self.port)
+        await site.start()
+        if self.port == 0:
+            self.port = site._server.sockets[0].getsockname()[1]
+        print(f"Captions on http://{self.host}:{self.port}/channels")
+        return self
+
+    async def stop(self):
+        for channel in self.channels.values():
+            for subscriber in list(channel.subscribers):
+                channel.unsubscribe(subscriber)
+        if self._runner is not None:
+            await self._runner.cleanup()
+            self._runner = None
+
+    async def handle_channels(self, request):
+        return web.json_response({name: c.stats() for name, c in self.channels.items()})
+
+    def _existing_channel(self, request):
+        """The channel a request names; unknown names are not created"""
+        channel = self.channels.get(request.match_info['name'])
+        if channel is None:
+            raise web.HTTPNotFound(text=f"no channel {request.match_info['name']!r}\n")
+        return channel
+
+    async def handle_websocket(self, request):
+        channel = self._existing_channel(request)
+        ws = web.WebSocketResponse(heartbeat=30.0)
+        await ws.prepare(request)
+        subscriber = channel.subscribe()
+        reader = asyncio.create_task(self._read_until_closed(ws, subscriber))
+        # Frames are sent from the shared UTF-8 bytes; older aiohttp encodes per client
+        send_frame = getattr(ws, 'send_frame', None)
+        try:
+            while not subscriber.closed:
+                for update in await subscriber.take():
+                    if send_frame is not None:
+                        await send_frame(update.frame, WSMsgType.TEXT)
+                    else:
+                        await ws.send_str(update.text)
+        except (ConnectionError, RuntimeError):
+            pass
+        finally:
+            channel.unsubscribe(subscriber)
+            reader.cancel()
+            await ws.close()
+        return ws
+
+    async def _read_until_closed(self, ws, subscriber):
+        """Subscribers only listen; this notices the client going away"""
+        try:
+            async for _ in ws:
+                pass
+        finally:
+            subscriber.close()
+
+    async def handle_events(self, request):
+        channel = self._existing_channel(request)
+        last_id = request.headers.get('Last-Event-ID') or request.query.get('last_event_id')
+        try:
+            after_seq = int(last_id) if last_id else None
+        except ValueError:
+            after_seq = None
+        response = web.StreamResponse(headers={
+            'Content-Type': 'text/event-stream',
+            'Cache-Control': 'no-cache',
+            'X-Accel-Buffering': 'no',
+        })
+        await response.prepare(request)
+        subscriber = channel.subscribe(after_seq)
+        try:
+            await response.write(b'retry: 2000\n\n')
+            while not subscriber.closed:
+                updates = await subscriber.take(SSE_HEARTBEAT)
+                if updates:
+                    await response.write(b''.join(u.sse for u in updates))
+                else:
+                    await response.write(b': keepalive\n\n')
+        except (ConnectionError, RuntimeError):
+            pass
+        finally:
+            channel.unsubscribe(subscriber)
+        return response
+
+
+async def _demo_publisher(channel, rate):
+    """Publish synthetic cues at `rate` per second (for load tests)"""
+    from caption_segmenter import Cue
+    t = 0.0
+    interval = 1.0 / rate
+    next_at = time.monotonic()
+    while True:
+        channel.write(Cue(t, t + interval, f"demo caption {channel.seq + 1} 演示字幕"))
+        t += interval
+        next_at += interval
+        await asyncio.sleep(max(0.0, next_at - time.monotonic()))
+
+
+async def main():
+    parser = argparse.ArgumentParser(description='Live caption WebSocket/SSE server')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8090)
+    parser.add_argument('--replay-seconds', type=float, default=30.0)
+    parser.add_argument('--buffer', type=int, default=64, help='Per-subscriber buffer in updates')
+    parser.add_argument('--demo-rate', type=float, default=0,
+                        help='Publish synthetic cues per second on channel "demo"')
+    args = parser.parse_args()
+
+    server = CaptionServer(args.host, args.port, args.replay_seconds, args.buffer)
+    await server.start()
+    demo = None
+    if args.demo_rate:
+        demo = asyncio.create_task(_demo_publisher(server.channel('demo'), args.demo_rate))
+    try:
+        await asyncio.Event().wait()
+    finally:
+        if demo is not None:
+            demo.cancel()
+        await server.stop()
+
+
+if __name__ == "__main__":
+    try:
+        asyncio.run(main())
+    except KeyboardInterrupt:
+        pass
@@ -0,0 +1,389 @@
+"""
+Append-only caption store with a memory-mapped time index.
+
+A store is two files next to each other:
+  <base>.cuelog  records of (start, end, text length) + UTF-8 text, in the
+                 order cues were written
+  <base>.cueidx  one fixed 24-byte entry per cue: (start key, end, offset
+                 of the record in the log)
+The log starts with an 8-byte magic; the index with a 24-byte header
+(magic, where the last session's audio ended, largest key lag) so entry i
+is at 24 * (i + 1). The start keys never decrease (a cue that arrives out
+of order is indexed at the previous start, and the header records by how
+much at most), so a time range is found with a binary search over the
+mapped index without reading or parsing anything else: O(log n) per
+lookup however long the channel runs.
+
+The log is the source of truth: when a crash left the index short or
+long, it is repaired from the log on open.
+
+Usage:
+    store = CaptionStore('captions/news.zh-CN')   # also a caption sink
+    store.write(cue)                              # from CaptionHandler
+    store.range(3600, 3610)                       # -> [Cue, ...]
+    store.export('news.srt', start=3600)          # SRT/WebVTT/TTML by extension
+"""
+
+import asyncio
+import bisect
+import mmap
+import os
+import struct
+import time
+import numpy as np
+from caption_segmenter import Cue
+from subtitle_sink import FORMATS
+
+LOG_MAGIC = b'CUELOG1\n'
+INDEX_MAGIC = b'CUEIDX1\n'
+INDEX_ENTRY = struct.Struct('<ddQ')      # start key, end, log offset
+INDEX_HEADER = struct.Struct('<8sdd')    # magic, session end, max key - start
+RECORD_HEADER = struct.Struct('<ddI')    # start, end, text bytes
+INDEX_DTYPE = np.dtype([('start', '<f8'), ('end', '<f8'), ('offset', '<u8')])
+
+
+class _StartKeys:
+    """Sequence view of the index start keys for bisect"""
+
+    __slots__ = ('_mm', '_n')
+
+    def __init__(self, mm, n):
+        self._mm = mm
+        self._n = n
+
+    def __len__(self):
+        return self._n
+
+    def __getitem__(self, i):
+        return struct.unpack_from('<d', self._mm, INDEX_ENTRY.size * (i + 1))[0]
+
+
+class CaptionStore:
+    """
+    Indexed, append-only cue log. It is also a caption sink (write(cue),
+    async close()), so it can be filled directly by CaptionHandler.
+    """
+
+    def __init__(self, base_path, readonly=False, flush_every=16, flush_interval=0.5, resume=False):
+        """
+        Args:
+            base_path: path without extension (.cuelog / .cueidx are added)
+            readonly: open for queries only, e.g. while another process appends
+            flush_every: flush once this many cues are buffered
+            flush_interval: flush buffered cues at most this many seconds late
+            resume: shift the cues written through this instance to where the
+                    previous session ended (see end_session), or past the
+                    stored cues, so a restarted session (whose times start at
+                    zero again) continues the channel timeline
+        """
+        self.base_path = base_path
+        self.log_path = base_path + '.cuelog'
+        self.index_path = base_path + '.cueidx'
+        self.readonly = readonly
+        self.flush_every = flush_every
+        self.flush_interval = flush_interval
+        self._log = None
+        self._index = None
+        self._pending = 0
+        self._flush_handle = None
+        self._index_map = None
+        self._log_map = None
+        self._mapped = 0
+        if not readonly:
+            directory = os.path.dirname(base_path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            self._repair()
+            self._log = open(self.log_path, 'ab')
+            self._index = open(self.index_path, 'ab')
+        self._load()
+        self.offset = max(self.end_time, self.session_end) if resume else 0.0
+
+    # Opening
+
+    def _repair(self):
+        """Create missing files and make the index agree with the log"""
+        for path, magic, header_size in ((self.log_path, LOG_MAGIC, len(LOG_MAGIC)),
+                                         (self.index_path, INDEX_MAGIC, INDEX_ENTRY.size)):
+            if not os.path.exists(path) or os.path.getsize(path) < header_size:
+                with open(path, 'wb') as f:
+                    f.write(magic.ljust(header_size, b'\0'))
+            with open(path, 'rb') as f:
+                if f.read(len(magic)) != magic:
+                    raise ValueError(f"{path} is not a caption store file")
+
+        log_size = os.path.getsize(self.log_path)
+        index_size = os.path.getsize(self.index_path)
+        n = index_size // INDEX_ENTRY.size - 1
+        with open(self.index_path, 'r+b') as index, open(self.log_path, 'r+b') as log:
+            _, session_end, max_lag = INDEX_HEADER.unpack(index.read(INDEX_HEADER.size))
+            # Entries must point at complete records
+            end = len(LOG_MAGIC)
+            key = float('-inf')
+            while n > 0:
+                index.seek(INDEX_ENTRY.size * n)
+                _, _, offset = INDEX_ENTRY.unpack(index.read(INDEX_ENTRY.size))
+                log.seek(offset)
+                header = log.read(RECORD_HEADER.size)
+                if len(header) == RECORD_HEADER.size:
+                    record_end = offset + RECORD_HEADER.size + RECORD_HEADER.unpack(header)[2]
+                    if record_end <= log_size:
+                        end = record_end
+                        index.seek(INDEX_ENTRY.size * n)
+                        key = INDEX_ENTRY.unpack(index.read(INDEX_ENTRY.size))[0]
+                        break
+                n -= 1
+            index.truncate(INDEX_ENTRY.size * (n + 1))
+            # Records after the last indexed one are indexed; a torn one is cut off
+            log.seek(end)
+            entries = []
+            while True:
+                header = log.read(RECORD_HEADER.size)
+                if len(header) < RECORD_HEADER.size:
+                    break
+                start, stop, length = RECORD_HEADER.unpack(header)
+                if end + RECORD_HEADER.size + length > log_size:
+                    break
+                log.seek(length, os.SEEK_CUR)
+                key = max(key, start)
+                max_lag = max(max_lag, key - start)
+                entries.append(INDEX_ENTRY.pack(key, stop, end))
+                end += RECORD_HEADER.size + length
+            if entries:
+                print(f"{self.base_path}: indexed {len(entries)} cues missing from the index")
+                index.seek(0, os.SEEK_END)
+                index.write(b''.join(entries))
+                index.seek(0)
+                index.write(INDEX_HEADER.pack(INDEX_MAGIC, session_end, max_lag))
+            log.truncate(end)
+
+    def _load(self):
+        """Map the files and derive the in-memory state"""
+        self._remap()
+        n = len(self)
+        self.max_duration = 0.0
+        self.end_time = 0.0
+        self._last_key = float('-inf')
+        self._read_header()
+        self._log_size = os.path.getsize(self.log_path)
+        if n:
+            entries = np.frombuffer(self._index_map, dtype=INDEX_DTYPE, count=n, offset=INDEX_ENTRY.size)
+            self.max_duration = float(np.max(entries['end'] - entries['start']))
+            self.end_time = float(np.max(entries['end']))
+            self._last_key = float(entries['start'][-1])
+            del entries
+
+    def _read_header(self):
+        _, self.session_end, self.max_lag = INDEX_HEADER.unpack_from(self._index_map, 0)
+
+    def _write_header(self):
+        with open(self.index_path, 'r+b') as f:
+            f.write(INDEX_HEADER.pack(INDEX_MAGIC, self.session_end, self.max_lag))
+
+    def _remap(self):
+        """(Re)map the index and log up to their current size"""
+        size = os.path.getsize(self.index_path)
+        n = size // INDEX_ENTRY.size - 1
+        if n == self._mapped and self._index_map is not None:
+            return
+        self._unmap()
+        with open(self.index_path, 'rb') as f:
+            self._index_map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        with open(self.log_path, 'rb') as f:
+            self._log_map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        self._mapped = max(0, n)
+
+    def _unmap(self):
+        for m in (self._index_map, self._log_map):
+            if m is not None:
+                try:
+                    m.close()
+                except BufferError:
+                    pass  # A view is still exported; released with the map
+        self._index_map = self._log_map = None
+
+    def refresh(self):
+        """Pick up cues appended by another process (readonly stores)"""
+        previous = self._mapped
+        self._remap()
+        self._read_header()
+        if self._mapped > previous:
+            entries = np.frombuffer(self._index_map, dtype=INDEX_DTYPE, count=self._mapped - previous,
+                                    offset=INDEX_ENTRY.size * (previous + 1))
+            self.max_duration = max(self.max_duration, float(np.max(entries['end'] - entries['start'])))
+            self.end_time = max(self.end_time, float(np.max(entries['end'])))
+            self._last_key = float(entries['start'][-1])
+            del entries
+
+    def __len__(self):
+        return self._mapped
+
+    # Writing
+
+    def append(self, start, end, text):
+        """Append one cue; visible to queries after the next flush"""
+        data = text.encode('utf-8')
+        key = start if start >= self._last_key else self._last_key
+        self._last_key = key
+        if key - start > self.max_lag:
+            # Written ahead of the entry, so a query never misses it
+            self.max_lag = key - start
+            self._write_header()
+        self.max_duration = max(self.max_duration, end - start)
+        self.end_time = max(self.end_time, end)
+        self._log.write(RECORD_HEADER.pack(start, end, len(data)))
+        self._log.write(data)
+        self._index.write(INDEX_ENTRY.pack(key, end, self._log_size))
+        self._log_size += RECORD_HEADER.size + len(data)
+        self._pending += 1
+
+    def write(self, cue):
+        """Caption sink interface: store a cue, flushing by count or time"""
+        if cue.start is None or cue.end is None:
+            return
+        self.append(cue.start + self.offset, cue.end + self.offset, cue.text)
+        if self._pending >= self.flush_every:
+            self.flush()
+        elif self._flush_handle is None:
+            try:
+                self._flush_handle = asyncio.get_running_loop().call_later(self.flush_interval, self.flush)
+            except RuntimeError:
+                pass  # Synchronous use: flushed by count, query or close
+
+    def end_session(self, t):
+        """
+        Record that the session writing through this instance has audio up
+        to session time t; a resuming store continues from there
+        """
+        if self.readonly or t is None:
+            return
+        self.session_end = max(self.session_end, t + self.offset)
+        self._write_header()
+
+    def flush(self):
+        """Make appended cues visible to queries and other processes (log before index)"""
+        if self._flush_handle is not None:
+            self._flush_handle.cancel()
+            self._flush_handle = None
+        if self._pending:
+            self._log.flush()
+            self._index.flush()
+            self._pending = 0
+
+    async def close(self):
+        self.close_sync()
+
+    def close_sync(self):
+        if self._log is not None:
+            self.flush()
+            self._log.close()
+            self._index.close()
+            self._log = self._index = None
+        self._unmap()
+
+    # Queries
+
+    def _sync(self):
+        if self._pending:
+            self.flush()
+        if self.readonly:
+            self.refresh()
+        else:
+            self._remap()
+
+    def _entry(self, i):
+        return INDEX_ENTRY.unpack_from(self._index_map, INDEX_ENTRY.size * (i + 1))
+
+    def _cue(self, offset):
+        start, end, length = RECORD_HEADER.unpack_from(self._log_map, offset)
+        begin = offset + RECORD_HEADER.size
+        return Cue(start, end, self._log_map[begin:begin + length].decode('utf-8'))
+
+    def _span(self, start, end):
+        """Index positions [lo, hi) that can overlap [start, end); filter them with _overlaps"""
+        keys = _StartKeys(self._index_map, len(self))
+        lo = bisect.bisect_left(keys, start - self.max_duration) if start is not None else 0
+        hi = bisect.bisect_left(keys, end + self.max_lag) if end is not None else len(self)
+        return lo, hi
+
+    def _overlaps(self, entry, start, end):
+        """Whether an index entry's cue overlaps [start, end)"""
+        key, cue_end, offset = entry
+        if start is not None and cue_end <= start:
+            return False
+        # Only a cue indexed at a raised key can start later than its key suggests
+        return end is None or key < end or RECORD_HEADER.unpack_from(self._log_map, offset)[0] < end
+
+    def range(self, start=None, end=None):
+        """Cues overlapping [start, end) seconds, in stored order"""
+        self._sync()
+        lo, hi = self._span(start, end)
+        cues = []
+        for i in range(lo, hi):
+            entry = self._entry(i)
+            if self._overlaps(entry, start, end):
+                cues.append(self._cue(entry[2]))
+        return cues
+
+    def at(self, t):
+        """Cues showing at time t"""
+        return [cue for cue in self.range(t, t + 1e-6) if cue.start <= t]
+
+    def __iter__(self):
+        self._sync()
+        for i in range(len(self)):
+            yield self._cue(self._entry(i)[2])
+
+    def export(self, path, start=None, end=None, fmt=None, rebase=False, batch=4096):
+        """
+        Write the cues overlapping [start, end) as SRT, WebVTT or TTML
+        (by `fmt` or the file extension). With rebase, times are shifted
+        so `start` is zero. Returns the number of cues written.
+        """
+        fmt = FORMATS[(fmt or os.path.splitext(path)[1][1:]).lower()]()
+        self._sync()
+        lo, hi = self._span(start, end)
+        offset = start if rebase and start is not None else 0.0
+        count = 0
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write(fmt.header)
+            for batch_start in range(lo, hi, batch):
+                parts = []
+                for i in range(batch_start, min(hi, batch_start + batch)):
+                    entry = self._entry(i)
+                    if not self._overlaps(entry, start, end):
+                        continue
+                    cue = self._cue(entry[2])
+                    if offset:
+                        cue.start = max(0.0, cue.start - offset)
+                        cue.end = max(0.0, cue.end - offset)
+                    count += 1
+                    parts.append(fmt.cue(count, cue))
+                f.write(''.join(parts))
+            f.write(fmt.footer)
+        return count
+
+
+def main():
+    import argparse
+    parser = argparse.ArgumentParser(description='Query or export a caption store')
+    parser.add_argument('store', help='Store path without extension')
+    parser.add_argument('--start', type=float, default=None)
+    parser.add_argument('--end', type=float, default=None)
+    parser.add_argument('--export', default=None, help='Output .srt/.vtt/.ttml file')
+    parser.add_argument('--rebase', action='store_true', help='Export times relative to --start')
+    args = parser.parse_args()
+
+    store = CaptionStore(args.store, readonly=True)
+    started = time.perf_counter()
+    if args.export:
+        count = store.export(args.export, args.start, args.end, rebase=args.rebase)
+        print(f"Exported {count} cues to {args.export} in {time.perf_counter() - started:.3f}s")
+    else:
+        for cue in store.range(args.start, args.end):
+            print(cue)
+    store.close_sync()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,329 @@
+"""
+Record and replay transcription sessions.
+
+A capture file is a sequence of chunks, each a 16-byte header
+(kind, payload length, t) followed by the payload, padded to 8 bytes:
+  META  JSON: sample rate, language code, wall clock start, source
+  SRC   PCM read from the source before DSP (when the source records it)
+  SENT  PCM passed to send_audio_event
+  EVT   JSON: a TranscriptEvent in its wire shape plus "sent", the seconds
+        of audio sent when it arrived
+`t` is monotonic seconds since the capture started. CaptureReader maps
+the file and indexes the chunk headers once; audio is returned as
+memoryviews of the mapping, so a long recording is neither copied nor
+parsed up front.
+
+Replay feeds the recording back through the pipeline without a TS source
+or a Transcribe session: ReplayClient stands in for the Transcribe client
+and returns the recorded events once as much audio as at recording time
+has been sent again (at 1x also not before their recorded time). With
+the SRC audio, DSP runs again, so AudioProcessor and caption segmentation
+changes can be benchmarked on identical input at 1x or at full speed.
+
+Usage:
+    python test_network_stream.py --source ts --url ... --capture session.cap
+    python capture.py info session.cap
+    python capture.py replay session.cap [--speed 1|max] [--dsp] [--output captions]
+"""
+
+import argparse
+import asyncio
+import json
+import mmap
+import os
+import struct
+import time
+
+MAGIC = b'CAPTURE1'
+HEADER = struct.Struct('<4sId')     # kind, payload bytes, t
+META, SOURCE, SENT, EVENT = b'META', b'SRC ', b'SENT', b'EVT '
+BYTES_PER_SECOND = 32000
+
+
+def _padding(length):
+    return -length % 8
+
+
+class CaptureWriter:
+    """Appends chunks to a capture file; audio is written as it is sent"""
+
+    def __init__(self, path, language_code=None, source=None, sample_rate=16000, buffer_size=1 << 20):
+        self.path = path
+        self.started = time.monotonic()
+        self.sent_seconds = 0.0
+        self.bytes_per_second = sample_rate * 2
+        self.chunks = 0
+        self._file = open(path, 'wb', buffering=buffer_size)
+        self._file.write(MAGIC)
+        self._write(META, json.dumps({
+            'sample_rate': sample_rate,
+            'language_code': language_code,
+            'source': source,
+            'started': time.time(),
+        }).encode('utf-8'))
+
+    def _write(self, kind, payload):
+        if self._file is None:
+            return
+        self._file.write(HEADER.pack(kind, len(payload), time.monotonic() - self.started))
+        self._file.write(payload)
+        padding = _padding(len(payload))
+        if padding:
+            self._file.write(b'\0' * padding)
+        self.chunks += 1
+
+    def source_audio(self, chunk):
+        self._write(SOURCE, chunk)
+
+    def sent_audio(self, chunk):
+        self._write(SENT, chunk)
+        self.sent_seconds += len(chunk) / self.bytes_per_second
+
+    def event(self, transcript_event):
+        from transcript_events import event_to_dict
+        node = event_to_dict(transcript_event)
+        node['sent'] = round(self.sent_seconds, 6)
+        self._write(EVENT, json.dumps(node, ensure_ascii=False, separators=(',', ':')).encode('utf-8'))
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+
+async def record_events(output_stream, capture):
+    """Pass a TranscriptResultStream through, recording every event"""
+    async for event in output_stream:
+        if hasattr(event, 'transcript'):
+            capture.event(event)
+        yield event
+
+
+async def record_source(chunks, capture):
+    """Pass source PCM through, recording it"""
+    async for chunk in chunks:
+        capture.source_audio(chunk)
+        yield chunk
+
+
+class CaptureReader:
+    """Memory-mapped capture file with an index of its chunks"""
+
+    def __init__(self, path):
+        self.path = path
+        self._file = open(path, 'rb')
+        self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        if self._map[:len(MAGIC)] != MAGIC:
+            raise ValueError(f"{path} is not a capture file")
+        # (kind, t, payload offset, payload length) per chunk; a torn last chunk is ignored
+        self.index = []
+        offset = len(MAGIC)
+        size = len(self._map)
+        while offset + HEADER.size <= size:
+            kind, length, t = HEADER.unpack_from(self._map, offset)
+            start = offset + HEADER.size
+            if start + length > size:
+                break
+            self.index.append((kind, t, start, length))
+            offset = start + length + _padding(length)
+        self.metadata = {}
+        for kind, _, start, length in self.index:
+            if kind == META:
+                self.metadata = json.loads(self._map[start:start + length])
+                break
+
+    def chunks(self, kind):
+        """(t, memoryview) of every chunk of a kind; views are valid until close()"""
+        view = memoryview(self._map)
+        return [(t, view[start:start + length]) for k, t, start, length in self.index if k == kind]
+
+    def events(self):
+        """[(t, sent_seconds, TranscriptEvent)] in arrival order"""
+        from transcript_events import event_from_dict
+        events = []
+        for kind, t, start, length in self.index:
+            if kind == EVENT:
+                node = json.loads(self._map[start:start + length])
+                events.append((t, node.get('sent', 0.0), event_from_dict(node)))
+        return events
+
+    def seconds(self, kind):
+        return sum(length for k, _, _, length in self.index if k == kind) / BYTES_PER_SECOND
+
+    def close(self):
+        try:
+            self._map.close()
+        except BufferError:
+            pass  # Views still exported; the mapping goes with them
+        self._file.close()
+
+
+class _ReplayInput:
+    def __init__(self, stream):
+        self.stream = stream
+
+    async def send_audio_event(self, audio_chunk):
+        self.stream.sent_seconds += len(audio_chunk or b'') / BYTES_PER_SECOND
+        self.stream.progress.set()
+
+    async def end_stream(self):
+        self.stream.ended = True
+        self.stream.progress.set()
+
+
+class ReplayStream:
+    """start_stream_transcription() result that answers with recorded events"""
+
+    def __init__(self, events, speed):
+        self.events = events
+        self.speed = speed
+        self.sent_seconds = 0.0
+        self.ended = False
+        self.progress = asyncio.Event()
+        self.response = None
+        self.input_stream = _ReplayInput(self)
+        self.output_stream = self._output()
+
+    async def _output(self):
+        started = time.monotonic()
+        for t, sent, event in self.events:
+            # Not before the audio that produced it has been sent again
+            while self.sent_seconds + 1e-6 < sent and not self.ended:
+                self.progress.clear()
+                await self.progress.wait()
+            if self.speed:
+                wait = started + t / self.speed - time.monotonic()
+                if wait > 0:
+                    await asyncio.sleep(wait)
+            yield event
+
+
+class ReplayClient:
+    """Transcribe client look-alike replaying the events of a capture"""
+
+    def __init__(self, reader, speed=1.0):
+        self.reader = reader
+        self.speed = speed
+
+    async def start_stream_transcription(self, language_code, media_sample_rate_hz, media_encoding, **kwargs):
+        return ReplayStream(self.reader.events(), self.speed)
+
+
+async def replay_audio(chunks, speed=1.0):
+    """Yield recorded (t, chunk) audio at its recorded times (speed=None: no waiting)"""
+    started = time.monotonic()
+    for t, chunk in chunks:
+        if speed:
+            wait = started + t / speed - time.monotonic()
+            if wait > 0:
+                await asyncio.sleep(wait)
+        yield chunk
+
+
+async def replay(path, speed=1.0, dsp=False, sink=None, language_code=None, channel='replay'):
+    """
+    Run a capture through transcribe_network_stream with ReplayClient.
+    With dsp, the recorded source audio is denoised again (AudioProcessor);
+    otherwise the recorded sent audio is used as is. Returns run statistics.
+    """
+    from metrics import channel_metrics
+    from transcribe_audio import transcribe_network_stream
+    reader = CaptureReader(path)
+    metrics = channel_metrics(channel)
+    try:
+        if dsp:
+            if not reader.seconds(SOURCE):
+                raise ValueError(f"{path} has no source audio to run DSP on")
+            from audio_processor import AudioProcessor
+            processor = AudioProcessor(metrics=metrics)
+
+            async def audio():
+                async for chunk in processor.process_stream(replay_audio(reader.chunks(SOURCE), speed)):
+                    yield chunk
+                tail = await processor.drain()
+                if tail is not None:
+                    yield tail
+            audio_stream = audio()
+        else:
+            audio_stream = replay_audio(reader.chunks(SENT), speed)
+
+        started = time.perf_counter()
+        await transcribe_network_stream(
+            audio_stream, pacing='live', sink=sink,
+            language_code=language_code or reader.metadata.get('language_code') or 'zh-CN',
+            channel=channel, client=ReplayClient(reader, speed))
+        wall = time.perf_counter() - started
+        return {
+            'wall': wall,
+            'audio_seconds': reader.seconds(SOURCE if dsp else SENT),
+            'events': sum(1 for k, *_ in reader.index if k == EVENT),
+            'dsp_seconds': metrics.dsp_seconds.sum,
+            'handle_seconds': metrics.event_seconds.sum,
+        }
+    finally:
+        reader.close()
+
+
+def _info(path):
+    reader = CaptureReader(path)
+    counts = {}
+    for kind, t, _, length in reader.index:
+        count, size, last = counts.get(kind, (0, 0, 0.0))
+        counts[kind] = (count + 1, size + length, max(last, t))
+    print(f"{path}: {os.path.getsize(path) / 1e6:.1f} MB, {reader.metadata}")
+    for kind, (count, size, last) in counts.items():
+        print(f"  {kind.decode().strip():4s} {count:7d} chunks {size / 1e6:8.2f} MB  last at {last:.1f}s")
+    reader.close()
+
+
+class _CountingSink:
+    def __init__(self, sink=None):
+        self.sink = sink
+        self.cues = 0
+
+    def write(self, cue):
+        self.cues += 1
+        if self.sink is not None:
+            self.sink.write(cue)
+
+    async def close(self):
+        if self.sink is not None:
+            await self.sink.close()
+
+
+async def _replay_main(args):
+    sink = None
+    if args.output:
+        from subtitle_sink import SubtitleSink
+        sink = SubtitleSink(args.output, formats=('srt',))
+    counting = _CountingSink(sink)
+    speed = None if args.speed == 'max' else float(args.speed)
+    stats = await replay(args.path, speed=speed, dsp=args.dsp, sink=counting)
+    audio = stats['audio_seconds']
+    print(f"\nreplayed {audio:.1f}s of audio and {stats['events']} events in {stats['wall']:.2f}s "
+          f"({audio / max(stats['wall'], 1e-9):.1f}x real time): {counting.cues} cues")
+    if args.dsp:
+        print(f"DSP: {stats['dsp_seconds']:.3f}s ({stats['dsp_seconds'] / max(audio, 1e-9) * 1000:.2f} ms "
+              f"per audio second)")
+    print(f"result handling and captioning: {stats['handle_seconds'] * 1000:.1f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Inspect or replay a capture file')
+    sub = parser.add_subparsers(dest='command', required=True)
+    info = sub.add_parser('info')
+    info.add_argument('path')
+    rep = sub.add_parser('replay')
+    rep.add_argument('path')
+    rep.add_argument('--speed', default='1', help='Real-time multiple, or "max"')
+    rep.add_argument('--dsp', action='store_true', help='Denoise the recorded source audio again')
+    rep.add_argument('--output', default=None, help='Write the captions to <output>.srt')
+    args = parser.parse_args()
+    if args.command == 'info':
+        _info(args.path)
+    else:
+        asyncio.run(_replay_main(args))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,432 @@
+"""
+Runs many captioning channels (TS stream or microphone -> transcription)
+in one event loop.
+
+Channels come from a JSON config:
+
+    {
+        "max_cpu_percent": 80,
+        "dsp": "shm",
+        "dsp_workers": 4,
+        "metrics_port": 9108,
+        "caption_port": 8090,
+        "channels": [
+            {"name": "news", "source": "ts", "url": "http://host/news.ts", "vad": "compress",
+             "languages": ["zh-CN", "en-US"]},
+            {"name": "studio", "source": "mic"}
+        ]
+    }
+
+Per channel options: source ("ts" or "mic"), url, pacing, vad
+("off"/"suppress"/"compress"), languages (Transcribe language codes,
+default ["zh-CN"]; several share one decode), endpoint (Transcribe endpoint
+override, e.g. ws://127.0.0.1:8765 for local_transcribe.py), latency_budget
+(seconds from reading TS audio to sending it; beyond it the channel
+degrades step by step, see backpressure.py), reconnect / max_outage (restart
+a lost TS source and bridge the gap for up to max_outage seconds, default
+on for network URLs and 30s), caption_store (directory for an indexed
+caption store per channel and language, see caption_store.py),
+chunk_latency (seconds a sample may wait for its audio event; event size
+then adapts to the send cost, see pacer.ChunkSizer; single-language
+channels) and enabled.
+
+Each pipeline run writes its captions to "<name>.<language>.<run>.srt"
+and ".vtt" in the working directory, with cue times from the start of that
+run; a restart starts the next run number instead of overwriting earlier
+captions (the caption store continues one timeline across runs).
+
+With metrics_port, per-stage metrics of all channels (see metrics.py) are
+served at http://127.0.0.1:<metrics_port>/metrics. With caption_port, every
+channel's cues are published live over WebSocket and SSE as
+"<name>.<language>" (see caption_server.py).
+
+Every channel has a health state and is restarted with exponential backoff
+when its pipeline ends or stalls. New pipelines are only started while the
+host has CPU headroom, one at a time. SIGTERM/SIGINT stops admissions and
+closes the sources so every session can send its remaining audio and
+receive its final results before the process exits.
+
+Usage: python channel_supervisor.py channels.json
+"""
+
+import argparse
+import asyncio
+import itertools
+import json
+import os
+import random
+import signal
+import time
+from transcribe_audio import transcribe_network_stream, prewarm
+from language_fanout import transcribe_fanout
+from ts_player import TSPlayer
+from mic_input import MicrophoneInput
+from dsp_executor import create_executor
+from metrics import start_metrics_server
+from vad import VoiceActivityGate
+from subtitle_sink import SubtitleSink, SinkGroup
+from caption_store import CaptionStore
+
+# Channel states
+PENDING = 'pending'
+ADMISSION = 'waiting_for_cpu'
+STARTING = 'starting'
+RUNNING = 'running'
+STALLED = 'stalled'
+BACKOFF = 'backoff'
+DRAINING = 'draining'
+STOPPED = 'stopped'
+
+# Subtitle files written per channel, language and pipeline run
+SUBTITLE_FORMATS = ('srt', 'vtt')
+
+
+class CPUMonitor:
+    """Host CPU utilisation (percent of all cores) from /proc/stat, or load average elsewhere"""
+
+    def __init__(self):
+        self._last = self._read_proc_stat()
+
+    @staticmethod
+    def _read_proc_stat():
+        try:
+            with open('/proc/stat') as f:
+                fields = [int(v) for v in f.readline().split()[1:]]
+        except (OSError, ValueError):
+            return None
+        idle = fields[3] + (fields[4] if len(fields) > 4 else 0)
+        return sum(fields), idle
+
+    def percent(self):
+        """Utilisation since the previous call"""
+        current = self._read_proc_stat()
+        if current is None or self._last is None:
+            try:
+                return 100.0 * os.getloadavg()[0] / (os.cpu_count() or 1)
+            except OSError:
+                return 0.0
+        total = current[0] - self._last[0]
+        idle = current[1] - self._last[1]
+        self._last = current
+        if total <= 0:
+            return 0.0
+        return 100.0 * (total - idle) / total
+
+
+def _next_run_path(base_path, formats):
+    """
+    "<base_path>.<n>" for the first run number n without files in any of
+    the formats, so a restarted pipeline never overwrites an earlier run
+    """
+    for run in itertools.count(1):
+        path = f"{base_path}.{run:04d}"
+        if not any(os.path.exists(f"{path}.{fmt}") for fmt in formats):
+            return path
+
+
+class Channel:
+    """Configuration and health of one captioning channel"""
+
+    def __init__(self, config):
+        self.name = config['name']
+        self.config = config
+        self.state = PENDING
+        self.task = None
+        self.source = None
+        self.vad = None
+        self.restarts = 0
+        self.failures = 0           # consecutive short-lived runs
+        self.last_error = None
+        self.started_at = None
+        self.last_chunk_at = None
+        self.chunks = 0
+
+    def status(self):
+        now = time.monotonic()
+        return {
+            'name': self.name,
+            'state': self.state,
+            'restarts': self.restarts,
+            'uptime': now - self.started_at if self.started_at and self.state == RUNNING else 0.0,
+            'idle': now - self.last_chunk_at if self.last_chunk_at else None,
+            'chunks': self.chunks,
+            'last_error': self.last_error,
+        }
+
+
+class ChannelSupervisor:
+    """
+    Supervises a set of Channels. One pipeline task per channel; a watchdog
+    restarts channels whose source produced no audio for `stall_timeout`.
+    """
+
+    def __init__(self, channels, executor=None, max_cpu_percent=80.0, admission_settle=2.0,
+                 stall_timeout=30.0, backoff_initial=1.0, backoff_max=60.0, healthy_after=60.0,
+                 drain_timeout=10.0, status_interval=60.0, cpu_monitor=None, metrics_port=None,
+                 caption_port=None):
+        """
+        Args:
+            channels: list of channel config dicts
+            executor: optional DSPExecutor shared by all channels
+            max_cpu_percent: do not start pipelines above this host CPU usage
+            admission_settle: seconds between pipeline starts, so the CPU
+                              measurement reflects the previous start
+            stall_timeout: restart a channel after this many seconds without audio
+            backoff_initial, backoff_max: restart delay bounds (seconds)
+            healthy_after: a run this long resets the backoff
+            drain_timeout: seconds a channel gets to finish on shutdown
+            status_interval: seconds between status prints (0 disables)
+            metrics_port: serve Prometheus metrics on this port while running
+            caption_port: serve live captions (WebSocket/SSE) on this port
+        """
+        self.channels = [Channel(c) for c in channels if c.get('enabled', True)]
+        self.executor = executor
+        self.max_cpu_percent = max_cpu_percent
+        self.admission_settle = admission_settle
+        self.stall_timeout = stall_timeout
+        self.backoff_initial = backoff_initial
+        self.backoff_max = backoff_max
+        self.healthy_after = healthy_after
+        self.drain_timeout = drain_timeout
+        self.status_interval = status_interval
+        self.cpu = cpu_monitor or CPUMonitor()
+        self.metrics_port = metrics_port
+        self.caption_server = None
+        if caption_port:
+            # aiohttp.web is only imported when captions are served
+            from caption_server import CaptionServer
+            self.caption_server = CaptionServer(port=caption_port)
+            # Configured channels can be subscribed to before their pipeline runs
+            for channel in self.channels:
+                for code in channel.config.get('languages', ['zh-CN']):
+                    self.caption_server.channel(f"{channel.name}.{code}")
+        self._admission_lock = asyncio.Lock()
+        self._stopping = asyncio.Event()
+
+    @classmethod
+    def from_config(cls, path, **kwargs):
+        with open(path, encoding='utf-8') as f:
+            config = json.load(f)
+        executor = create_executor(config.get('dsp', 'inline'), config.get('dsp_workers'))
+        return cls(config['channels'], executor=executor,
+                   max_cpu_percent=config.get('max_cpu_percent', 80.0),
+                   metrics_port=config.get('metrics_port'), caption_port=config.get('caption_port'),
+                   **kwargs)
+
+    # Lifecycle
+
+    def install_signal_handlers(self):
+        loop = asyncio.get_running_loop()
+        for sig in (signal.SIGINT, signal.SIGTERM):
+            loop.add_signal_handler(sig, self.request_stop)
+
+    def request_stop(self):
+        if not self._stopping.is_set():
+            self._stopping.set()
+            print("\nShutdown requested, draining channels...")
+
+    @property
+    def stopping(self):
+        return self._stopping.is_set()
+
+    async def run(self):
+        """Run all channels until request_stop(), then drain them"""
+        print(f"Supervising {len(self.channels)} channels")
+        # Credentials and each channel's connection are set up before the first admission
+        warm = [asyncio.create_task(prewarm(c.config.get('endpoint'), c.name)) for c in self.channels]
+        metrics_runner = None
+        if self.metrics_port:
+            metrics_runner = await start_metrics_server(self.metrics_port)
+        if self.caption_server is not None:
+            await self.caption_server.start()
+        for channel in self.channels:
+            channel.task = asyncio.create_task(self._supervise(channel), name=f"channel-{channel.name}")
+        watchdog = asyncio.create_task(self._watchdog())
+        try:
+            await self._stopping.wait()
+        finally:
+            watchdog.cancel()
+            for task in warm:
+                task.cancel()
+            await self._drain()
+            if self.executor:
+                self.executor.shutdown()
+            if metrics_runner is not None:
+                await metrics_runner.cleanup()
+            if self.caption_server is not None:
+                await self.caption_server.stop()
+
+    async def _drain(self):
+        for channel in self.channels:
+            if channel.source is not None:
+                channel.state = DRAINING
+                # Stopping the source ends its audio stream; the session then
+                # sends end-of-stream and waits for its final results
+                await self._stop_source(channel)
+        tasks = [c.task for c in self.channels if c.task is not None]
+        if not tasks:
+            return
+        done, pending = await asyncio.wait(tasks, timeout=self.drain_timeout)
+        for task in pending:
+            task.cancel()
+        await asyncio.gather(*pending, return_exceptions=True)
+        for channel in self.channels:
+            channel.state = STOPPED
+        print(f"Drained {len(done)} channels, cancelled {len(pending)}")
+
+    # Per channel
+
+    async def _supervise(self, channel):
+        while not self.stopping:
+            channel.state = ADMISSION
+            if not await self._admit(channel):
+                break
+            channel.state = STARTING
+            channel.started_at = time.monotonic()
+            channel.last_chunk_at = channel.started_at
+            try:
+                await self._run_pipeline(channel)
+                channel.last_error = 'stalled' if channel.state == STALLED else 'source ended'
+            except Exception as e:
+                channel.last_error = str(e)
+                print(f"[{channel.name}] pipeline error: {e}")
+            finally:
+                await self._close_source(channel)
+
+            if self.stopping:
+                break
+            ran = time.monotonic() - channel.started_at
+            channel.failures = 0 if ran >= self.healthy_after else channel.failures + 1
+            delay = min(self.backoff_max, self.backoff_initial * 2 ** max(0, channel.failures - 1))
+            delay *= random.uniform(0.8, 1.2)
+            channel.state = BACKOFF
+            channel.restarts += 1
+            print(f"[{channel.name}] stopped after {ran:.1f}s ({channel.last_error}), "
+                  f"restarting in {delay:.1f}s")
+            try:
+                await asyncio.wait_for(self._stopping.wait(), timeout=delay)
+            except asyncio.TimeoutError:
+                pass
+        channel.state = STOPPED
+
+    async def _admit(self, channel):
+        """Wait for CPU headroom; pipelines are started one at a time"""
+        async with self._admission_lock:
+            self.cpu.percent()  # Start a fresh measurement interval
+            while not self.stopping:
+                await asyncio.sleep(self.admission_settle)
+                usage = self.cpu.percent()
+                if usage < self.max_cpu_percent:
+                    return True
+                print(f"[{channel.name}] waiting for CPU headroom ({usage:.0f}% used)")
+            return False
+
+    def _build_source(self, config):
+        if config.get('source', 'ts') == 'mic':
+            return MicrophoneInput()
+        return TSPlayer(config['url'], executor=self.executor, channel=config['name'],
+                        latency_budget=config.get('latency_budget'), reconnect=config.get('reconnect'),
+                        max_outage=config.get('max_outage', 30.0))
+
+    async def _run_pipeline(self, channel):
+        config = channel.config
+        channel.source = self._build_source(config)
+        vad_mode = config.get('vad', 'off')
+        channel.vad = VoiceActivityGate(mode=vad_mode) if vad_mode != 'off' else None
+        pacing = config.get('pacing', 'live') if config.get('source', 'ts') == 'ts' else 'live'
+        audio = self._track(channel, channel.source.get_audio_stream())
+        timeline = getattr(channel.source, 'timeline', None)
+        languages = config.get('languages', ['zh-CN'])
+        if len(languages) > 1:
+            await transcribe_fanout(audio, languages, pacing=pacing, vad=channel.vad,
+                                    sink_factory=lambda code: SinkGroup(*self._caption_sinks(config, code)),
+                                    endpoint=config.get('endpoint'), channel=channel.name,
+                                    timeline=timeline)
+        else:
+            await transcribe_network_stream(audio, pacing=pacing, vad=channel.vad,
+                                            language_code=languages[0], endpoint=config.get('endpoint'),
+                                            channel=channel.name, timeline=timeline,
+                                            sink=SinkGroup(*self._caption_sinks(config, languages[0])),
+                                            chunk_latency=config.get('chunk_latency'))
+
+    def _caption_sinks(self, config, language_code):
+        """Subtitle files, caption store and live publishing for one language of a channel"""
+        name = f"{config['name']}.{language_code}"
+        sinks = [SubtitleSink(_next_run_path(name, SUBTITLE_FORMATS), formats=SUBTITLE_FORMATS)]
+        if config.get('caption_store'):
+            # Each pipeline run continues the stored timeline where the last one ended
+            sinks.append(CaptionStore(os.path.join(config['caption_store'], name), resume=True))
+        if self.caption_server is not None:
+            sinks.append(self.caption_server.channel(name))
+        return sinks
+
+    async def _track(self, channel, audio_stream):
+        """Pass audio through, recording liveness"""
+        async for chunk in audio_stream:
+            if channel.state == STARTING or channel.state == STALLED:
+                channel.state = RUNNING
+            channel.chunks += 1
+            channel.last_chunk_at = time.monotonic()
+            yield chunk
+
+    async def _close_source(self, channel):
+        """Close a source once its pipeline has returned and nothing reads from it"""
+        source, channel.source = channel.source, None
+        if source is not None:
+            try:
+                await source.close()
+            except Exception as e:
+                print(f"[{channel.name}] error closing source: {e}")
+
+    async def _stop_source(self, channel):
+        """
+        End a source's audio stream from outside its pipeline task. The
+        pipeline may be mid-read, so only ffmpeg is stopped here; the stream
+        reaches EOF and closes its pipe and DSP lane itself.
+        """
+        source, channel.source = channel.source, None
+        if source is not None:
+            try:
+                await source.stop()
+            except Exception as e:
+                print(f"[{channel.name}] error stopping source: {e}")
+
+    async def _watchdog(self):
+        last_status = time.monotonic()
+        while True:
+            await asyncio.sleep(1.0)
+            now = time.monotonic()
+            for channel in self.channels:
+                if (channel.state in (STARTING, RUNNING) and channel.last_chunk_at is not None
+                        and now - channel.last_chunk_at > self.stall_timeout):
+                    print(f"[{channel.name}] no audio for {now - channel.last_chunk_at:.0f}s, restarting")
+                    channel.state = STALLED
+                    await self._stop_source(channel)
+            if self.status_interval and now - last_status >= self.status_interval:
+                last_status = now
+                self.print_status()
+
+    def status(self):
+        return [c.status() for c in self.channels]
+
+    def print_status(self):
+        for s in self.status():
+            print(f"  {s['name']:20s} {s['state']:16s} restarts {s['restarts']:3d}  "
+                  f"chunks {s['chunks']:8d}  last error: {s['last_error'] or '-'}")
+
+
+async def main():
+    parser = argparse.ArgumentParser(description='Caption many channels in one process')
+    parser.add_argument('config', help='JSON channel configuration')
+    parser.add_argument('--stall-timeout', type=float, default=30.0)
+    parser.add_argument('--status-interval', type=float, default=60.0)
+    args = parser.parse_args()
+
+    supervisor = ChannelSupervisor.from_config(args.config, stall_timeout=args.stall_timeout,
+                                               status_interval=args.status_interval)
+    supervisor.install_signal_handlers()
+    await supervisor.run()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,304 @@
+"""
+Live DASH caption publishing.
+
+Cues are cut into fixed-duration WebVTT segments and announced in a dynamic
+MPD through a caption AdaptationSet with a SegmentTemplate/SegmentTimeline.
+The manifest text outside that AdaptationSet is kept as cached prefix and
+suffix strings, so an update only re-renders the caption AdaptationSet and
+the MPD publishTime. Segments and the manifest are written to a temporary
+file and atomically renamed, so any static HTTP server pointed at the
+output directory serves only complete files.
+
+Usage (replay a recorded caption log and serve it):
+    python dash_caption_publisher.py out_dir --corpus corpus/captions/zh_cn_partials.jsonl --port 8000
+"""
+
+import argparse
+import asyncio
+import datetime
+import itertools
+import os
+import re
+import time
+from subtitle_sink import format_timestamp
+
+MPD_NS = "urn:mpeg:dash:schema:mpd:2011"
+
+
+# Temporary file names are unique per write, so concurrent writes of one path never share one
+_tmp_ids = itertools.count()
+
+
+def atomic_write(path, data):
+    """Write bytes to path via a temporary file and rename"""
+    tmp = f"{path}.{os.getpid()}.{next(_tmp_ids)}.tmp"
+    with open(tmp, 'wb') as f:
+        f.write(data)
+    os.replace(tmp, path)
+
+
+def _iso_time(timestamp):
+    return datetime.datetime.fromtimestamp(timestamp, datetime.timezone.utc).strftime('%Y-%m-%dT%H:%M:%S.%fZ')[:-4] + 'Z'
+
+
+def _template_availability_start(template):
+    """UNIX time of a manifest's availabilityStartTime, or None if it has none"""
+    match = re.search(r'<MPD\b[^>]*\bavailabilityStartTime="([^"]+)"', template)
+    if match is None:
+        return None
+    value = datetime.datetime.fromisoformat(match.group(1).replace('Z', '+00:00'))
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=datetime.timezone.utc)
+    return value.timestamp()
+
+
+class DashCaptionPublisher:
+    """
+    Publishes a cue stream as segmented WebVTT for a live DASH presentation.
+
+    Cue times are media (presentation) seconds. Segment n covers
+    [n * segment_duration, (n + 1) * segment_duration); it is published once
+    the media clock passes its end plus `publish_delay`, which should cover
+    the captioning latency. Cues that arrive for an already published
+    segment are moved into the next open one.
+    """
+
+    def __init__(self, output_dir, segment_duration=2.0, language='zh', publish_delay=2.0,
+                 window_segments=30, mpd_template=None, mpd_name='captions.mpd',
+                 availability_start=None):
+        """
+        Args:
+            output_dir: directory served over HTTP
+            segment_duration: seconds per caption segment
+            language: lang attribute of the caption AdaptationSet
+            publish_delay: seconds a segment stays open after its end
+            window_segments: segments kept on disk and in the manifest
+            mpd_template: optional dynamic MPD (text) to add the caption track
+                          to; a caption-only manifest is generated otherwise
+            mpd_name: manifest file name in output_dir
+            availability_start: UNIX time of media time 0 (defaults to the
+                                template's availabilityStartTime, or now)
+        """
+        self.output_dir = output_dir
+        self.segment_duration = segment_duration
+        self.language = language
+        self.publish_delay = publish_delay
+        self.window_segments = window_segments
+        self.mpd_path = os.path.join(output_dir, mpd_name)
+        if availability_start is None and mpd_template is not None:
+            availability_start = _template_availability_start(mpd_template)
+        self.availability_start = availability_start or time.time()
+        self.media_prefix = f"captions_{language}_"
+
+        self._open_cues = {}        # segment number -> [cue]
+        self._next_segment = 0      # first segment not yet published
+        self._first_segment = 0     # oldest segment still in the window
+        self.segments_published = 0
+        self.manifest_updates = 0
+        # run() and close() publish from different tasks; one advance+apply at a time
+        self._publish_lock = asyncio.Lock()
+
+        os.makedirs(output_dir, exist_ok=True)
+        self._prefix, self._suffix = self._split_template(mpd_template or self._default_template())
+
+    # Manifest
+
+    def _default_template(self):
+        return (
+            '<?xml version="1.0" encoding="UTF-8"?>\n'
+            f'<MPD xmlns="{MPD_NS}" type="dynamic" profiles="urn:mpeg:dash:profile:isoff-live:2011" '
+            f'availabilityStartTime="{_iso_time(self.availability_start)}" '
+            f'publishTime="{_iso_time(self.availability_start)}" '
+            f'minimumUpdatePeriod="PT{self.segment_duration:g}S" '
+            f'timeShiftBufferDepth="PT{self.segment_duration * self.window_segments:g}S" '
+            'minBufferTime="PT2S">\n'
+            ' <Period id="0" start="PT0S">\n'
+            ' </Period>\n'
+            '</MPD>\n'
+        )
+
+    def _split_template(self, template):
+        """
+        Split the manifest into the text before and after the caption
+        AdaptationSet. An existing text/vtt AdaptationSet is replaced,
+        otherwise the caption track goes first in the first Period.
+        """
+        existing = re.search(r'[ \t]*<AdaptationSet[^>]*mimeType="text/vtt"[^>]*>.*?</AdaptationSet>[ \t]*\n?',
+                             template, re.S)
+        if existing:
+            prefix, suffix = template[:existing.start()], template[existing.end():]
+        else:
+            period = re.search(r'<Period[^>]*>[ \t]*\n?', template)
+            if period is None:
+                raise ValueError("MPD template has no Period")
+            prefix, suffix = template[:period.end()], template[period.end():]
+
+        # publishTime is the only attribute outside the caption track that changes
+        if 'publishTime="' not in prefix:
+            prefix = re.sub(r'<MPD\b', '<MPD publishTime=""', prefix, count=1)
+        return prefix, suffix
+
+    def _adaptation_set(self):
+        """Render the caption AdaptationSet for the current segment window"""
+        timescale = 1000
+        duration = int(round(self.segment_duration * timescale))
+        count = self._next_segment - self._first_segment
+        timeline = ''
+        if count > 0:
+            repeat = f' r="{count - 1}"' if count > 1 else ''
+            timeline = f'<S t="{self._first_segment * duration}" d="{duration}"{repeat}/>'
+        return (
+            f'  <AdaptationSet id="captions-{self.language}" contentType="text" mimeType="text/vtt" lang="{self.language}">\n'
+            f'   <Role schemeIdUri="urn:mpeg:dash:role:2011" value="subtitle"/>\n'
+            f'   <SegmentTemplate timescale="{timescale}" media="{self.media_prefix}$Number$.vtt" '
+            f'startNumber="{self._first_segment}">\n'
+            f'    <SegmentTimeline>{timeline}</SegmentTimeline>\n'
+            f'   </SegmentTemplate>\n'
+            f'   <Representation id="caption_{self.language}" bandwidth="256"/>\n'
+            f'  </AdaptationSet>\n'
+        )
+
+    def _manifest(self):
+        prefix = re.sub(r'publishTime="[^"]*"', f'publishTime="{_iso_time(time.time())}"',
+                        self._prefix, count=1)
+        return (prefix + self._adaptation_set() + self._suffix).encode('utf-8')
+
+    # Segments
+
+    def write(self, cue):
+        """Add a cue to every open segment it overlaps"""
+        if cue.start is None or cue.end is None:
+            return
+        first = max(int(cue.start // self.segment_duration), self._next_segment)
+        last = max(int(cue.end // self.segment_duration), first)
+        for number in range(first, last + 1):
+            self._open_cues.setdefault(number, []).append(cue)
+
+    def _segment_bytes(self, number):
+        lines = ['WEBVTT', 'X-TIMESTAMP-MAP=MPEGTS:0,LOCAL:00:00:00.000', '']
+        segment_start = number * self.segment_duration
+        for cue in self._open_cues.pop(number, []):
+            # Late cues moved into this segment start no earlier than the segment
+            start = max(cue.start, segment_start)
+            end = max(cue.end, start + 0.001)
+            lines.append(f"{format_timestamp(start, '.')} --> {format_timestamp(end, '.')}")
+            lines.append(cue.text)
+            lines.append('')
+        return ('\n'.join(lines) + '\n').encode('utf-8')
+
+    def _segment_path(self, number):
+        return os.path.join(self.output_dir, f"{self.media_prefix}{number}.vtt")
+
+    def advance(self, media_time):
+        """
+        Publish every segment whose end plus publish_delay is before
+        media_time. Returns the list of (path, bytes) writes to perform and
+        the stale segment paths to remove; see publish_due().
+        """
+        writes = []
+        while (self._next_segment + 1) * self.segment_duration + self.publish_delay <= media_time:
+            number = self._next_segment
+            writes.append((self._segment_path(number), self._segment_bytes(number)))
+            self._next_segment += 1
+            self.segments_published += 1
+
+        removals = []
+        while self._next_segment - self._first_segment > self.window_segments:
+            removals.append(self._segment_path(self._first_segment))
+            self._first_segment += 1
+
+        if writes:
+            # Segments first, then the manifest that announces them
+            writes.append((self.mpd_path, self._manifest()))
+            self.manifest_updates += 1
+        return writes, removals
+
+    @staticmethod
+    def apply(writes, removals):
+        """Perform the file operations returned by advance() (blocking)"""
+        for path, data in writes:
+            atomic_write(path, data)
+        for path in removals:
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+
+    async def publish_due(self, media_time):
+        """
+        advance() on the event loop, file writes on a worker thread. Calls are
+        serialized, so manifests land in the order their segments were cut.
+        """
+        async with self._publish_lock:
+            writes, removals = self.advance(media_time)
+            if writes or removals:
+                await asyncio.to_thread(self.apply, writes, removals)
+
+    def media_time(self):
+        """Media time implied by the wall clock"""
+        return time.time() - self.availability_start
+
+    async def run(self, stop_event=None):
+        """Publish segments as the wall clock advances until stop_event is set"""
+        while stop_event is None or not stop_event.is_set():
+            await self.publish_due(self.media_time())
+            await asyncio.sleep(self.segment_duration / 4)
+
+    async def close(self):
+        """Publish all open segments"""
+        last = max(self._open_cues, default=self._next_segment - 1)
+        await self.publish_due((last + 1) * self.segment_duration + self.publish_delay)
+
+
+async def _replay_and_serve(args):
+    from aiohttp import web
+    from caption_segmenter import CaptionSegmenter
+    from transcript_events import load_event_log
+
+    template = None
+    if args.mpd_template:
+        with open(args.mpd_template, encoding='utf-8') as f:
+            template = f.read()
+    publisher = DashCaptionPublisher(args.output_dir, segment_duration=args.segment_duration,
+                                     language=args.language, mpd_template=template)
+    app = web.Application()
+    app.router.add_static('/', args.output_dir)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    await web.TCPSite(runner, '127.0.0.1', args.port).start()
+    print(f"Serving http://127.0.0.1:{args.port}/{os.path.basename(publisher.mpd_path)}")
+
+    stop = asyncio.Event()
+    publish_task = asyncio.create_task(publisher.run(stop))
+    segmenter = CaptionSegmenter()
+    start = time.monotonic()
+    for t, event in load_event_log(args.corpus):
+        await asyncio.sleep(max(0.0, start + t - time.monotonic()))
+        for result in event.transcript.results:
+            for cue in segmenter.feed(result, now=t):
+                publisher.write(cue)
+    for cue in segmenter.flush():
+        publisher.write(cue)
+    await publisher.close()
+    stop.set()
+    await publish_task
+    print(f"Published {publisher.segments_published} segments, "
+          f"{publisher.manifest_updates} manifest updates")
+    await asyncio.sleep(args.linger)
+    await runner.cleanup()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Replay captions into a live DASH caption track')
+    parser.add_argument('output_dir')
+    parser.add_argument('--corpus', default='corpus/captions/zh_cn_partials.jsonl')
+    parser.add_argument('--mpd-template', default=None, help='Dynamic MPD to add the caption track to')
+    parser.add_argument('--segment-duration', type=float, default=2.0)
+    parser.add_argument('--language', default='zh')
+    parser.add_argument('--port', type=int, default=8000)
+    parser.add_argument('--linger', type=float, default=0.0, help='Keep serving N seconds after the replay')
+    asyncio.run(_replay_and_serve(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,352 @@
+"""
+Byte-range audio fetcher for on-demand DASH (SegmentBase) representations.
+
+The `sidx` box at the representation's indexRange lists the subsegments
+(byte ranges and durations) of the single media file. Subsegments are then
+fetched with HTTP range requests over a pooled keep-alive aiohttp session,
+a bounded number of them ahead of the consumer, and can be piped into an
+ffmpeg decoder starting at any subsegment.
+
+Usage (serve the sample MPD with synthetic media locally and fetch it):
+    python dash_fetcher.py [--start SECONDS] [--delay MS] [--prefetch N]
+"""
+
+import argparse
+import asyncio
+import bisect
+import collections
+import os
+import shutil
+import struct
+import tempfile
+import time
+import aiohttp
+from dash_player import DashPlayer
+from pcm_ring import open_pipe
+
+
+class Subsegment:
+    """One sidx reference: a byte range of the media file and its time span (seconds)"""
+
+    __slots__ = ('first_byte', 'last_byte', 'start_time', 'duration')
+
+    def __init__(self, first_byte, last_byte, start_time, duration):
+        self.first_byte = first_byte
+        self.last_byte = last_byte
+        self.start_time = start_time
+        self.duration = duration
+
+    def __repr__(self):
+        return f"Subsegment({self.first_byte}-{self.last_byte} @{self.start_time:.3f}s)"
+
+
+def parse_sidx(data, offset):
+    """
+    Parse the first sidx box in `data`, which was read from byte `offset` of
+    the media file. Returns a list of Subsegments with absolute byte ranges.
+    """
+    pos = 0
+    while pos + 8 <= len(data):
+        size, box_type = struct.unpack_from('>I4s', data, pos)
+        header = 8
+        if size == 1:
+            size = struct.unpack_from('>Q', data, pos + 8)[0]
+            header = 16
+        if size < header:
+            raise ValueError(f"Invalid box size {size} at byte {offset + pos}")
+        if box_type == b'sidx':
+            break
+        pos += size
+    else:
+        raise ValueError("No sidx box in index range")
+
+    p = pos + header
+    version = data[p]
+    p += 4                                          # version + flags
+    _, timescale = struct.unpack_from('>II', data, p)
+    p += 8
+    if version == 0:
+        earliest, first_offset = struct.unpack_from('>II', data, p)
+        p += 8
+    else:
+        earliest, first_offset = struct.unpack_from('>QQ', data, p)
+        p += 16
+    _, count = struct.unpack_from('>HH', data, p)
+    p += 4
+
+    # Offsets are relative to the first byte after the sidx box
+    byte = offset + pos + size + first_offset
+    t = earliest
+    subsegments = []
+    for _ in range(count):
+        ref, duration, _ = struct.unpack_from('>III', data, p)
+        p += 12
+        if ref & 0x80000000:
+            raise ValueError("Hierarchical sidx (references to sidx boxes) is not supported")
+        length = ref & 0x7fffffff
+        subsegments.append(Subsegment(byte, byte + length - 1, t / timescale, duration / timescale))
+        byte += length
+        t += duration
+    return subsegments
+
+
+class DashAudioFetcher:
+    """
+    Fetches the audio of one SegmentBase representation subsegment by
+    subsegment.
+
+    All requests share one aiohttp session whose connector keeps at most
+    `max_connections` keep-alive connections; `prefetch` subsegment requests
+    run ahead of the consumer, and results are delivered in order.
+    """
+
+    def __init__(self, player, representation=None, max_connections=4, prefetch=4,
+                 session=None, force_close=False):
+        """
+        Args:
+            player: DashPlayer with a parsed MPD
+            representation: audio Representation to fetch; defaults to the
+                            lowest bandwidth one (enough for transcription)
+            max_connections: size of the connection pool
+            prefetch: subsegments requested ahead of the consumer
+            session: optional shared aiohttp.ClientSession
+            force_close: disable keep-alive (for comparison only)
+        """
+        self.player = player
+        if representation is None:
+            adaptation_set = player.get_audio_adaptation_set()
+            if adaptation_set is None or not adaptation_set.representations:
+                raise ValueError("MPD has no audio representation")
+            representation = min(adaptation_set.representations,
+                                 key=lambda r: int(r.bandwidth or 0))
+        if representation.segment_base.index_range is None:
+            raise ValueError(f"Representation {representation.id} has no SegmentBase indexRange")
+        self.representation = representation
+        self.url = player.get_media_url(representation)
+        self.max_connections = max_connections
+        self.prefetch = max(1, prefetch)
+        self.force_close = force_close
+        self._session = session
+        self._own_session = session is None
+        self.init_segment = b''
+        self.subsegments = []
+        self._starts = []
+
+        # Measurement counters
+        self.requests = 0
+        self.connections = 0
+        self.bytes_fetched = 0
+
+    async def _on_connection(self, session, context, params):
+        self.connections += 1
+
+    async def open(self):
+        """Create the session and load the initialization segment and sidx"""
+        if self._session is None:
+            trace = aiohttp.TraceConfig()
+            trace.on_connection_create_end.append(self._on_connection)
+            connector = aiohttp.TCPConnector(limit=self.max_connections,
+                                             force_close=self.force_close)
+            self._session = aiohttp.ClientSession(connector=connector, trace_configs=[trace])
+
+        segment_base = self.representation.segment_base
+        index_start, index_end = segment_base.index_range
+        requests = [self.fetch_range(index_start, index_end)]
+        if segment_base.initialization is not None:
+            requests.append(self.fetch_range(*segment_base.initialization))
+        results = await asyncio.gather(*requests)
+        self.subsegments = parse_sidx(results[0], index_start)
+        self._starts = [s.start_time for s in self.subsegments]
+        if len(results) > 1:
+            self.init_segment = results[1]
+        return self
+
+    async def close(self):
+        if self._own_session and self._session is not None:
+            await self._session.close()
+        self._session = None
+
+    async def __aenter__(self):
+        return await self.open()
+
+    async def __aexit__(self, *exc):
+        await self.close()
+
+    async def fetch_range(self, first_byte, last_byte):
+        """GET one inclusive byte range"""
+        self.requests += 1
+        headers = {'Range': f'bytes={first_byte}-{last_byte}'}
+        async with self._session.get(self.url, headers=headers) as response:
+            response.raise_for_status()
+            data = await response.read()
+        if response.status != 206:
+            # Server ignored the Range header and sent the whole file
+            data = data[first_byte:last_byte + 1]
+        self.bytes_fetched += len(data)
+        return data
+
+    def find_subsegment(self, start_time):
+        """Index of the subsegment containing start_time (seconds)"""
+        return max(0, bisect.bisect_right(self._starts, start_time) - 1)
+
+    async def segments(self, start_time=0.0):
+        """
+        Yield the initialization segment, then the media subsegments from
+        the one containing start_time, keeping up to `prefetch` requests in
+        flight.
+        """
+        if self.init_segment:
+            yield self.init_segment
+        pending = collections.deque()
+        upcoming = iter(self.subsegments[self.find_subsegment(start_time):])
+        try:
+            for subsegment in upcoming:
+                pending.append(asyncio.ensure_future(
+                    self.fetch_range(subsegment.first_byte, subsegment.last_byte)))
+                if len(pending) >= self.prefetch:
+                    yield await pending.popleft()
+            while pending:
+                yield await pending.popleft()
+        finally:
+            for task in pending:
+                task.cancel()
+
+    async def start_decoder(self, start_time=0.0, sample_rate=16000):
+        """
+        Start ffmpeg decoding the fetched stream to 16-bit mono PCM.
+        Returns (process, read_fd, feed_task); read the PCM from read_fd
+        with PCMRingBuffer.chunks_from_fd and close it with close_pipe.
+        """
+        read_fd, write_fd = open_pipe()
+        try:
+            process = await asyncio.create_subprocess_exec(
+                'ffmpeg', '-loglevel', 'error', '-i', 'pipe:0',
+                '-vn', '-acodec', 'pcm_s16le', '-ar', str(sample_rate), '-ac', '1',
+                '-f', 's16le', 'pipe:1',
+                stdin=asyncio.subprocess.PIPE,
+                stdout=write_fd,
+            )
+        finally:
+            os.close(write_fd)
+        feed_task = asyncio.create_task(self._feed(process, start_time))
+        return process, read_fd, feed_task
+
+    async def _feed(self, process, start_time):
+        try:
+            async for data in self.segments(start_time):
+                process.stdin.write(data)
+                await process.stdin.drain()
+        except (BrokenPipeError, ConnectionResetError):
+            print("Decoder closed its input")
+        except Exception as e:
+            print(f"Error fetching DASH audio: {e}")
+        finally:
+            if not process.stdin.is_closing():
+                process.stdin.close()
+
+    def stats(self):
+        return {
+            'requests': self.requests,
+            'connections': self.connections,
+            'bytes_fetched': self.bytes_fetched,
+            'subsegments': len(self.subsegments),
+        }
+
+
+# Local test server
+
+def build_sidx(subsegment_sizes, durations, timescale=1000):
+    """Serialize a version 0 sidx box for contiguous subsegments"""
+    body = struct.pack('>BBBBIIIIHH', 0, 0, 0, 0, 1, timescale, 0, 0, 0, len(subsegment_sizes))
+    for size, duration in zip(subsegment_sizes, durations):
+        body += struct.pack('>III', size, duration, 0x90000000)
+    return struct.pack('>I4s', 8 + len(body), b'sidx') + body
+
+
+def write_synthetic_media(path, init_range, index_range, segment_size=4000, segment_ms=5000):
+    """
+    Write a stand-in media file whose layout matches an MPD SegmentBase:
+    padding up to the index range, a sidx exactly filling it, then
+    subsegments made of a moof/mdat pair. The payload is not decodable.
+    """
+    index_length = index_range[1] - index_range[0] + 1
+    count = (index_length - 32) // 12
+    if count <= 0 or 32 + 12 * count != index_length:
+        raise ValueError(f"Index range {index_range} does not fit a version 0 sidx")
+    init_length = index_range[0] if init_range is None else init_range[1] + 1
+    with open(path, 'wb') as f:
+        f.write(struct.pack('>I4s', init_length, b'free') + bytes(init_length - 8))
+        f.write(bytes(index_range[0] - init_length))
+        f.write(build_sidx([segment_size] * count, [segment_ms] * count))
+        for i in range(count):
+            f.write(struct.pack('>I4sI', 12, b'moof', i))
+            f.write(struct.pack('>I4s', segment_size - 20, b'mdat') + bytes(segment_size - 20))
+
+
+async def serve_directory(path, port=0, delay=0.0):
+    """
+    Serve a directory over HTTP (with Range support) on 127.0.0.1.
+    `delay` adds per-request latency to mimic a remote origin.
+    Returns (runner, base_url).
+    """
+    from aiohttp import web
+
+    @web.middleware
+    async def add_latency(request, handler):
+        if delay:
+            await asyncio.sleep(delay)
+        return await handler(request)
+
+    app = web.Application(middlewares=[add_latency])
+    app.router.add_static('/', path)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    site = web.TCPSite(runner, '127.0.0.1', port)
+    await site.start()
+    port = site._server.sockets[0].getsockname()[1]
+    return runner, f"http://127.0.0.1:{port}/"
+
+
+async def _demo(args):
+    workdir = tempfile.mkdtemp(prefix='dash-fetch-')
+    try:
+        mpd_name = os.path.basename(args.mpd)
+        shutil.copy(args.mpd, os.path.join(workdir, mpd_name))
+        runner, base_url = await serve_directory(workdir, delay=args.delay / 1000.0)
+        player = await asyncio.to_thread(DashPlayer, base_url + mpd_name)
+        for representation in player.get_audio_adaptation_set().representations:
+            segment_base = representation.segment_base
+            write_synthetic_media(os.path.join(workdir, representation.base_url),
+                                  segment_base.initialization, segment_base.index_range)
+
+        for name, options in (
+            ("sequential, new connection per request", dict(prefetch=1, force_close=True)),
+            (f"pooled keep-alive, prefetch {args.prefetch}",
+             dict(prefetch=args.prefetch, max_connections=args.prefetch)),
+        ):
+            async with DashAudioFetcher(player, **options) as fetcher:
+                started = time.perf_counter()
+                count = 0
+                async for _ in fetcher.segments(args.start):
+                    count += 1
+                elapsed = time.perf_counter() - started
+                stats = fetcher.stats()
+            print(f"{name:40s} {count} segments in {elapsed:6.3f}s  "
+                  f"requests {stats['requests']}  connections {stats['connections']}  "
+                  f"{stats['bytes_fetched'] / 1024:.0f} KiB")
+        await runner.cleanup()
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Fetch DASH audio subsegments from a local test server')
+    parser.add_argument('--mpd', default='dash/elephants_dream_480p_heaac5_1_https.mpd')
+    parser.add_argument('--start', type=float, default=0.0, help='Start time in seconds')
+    parser.add_argument('--delay', type=float, default=20.0, help='Server latency per request (ms)')
+    parser.add_argument('--prefetch', type=int, default=4)
+    asyncio.run(_demo(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
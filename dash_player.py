@@ -66,10 +66,16 @@ class MPD:
             self.periods.append(Period(period))
 
 class DashPlayer:
-    def __init__(self, mpd_url):
+    def __init__(self, mpd_url, mpd=None):
+        """
+        Args:
+            mpd_url: manifest URL
+            mpd: already parsed manifest (e.g. mpd_loader.MPDLoader.document);
+                 the manifest is downloaded and parsed when omitted
+        """
         self.mpd_url = mpd_url
         self.base_url = self._get_base_url(mpd_url)
-        self.mpd = self._parse_mpd()
+        self.mpd = mpd if mpd is not None else self._parse_mpd()
 
     def _get_base_url(self, url):
         return url.rsplit('/', 1)[0] + '/'
@@ -0,0 +1,194 @@
+import asyncio
+import collections
+import concurrent.futures
+import itertools
+import os
+
+# Per-process AudioProcessor instances used by process-pool lanes, keyed by
+# the channel key. Each key is pinned to one single-worker lane, so its
+# processor lives in exactly one worker process.
+_worker_processors = {}
+
+
+def _worker_processor(key, sample_rate, streaming):
+    from audio_processor import AudioProcessor
+    processor = _worker_processors.get(key)
+    if processor is None:
+        processor = AudioProcessor(sample_rate=sample_rate, streaming=streaming)
+        _worker_processors[key] = processor
+    return processor
+
+
+def to_bytes(result):
+    """
+    Processor output as bytes (None stays None). Output is a view of a
+    worker-local buffer; results cross the process boundary by pickling,
+    which needs real bytes.
+    """
+    return bytes(result) if result is not None else None
+
+
+def _process_in_worker(key, sample_rate, streaming, chunk):
+    """Process one chunk with the worker-local processor for this key"""
+    return to_bytes(_worker_processor(key, sample_rate, streaming).process_chunk_sync(chunk))
+
+
+def _flush_in_worker(key, sample_rate, streaming):
+    return to_bytes(_worker_processor(key, sample_rate, streaming).flush())
+
+
+def _cleanup_in_worker(key):
+    processor = _worker_processors.pop(key, None)
+    if processor is not None:
+        processor.cleanup()
+
+
+_END = object()
+
+
+async def map_ordered(submit, items, max_in_flight):
+    """
+    Submit each item from an async iterable and yield results in input
+    order, keeping at most max_in_flight submissions outstanding. A result
+    is yielded as soon as it and the ones before it are done; reading the
+    next item is raced against the oldest submission, so a live source
+    does not hold finished results back until more input arrives.
+    """
+    items = aiter(items)
+    pending = collections.deque()
+    next_item = None
+    try:
+        while True:
+            while pending and pending[0].done():
+                yield pending.popleft().result()
+            if len(pending) >= max_in_flight:
+                yield await pending.popleft()
+                continue
+            if next_item is None:
+                next_item = asyncio.ensure_future(anext(items, _END))
+            if pending:
+                await asyncio.wait((next_item, pending[0]), return_when=asyncio.FIRST_COMPLETED)
+                if not next_item.done():
+                    continue
+            item = await next_item
+            next_item = None
+            if item is _END:
+                break
+            pending.append(submit(item))
+        while pending:
+            yield await pending.popleft()
+    finally:
+        for future in pending:
+            future.cancel()
+        if next_item is not None and not next_item.done():
+            next_item.cancel()
+            try:
+                await next_item
+            except (asyncio.CancelledError, Exception):
+                pass
+
+
+class DSPExecutor:
+    """
+    Runs CPU-bound audio processing off the event loop.
+
+    The executor is made of single-worker "lanes" (threads or processes).
+    Each channel key is pinned to the least loaded lane, so chunks of one
+    channel run in submission order (stateful DSP stays consistent) while
+    different channels run on different cores.
+    """
+
+    def __init__(self, mode='thread', max_workers=None, max_in_flight=4):
+        """
+        Args:
+            mode: 'thread' or 'process'
+            max_workers: number of lanes (defaults to the CPU count)
+            max_in_flight: chunks per channel submitted ahead of the consumer
+        """
+        if mode not in ('thread', 'process'):
+            raise ValueError(f"Unsupported executor mode: {mode}")
+        self.mode = mode
+        self.max_workers = max_workers or os.cpu_count() or 1
+        self.max_in_flight = max(1, max_in_flight)
+        self._lanes = [None] * self.max_workers
+        self._lane_load = [0] * self.max_workers
+        self._lane_of = {}
+        self._keys = itertools.count()
+
+    def new_key(self):
+        """Allocate a channel key and pin it to the least loaded lane"""
+        key = next(self._keys)
+        lane = min(range(self.max_workers), key=self._lane_load.__getitem__)
+        self._lane_of[key] = lane
+        self._lane_load[lane] += 1
+        return key
+
+    def _lane(self, key):
+        index = self._lane_of[key]
+        lane = self._lanes[index]
+        if lane is None:
+            if self.mode == 'process':
+                lane = concurrent.futures.ProcessPoolExecutor(max_workers=1)
+            else:
+                lane = concurrent.futures.ThreadPoolExecutor(
+                    max_workers=1, thread_name_prefix=f"dsp-{index}"
+                )
+            self._lanes[index] = lane
+        return lane
+
+    def submit(self, key, fn, *args):
+        """Schedule fn(*args) on the key's lane and return an asyncio future"""
+        loop = asyncio.get_running_loop()
+        return loop.run_in_executor(self._lane(key), fn, *args)
+
+    def submit_chunk(self, processor, chunk):
+        """Schedule AudioProcessor work for one chunk"""
+        key = processor.executor_key
+        if self.mode == 'process':
+            return self.submit(key, _process_in_worker, key,
+                               processor.sample_rate, processor.streaming, bytes(chunk))
+        return self.submit(key, processor.process_chunk_sync, chunk)
+
+    def submit_flush(self, processor):
+        key = processor.executor_key
+        if self.mode == 'process':
+            return self.submit(key, _flush_in_worker, key,
+                               processor.sample_rate, processor.streaming)
+        return self.submit(key, processor.flush)
+
+    def map_ordered(self, submit, items):
+        """Submit each item and yield results in input order (see map_ordered)"""
+        return map_ordered(submit, items, self.max_in_flight)
+
+    def release(self, processor):
+        """Forget a channel key and drop its worker-side state"""
+        key = processor.executor_key
+        lane = self._lane_of.pop(key, None)
+        if lane is None:
+            return
+        self._lane_load[lane] -= 1
+        if self.mode == 'process' and self._lanes[lane] is not None:
+            try:
+                self._lanes[lane].submit(_cleanup_in_worker, key)
+            except RuntimeError:
+                pass  # Lane already shut down
+
+    def shutdown(self, wait=True):
+        """Stop all lanes"""
+        for index, lane in enumerate(self._lanes):
+            if lane is not None:
+                lane.shutdown(wait=wait, cancel_futures=True)
+                self._lanes[index] = None
+
+
+def create_executor(mode, max_workers=None):
+    """
+    Executor for AudioProcessor by name: 'inline' (None), 'thread',
+    'process' (pickled chunks) or 'shm' (shared-memory worker processes)
+    """
+    if mode in (None, 'inline'):
+        return None
+    if mode == 'shm':
+        from shm_dsp import SharedMemoryDSPPool
+        return SharedMemoryDSPPool(workers=max_workers)
+    return DSPExecutor(mode=mode, max_workers=max_workers)
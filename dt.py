@@ -1,14 +1,13 @@
-import datetime
+from subtitle_sink import format_timestamp
 
 def convert_to_srt_time(seconds):
     """
     将秒数转换为 SRT 时间格式 (HH:MM:SS,MS)
     """
-    dt = datetime.datetime(1900, 1, 1) + datetime.timedelta(seconds=seconds)
-    ms = dt.microsecond // 1000
-    return f"{dt.hour:02d}:{dt.minute:02d}:{dt.second:02d},{ms:03d}"
+    return format_timestamp(seconds)
 
-# 示例用法
-seconds = 162.875
-srt_time = convert_to_srt_time(seconds)
-print(srt_time)
\ No newline at end of file
+if __name__ == "__main__":
+    # 示例用法
+    seconds = 162.875
+    srt_time = convert_to_srt_time(seconds)
+    print(srt_time)
@@ -0,0 +1,171 @@
+"""
+Flaky live HTTP source for testing TS ingest recovery.
+
+Serves a media file as a live stream at GET /<anything>: the file plays in
+a loop on a wall clock, and every request gets the bytes from the current
+live position on, paced in real time. Every `outage_every` seconds the
+source goes down for `outage_seconds`:
+  - drop:   open responses are cut off and new requests get 503
+  - refuse: as drop, but new connections are reset without a response
+  - stall:  open responses stop sending (ffmpeg's -rw_timeout ends them)
+A client reconnecting after an outage resumes at the live position, so the
+outage is a real gap in the stream.
+
+WAV files are served with a fresh header on every request; other files
+(MPEG-TS) are cut at 188-byte packet boundaries and need --bytes-per-second
+unless it can be taken from the WAV header.
+
+Usage: python flaky_source.py media.ts --bytes-per-second 24000 [--port 8080]
+       [--outage-every 20] [--outage-seconds 3] [--mode drop|refuse|stall]
+       then e.g. python test_network_stream.py --source ts --url http://127.0.0.1:8080/live.ts
+"""
+
+import argparse
+import asyncio
+import struct
+import time
+import wave
+from aiohttp import web
+
+TS_PACKET = 188
+SEND_INTERVAL = 0.1
+
+
+class FlakySource:
+    """Live loop of one media file with scheduled outages"""
+
+    def __init__(self, path, bytes_per_second=None, outage_every=20.0, outage_seconds=3.0,
+                 mode='drop', host='127.0.0.1', port=8080):
+        if mode not in ('drop', 'refuse', 'stall'):
+            raise ValueError(f"Unsupported outage mode: {mode}")
+        self.header = b''
+        if path.lower().endswith('.wav'):
+            with wave.open(path, 'rb') as w:
+                rate, channels, width = w.getframerate(), w.getnchannels(), w.getsampwidth()
+                self.data = w.readframes(w.getnframes())
+            self.header = _wav_header(rate, channels, width)
+            self.align = channels * width
+            bytes_per_second = bytes_per_second or rate * channels * width
+        else:
+            with open(path, 'rb') as f:
+                self.data = f.read()
+            self.align = TS_PACKET
+            if not bytes_per_second:
+                raise ValueError("--bytes-per-second is needed for non-WAV sources")
+        self.data = self.data[:len(self.data) - len(self.data) % self.align]
+        self.bytes_per_second = bytes_per_second
+        self.outage_every = outage_every
+        self.outage_seconds = outage_seconds
+        self.mode = mode
+        self.host = host
+        self.port = port
+        self.outages = 0
+        self._start = time.monotonic()
+        self._runner = None
+
+    def position(self):
+        """Byte offset of the live position in the looped file"""
+        offset = int((time.monotonic() - self._start) * self.bytes_per_second)
+        return (offset - offset % self.align) % len(self.data)
+
+    def is_down(self):
+        if not self.outage_every:
+            return False
+        elapsed = time.monotonic() - self._start
+        return elapsed % self.outage_every >= self.outage_every - self.outage_seconds
+
+    async def start(self):
+        app = web.Application()
+        app.router.add_get('/{name:.*}', self.handle)
+        self._runner = web.AppRunner(app)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, self.host, self.port)
+        await site.start()
+        if self.port == 0:
+            self.port = site._server.sockets[0].getsockname()[1]
+        return self
+
+    async def stop(self):
+        if self._runner is not None:
+            await self._runner.cleanup()
+            self._runner = None
+
+    async def handle(self, request):
+        if self.is_down():
+            if self.mode == 'refuse' and request.transport is not None:
+                request.transport.abort()
+            return web.Response(status=503, text='source down')
+        response = web.StreamResponse(headers={'Content-Type': 'application/octet-stream'})
+        await response.prepare(request)
+        if self.header:
+            await response.write(self.header)
+        position = self.position()
+        sent_at = time.monotonic()
+        was_down = False
+        while True:
+            await asyncio.sleep(SEND_INTERVAL)
+            if self.is_down():
+                if not was_down:
+                    self.outages += 1
+                    was_down = True
+                if self.mode != 'stall' and request.transport is not None:
+                    request.transport.abort()
+                    return response
+                sent_at = time.monotonic()  # A stalled stream misses the outage
+                position = self.position()
+                continue
+            was_down = False
+            now = time.monotonic()
+            length = int((now - sent_at) * self.bytes_per_second)
+            length -= length % self.align
+            if not length:
+                continue
+            sent_at += length / self.bytes_per_second
+            end = position + length
+            chunk = self.data[position:end]
+            if end > len(self.data):
+                chunk += self.data[:end - len(self.data)]
+            position = end % len(self.data)
+            try:
+                await response.write(chunk)
+            except (ConnectionError, RuntimeError):
+                return response
+
+
+def _wav_header(rate, channels, width):
+    """WAV header with an open-ended data chunk"""
+    size = 0xFFFFFFFF - 36
+    return (b'RIFF' + struct.pack('<I', size + 36) + b'WAVE'
+            + b'fmt ' + struct.pack('<IHHIIHH', 16, 1, channels, rate, rate * channels * width,
+                                    channels * width, width * 8)
+            + b'data' + struct.pack('<I', size))
+
+
+async def main():
+    parser = argparse.ArgumentParser(description='Flaky live HTTP source')
+    parser.add_argument('path', help='WAV or MPEG-TS file to loop')
+    parser.add_argument('--bytes-per-second', type=int, default=None,
+                        help='Stream rate (taken from the header for WAV)')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8080)
+    parser.add_argument('--outage-every', type=float, default=20.0, help='Seconds between outages (0: none)')
+    parser.add_argument('--outage-seconds', type=float, default=3.0)
+    parser.add_argument('--mode', choices=['drop', 'refuse', 'stall'], default='drop')
+    args = parser.parse_args()
+
+    source = FlakySource(args.path, args.bytes_per_second, args.outage_every, args.outage_seconds,
+                         args.mode, args.host, args.port)
+    await source.start()
+    print(f"Serving {args.path} live on http://{args.host}:{source.port}/ "
+          f"({args.mode} for {args.outage_seconds:.0f}s every {args.outage_every:.0f}s)")
+    try:
+        await asyncio.Event().wait()
+    finally:
+        await source.stop()
+
+
+if __name__ == "__main__":
+    try:
+        asyncio.run(main())
+    except KeyboardInterrupt:
+        pass
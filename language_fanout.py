@@ -0,0 +1,191 @@
+"""
+Caption one audio source in several languages at once.
+
+The source is decoded, denoised and VAD-gated once; the resulting audio is
+fanned out to K Transcribe sessions with different language codes. Every
+session has its own bounded queue, sender task, caption segmenter and
+subtitle sink. When a session cannot keep up its oldest queued audio is
+dropped (and its timeline adjusted) instead of slowing the source or the
+other sessions.
+"""
+
+import asyncio
+import time
+from caption_segmenter import CaptionHandler
+from metrics import channel_metrics, timed_results
+from pacer import Pacer
+from subtitle_sink import SubtitleSink, mark_session_end
+from transcribe_audio import check_aws_credentials, get_client, is_local_endpoint, SAMPLE_RATE, BYTES_PER_SAMPLE, CHANNEL_NUMS
+from vad import TimelineMap
+
+BYTES_PER_SECOND = SAMPLE_RATE * BYTES_PER_SAMPLE * CHANNEL_NUMS
+
+
+class LanguageSession:
+    """One Transcribe session of the fan-out with its own queue and sink"""
+
+    def __init__(self, language_code, sink, queue_chunks=64, channel=None):
+        """
+        Args:
+            language_code: Transcribe language code
+            sink: caption sink for this language
+            queue_chunks: audio chunks buffered before the oldest is dropped
+            channel: source name; metrics go under "<channel>.<language_code>"
+        """
+        self.language_code = language_code
+        self.sink = sink
+        self.metrics = channel_metrics(f"{channel}.{language_code}" if channel else language_code)
+        self.queue = asyncio.Queue(maxsize=queue_chunks)
+        # Session-sent time -> fan-out (gated) time; differs once audio is dropped
+        self.timeline = TimelineMap()
+        self.stream = None
+        self.failed = False
+        self.sent_seconds = 0.0
+        self.dropped_chunks = 0
+        self.dropped_seconds = 0.0
+        self.max_queue = 0
+
+    async def start(self, client):
+        self.stream = await client.start_stream_transcription(
+            language_code=self.language_code,
+            media_sample_rate_hz=SAMPLE_RATE,
+            media_encoding="pcm",
+            enable_partial_results_stabilization=True,
+            partial_results_stability="high",
+        )
+        self.metrics.sent_seconds = 0.0
+
+    def offer(self, chunk, start_time):
+        """Queue a chunk without blocking, dropping the oldest one when full"""
+        if self.failed:
+            return
+        if self.queue.full():
+            dropped, _ = self.queue.get_nowait()
+            self.dropped_chunks += 1
+            self.dropped_seconds += len(dropped) / BYTES_PER_SECOND
+        self.queue.put_nowait((chunk, start_time))
+        self.max_queue = max(self.max_queue, self.queue.qsize())
+        self.metrics.queue_depth.set(self.queue.qsize())
+
+    async def finish(self):
+        """Queue the end-of-stream marker (waits for room, never drops audio)"""
+        while not self.failed:
+            try:
+                self.queue.put_nowait((None, None))
+                return
+            except asyncio.QueueFull:
+                await asyncio.sleep(0.05)
+
+    async def send_loop(self):
+        expected = 0.0
+        metrics = self.metrics
+        try:
+            while True:
+                chunk, start_time = await self.queue.get()
+                metrics.queue_depth.set(self.queue.qsize())
+                if chunk is None:
+                    break
+                if abs(start_time - expected) > 1e-6:
+                    self.timeline.add(self.sent_seconds, start_time)
+                started = time.perf_counter()
+                await self.stream.input_stream.send_audio_event(audio_chunk=chunk)
+                metrics.send_seconds.observe(time.perf_counter() - started)
+                metrics.sent_bytes.inc(len(chunk))
+                duration = len(chunk) / BYTES_PER_SECOND
+                self.sent_seconds += duration
+                metrics.sent_seconds = self.sent_seconds
+                expected = start_time + duration
+        except Exception as e:
+            self.failed = True
+            print(f"[{self.language_code}] error sending audio: {e}")
+        finally:
+            try:
+                await self.stream.input_stream.end_stream()
+            except Exception as e:
+                print(f"[{self.language_code}] error ending stream: {e}")
+
+    def report(self):
+        return (f"[{self.language_code}] sent {self.sent_seconds:.1f}s, dropped "
+                f"{self.dropped_chunks} chunks ({self.dropped_seconds:.1f}s), "
+                f"max queue {self.max_queue}/{self.queue.maxsize}")
+
+
+def default_sink(language_code):
+    return SubtitleSink(f"captions.{language_code}", formats=('srt', 'vtt'))
+
+
+async def transcribe_fanout(audio_stream, languages, pacing="live", vad=None,
+                            sink_factory=default_sink, queue_chunks=64, endpoint=None, channel=None,
+                            timeline=None):
+    """
+    Transcribe one audio stream in several languages.
+
+    Args:
+        audio_stream: async iterator of 16 kHz 16-bit mono PCM chunks
+        languages: Transcribe language codes, one session each
+        pacing: Pacer mode for the source (see transcribe_network_stream)
+        vad: Optional vad.VoiceActivityGate applied once before the fan-out
+        sink_factory: language_code -> caption sink
+        queue_chunks: per-session queue length in chunks
+        endpoint: Optional endpoint override (see transcribe_audio.create_client)
+        channel: Source name used for the sessions' metrics
+        timeline: Optional TimelineMap of gaps in audio_stream itself (e.g.
+                  TSPlayer.timeline under a latency budget)
+    """
+    if not is_local_endpoint(endpoint) and not await check_aws_credentials():
+        return
+
+    client = get_client(endpoint, channel)
+    sessions = [LanguageSession(code, sink_factory(code), queue_chunks, channel) for code in languages]
+    started = await asyncio.gather(*(s.start(client) for s in sessions), return_exceptions=True)
+    for session, error in zip(sessions, started):
+        if isinstance(error, Exception):
+            print(f"[{session.language_code}] could not start: {error}")
+            await session.sink.close()
+    sessions = [s for s, error in zip(sessions, started) if not isinstance(error, Exception)]
+    if not sessions:
+        return
+
+    async def produce():
+        pacer = Pacer(mode=pacing, bytes_per_second=BYTES_PER_SECOND)
+        gated_time = 0.0
+        try:
+            async for chunk in audio_stream:
+                if not chunk:
+                    break
+                gated = vad.process(chunk) if vad is not None else chunk
+                if gated is not None:
+                    # One immutable copy shared by every session queue
+                    data = bytes(gated)
+                    for session in sessions:
+                        session.offer(data, gated_time)
+                    gated_time += len(data) / BYTES_PER_SECOND
+                await pacer.pace(len(chunk))
+                for session in sessions:
+                    session.metrics.drift.set(pacer.drift)
+        except Exception as e:
+            print(f"Error reading audio: {e}")
+        finally:
+            end = pacer.stats()['sent_seconds']
+            for session in sessions:
+                mark_session_end(session.sink, timeline.to_source(end) if timeline is not None else end)
+            await asyncio.gather(*(s.finish() for s in sessions))
+
+    vad_timeline = vad.timeline if vad is not None else None
+    handlers = [
+        CaptionHandler(timed_results(s.stream.output_stream, s.metrics), s.sink,
+                       timelines=(s.timeline, vad_timeline, timeline),
+                       label=s.language_code)
+        for s in sessions
+    ]
+    tasks = [produce()]
+    tasks += [s.send_loop() for s in sessions]
+    tasks += [h.handle_events() for h in handlers]
+    results = await asyncio.gather(*tasks, return_exceptions=True)
+    for result in results:
+        if isinstance(result, Exception):
+            print(f"Fan-out task failed: {result}")
+    for session in sessions:
+        print(session.report())
+    if vad is not None:
+        print(vad.report())
@@ -0,0 +1,347 @@
+"""
+Local stand-in for Amazon Transcribe streaming.
+
+LocalTranscribeServer speaks the Transcribe WebSocket protocol: audio
+arrives as event-stream encoded AudioEvents on
+/stream-transcription-websocket?language-code=..&sample-rate=..&media-encoding=pcm
+(an empty AudioEvent ends the stream) and results go back as event-stream
+encoded TranscriptEvent messages, or exception messages for bad requests.
+Results are scripted: every `utterance_seconds` of received audio becomes
+one result whose words are taken from the script, with a partial every
+`partial_interval` seconds of audio and the final at the end. Partials and
+finals are sent `partial_delay` / `final_delay` seconds after the audio
+that completes them arrived.
+
+LocalTranscribeClient has the start_stream_transcription() interface of
+TranscribeStreamingClient and parses the results with the SDK's own event
+stream parser, so TranscriptResultStreamHandler subclasses work unchanged.
+transcribe_audio.create_client returns one for ws:// endpoints.
+
+Usage: python local_transcribe.py [--port 8765] [--script lines.txt] [--final-delay 0.5]
+"""
+
+import argparse
+import asyncio
+import json
+import urllib.parse
+import aiohttp
+from aiohttp import web
+from amazon_transcribe.deserialize import TranscribeStreamingEventParser
+from amazon_transcribe.eventstream import EventStream, EventStreamBuffer, EventStreamMessageSerializer
+from amazon_transcribe.model import AudioEvent
+from amazon_transcribe.serialize import AudioEventSerializer
+
+WEBSOCKET_PATH = '/stream-transcription-websocket'
+
+DEFAULT_SCRIPT = (
+    "the quick brown fox jumps over the lazy dog",
+    "streaming captions arrive a few hundred milliseconds after the audio",
+    "this result was produced by the local transcribe stand in",
+    "partial results grow until the final result replaces them",
+)
+
+_serializer = EventStreamMessageSerializer()
+
+
+def _words(line):
+    # Scripts without spaces (Chinese, Japanese) are split per character
+    return line.split() if ' ' in line.strip() else [c for c in line.strip()]
+
+
+def encode_transcript_event(results):
+    """Event-stream message carrying a TranscriptEvent with the given result dicts"""
+    headers = {
+        ':message-type': 'event',
+        ':event-type': 'TranscriptEvent',
+        ':content-type': 'application/json',
+    }
+    payload = json.dumps({'Transcript': {'Results': results}}, ensure_ascii=False)
+    return _serializer.serialize(headers, payload.encode('utf-8'))
+
+
+def encode_exception(exception_type, message):
+    headers = {
+        ':message-type': 'exception',
+        ':exception-type': exception_type,
+        ':content-type': 'application/json',
+    }
+    return _serializer.serialize(headers, json.dumps({'Message': message}).encode('utf-8'))
+
+
+class _ScriptedSession:
+    """Result state of one stream: which utterance is open and how much audio it has"""
+
+    def __init__(self, server, sample_rate, language_code):
+        self.server = server
+        self.bytes_per_second = sample_rate * 2
+        self.language_code = language_code
+        self.joiner = '' if language_code.split('-')[0] in ('zh', 'ja', 'ko', 'th') else ' '
+        self.audio_seconds = 0.0
+        self.utterance = 0
+        self.utterance_start = 0.0
+        self.next_partial = server.partial_interval
+
+    def _result(self, end_time, is_partial):
+        script = self.server.script
+        words = _words(script[self.utterance % len(script)]) or ['...']
+        length = self.server.utterance_seconds
+        progress = min(1.0, (end_time - self.utterance_start) / length)
+        count = len(words) if not is_partial else max(1, int(len(words) * progress))
+        step = (end_time - self.utterance_start) / count
+        items = []
+        for i, word in enumerate(words[:count]):
+            start = self.utterance_start + i * step
+            items.append({
+                'StartTime': round(start, 3), 'EndTime': round(start + step, 3),
+                'Type': 'pronunciation', 'Content': word,
+                'Confidence': 0.95, 'Stable': not is_partial or i < count - 1,
+            })
+        transcript = self.joiner.join(words[:count])
+        return {
+            'ResultId': f"{id(self):x}-{self.utterance}",
+            'StartTime': round(self.utterance_start, 3),
+            'EndTime': round(end_time, 3),
+            'IsPartial': is_partial,
+            'ChannelId': 'ch_0',
+            'Alternatives': [{'Transcript': transcript, 'Items': items}],
+        }
+
+    def feed(self, length):
+        """Account for `length` bytes of audio; returns [(delay, result dict)] completed by it"""
+        self.audio_seconds += length / self.bytes_per_second
+        out = []
+        utterance_end = self.utterance_start + self.server.utterance_seconds
+        while self.audio_seconds >= utterance_end:
+            out.append((self.server.final_delay, self._result(utterance_end, False)))
+            self.utterance += 1
+            self.utterance_start = utterance_end
+            self.next_partial = utterance_end + self.server.partial_interval
+            utterance_end = self.utterance_start + self.server.utterance_seconds
+        if self.audio_seconds >= self.next_partial:
+            out.append((self.server.partial_delay, self._result(self.audio_seconds, True)))
+            while self.next_partial <= self.audio_seconds:
+                self.next_partial += self.server.partial_interval
+        return out
+
+    def finish(self):
+        """Final result for the audio of the open utterance"""
+        if self.audio_seconds - self.utterance_start < 0.05:
+            return []
+        return [(self.server.final_delay, self._result(self.audio_seconds, False))]
+
+
+class LocalTranscribeServer:
+    """aiohttp WebSocket server returning scripted Transcribe results"""
+
+    def __init__(self, script=None, utterance_seconds=3.0, partial_interval=0.5,
+                 partial_delay=0.2, final_delay=0.5, host='127.0.0.1', port=8765):
+        """
+        Args:
+            script: result texts, one per utterance, used in turn
+            utterance_seconds: audio per result
+            partial_interval: audio between partial results (0 disables partials)
+            partial_delay, final_delay: seconds between the audio completing a
+                                        partial/final result and sending it
+        """
+        self.script = list(script or DEFAULT_SCRIPT)
+        self.utterance_seconds = utterance_seconds
+        self.partial_interval = partial_interval if partial_interval > 0 else float('inf')
+        self.partial_delay = partial_delay
+        self.final_delay = final_delay
+        self.host = host
+        self.port = port
+        self.streams = 0
+        self.active = 0
+        self._runner = None
+
+    @property
+    def endpoint(self):
+        return f"ws://{self.host}:{self.port}"
+
+    async def start(self):
+        app = web.Application()
+        app.router.add_get(WEBSOCKET_PATH, self.handle_stream)
+        self._runner = web.AppRunner(app)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, self.host, self.port)
+        await site.start()
+        if self.port == 0:
+            self.port = site._server.sockets[0].getsockname()[1]
+        return self
+
+    async def stop(self):
+        if self._runner is not None:
+            await self._runner.cleanup()
+            self._runner = None
+
+    async def handle_stream(self, request):
+        ws = web.WebSocketResponse(max_msg_size=0)
+        await ws.prepare(request)
+        self.streams += 1
+        self.active += 1
+        try:
+            await self._serve(ws, request.query)
+        finally:
+            self.active -= 1
+            await ws.close()
+        return ws
+
+    async def _serve(self, ws, query):
+        language_code = query.get('language-code', 'en-US')
+        encoding = query.get('media-encoding', 'pcm')
+        try:
+            sample_rate = int(query.get('sample-rate', '16000'))
+        except ValueError:
+            sample_rate = 0
+        if encoding != 'pcm' or not 8000 <= sample_rate <= 48000:
+            await ws.send_bytes(encode_exception(
+                'BadRequestException', f"Unsupported media encoding {encoding} at {sample_rate} Hz"))
+            return
+
+        session = _ScriptedSession(self, sample_rate, language_code)
+        outbox = asyncio.Queue()
+        loop = asyncio.get_running_loop()
+
+        async def send_results():
+            # Results go out in order, each no earlier than its due time
+            while True:
+                due, result = await outbox.get()
+                if result is None:
+                    return
+                wait = due - loop.time()
+                if wait > 0:
+                    await asyncio.sleep(wait)
+                await ws.send_bytes(encode_transcript_event([result]))
+
+        def schedule(results):
+            now = loop.time()
+            for delay, result in results:
+                outbox.put_nowait((now + delay, result))
+
+        sender = asyncio.create_task(send_results())
+        buffer = EventStreamBuffer()
+        try:
+            async for message in ws:
+                if message.type != aiohttp.WSMsgType.BINARY:
+                    break
+                buffer.add_data(message.data)
+                ended = False
+                for event in buffer:
+                    if event.headers.get(':event-type') != 'AudioEvent':
+                        continue
+                    if not event.payload:
+                        ended = True
+                        break
+                    schedule(session.feed(len(event.payload)))
+                if ended:
+                    schedule(session.finish())
+                    break
+            outbox.put_nowait((0, None))
+            await sender
+        finally:
+            sender.cancel()
+
+
+class _WebSocketBody:
+    """Raw body for amazon_transcribe EventStream: binary WebSocket messages"""
+
+    def __init__(self, ws, session):
+        self.ws = ws
+        self.session = session
+
+    async def chunks(self):
+        try:
+            async for message in self.ws:
+                if message.type == aiohttp.WSMsgType.BINARY:
+                    yield message.data
+                elif message.type == aiohttp.WSMsgType.ERROR:
+                    raise ConnectionError(f"Transcribe stand-in connection failed: {self.ws.exception()}")
+                else:
+                    break
+        finally:
+            await self.ws.close()
+            await self.session.close()
+
+
+class LocalAudioStream:
+    """input_stream of a local session (send_audio_event / end_stream)"""
+
+    def __init__(self, ws):
+        self.ws = ws
+        self._events = AudioEventSerializer()
+        self._ended = False
+
+    async def send_audio_event(self, audio_chunk):
+        headers, payload = self._events.serialize(AudioEvent(bytes(audio_chunk or b'')))
+        await self.ws.send_bytes(_serializer.serialize(headers, payload))
+
+    async def end_stream(self):
+        if not self._ended and not self.ws.closed:
+            self._ended = True
+            await self.send_audio_event(b'')
+
+
+class LocalTranscriptionStream:
+    def __init__(self, ws, session):
+        self.response = None
+        self.input_stream = LocalAudioStream(ws)
+        self.output_stream = EventStream(_WebSocketBody(ws, session), TranscribeStreamingEventParser())
+
+
+class LocalTranscribeClient:
+    """TranscribeStreamingClient look-alike for a ws:// stand-in endpoint"""
+
+    def __init__(self, endpoint):
+        self.endpoint = endpoint.rstrip('/')
+
+    async def start_stream_transcription(self, language_code, media_sample_rate_hz,
+                                         media_encoding, **kwargs):
+        """Open a session; keyword arguments beyond the basic three are accepted and ignored"""
+        query = urllib.parse.urlencode({
+            'language-code': language_code,
+            'sample-rate': media_sample_rate_hz,
+            'media-encoding': media_encoding,
+        })
+        session = aiohttp.ClientSession()
+        try:
+            ws = await session.ws_connect(f"{self.endpoint}{WEBSOCKET_PATH}?{query}", max_msg_size=0)
+        except Exception:
+            await session.close()
+            raise
+        return LocalTranscriptionStream(ws, session)
+
+
+def load_script(path):
+    with open(path, encoding='utf-8') as f:
+        return [line.strip() for line in f if line.strip()]
+
+
+async def main():
+    parser = argparse.ArgumentParser(description='Local Transcribe streaming stand-in')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--script', default=None, help='Text file, one result per line')
+    parser.add_argument('--utterance-seconds', type=float, default=3.0)
+    parser.add_argument('--partial-interval', type=float, default=0.5)
+    parser.add_argument('--partial-delay', type=float, default=0.2)
+    parser.add_argument('--final-delay', type=float, default=0.5)
+    args = parser.parse_args()
+
+    server = LocalTranscribeServer(
+        script=load_script(args.script) if args.script else None,
+        utterance_seconds=args.utterance_seconds, partial_interval=args.partial_interval,
+        partial_delay=args.partial_delay, final_delay=args.final_delay,
+        host=args.host, port=args.port)
+    await server.start()
+    print(f"Transcribe stand-in listening on {server.endpoint}")
+    try:
+        await asyncio.Event().wait()
+    finally:
+        await server.stop()
+
+
+if __name__ == "__main__":
+    try:
+        asyncio.run(main())
+    except KeyboardInterrupt:
+        pass
@@ -0,0 +1,294 @@
+"""
+Low-overhead pipeline metrics with a Prometheus text exposition endpoint.
+
+Metric children (one per label set) are looked up once per stream and
+updated with plain attribute arithmetic on the hot path; a histogram
+observation is one bisect and two additions. Nothing is formatted until
+/metrics is scraped.
+
+Per channel stages (ChannelMetrics):
+  caption_source_read_seconds      wait for each decoded chunk from ffmpeg
+  caption_source_bytes_total       PCM bytes read from the source
+  caption_source_restarts_total / caption_source_outage_seconds_total
+                                   ffmpeg restarts after the source was lost
+                                   and the time it took to get audio back
+  caption_dsp_seconds              AudioProcessor time per chunk (incl. executor queueing)
+  caption_send_seconds             send_audio_event time per chunk
+  caption_sent_bytes_total         PCM bytes sent to Transcribe
+  caption_send_chunk_seconds       audio event duration chosen by the chunk sizer
+  caption_queue_depth              chunks queued for a fan-out session
+  caption_pacing_drift_seconds     current pacer drift (positive = lagging)
+  caption_handle_event_seconds     handler time per TranscriptEvent
+  caption_result_latency_seconds   audio sent minus result end time when a
+                                   result arrives, by type (partial/final)
+  caption_degradation_level        latency budget degradation step (see backpressure.py)
+  caption_skipped_denoise_total    chunks sent without denoising
+  caption_dropped_silence_seconds_total / caption_shed_seconds_total
+                                   audio dropped as silence / shed as too old
+
+Usage: await start_metrics_server(9108); curl localhost:9108/metrics
+"""
+
+import bisect
+import math
+import time
+
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+RESULT_BUCKETS = (0.1, 0.25, 0.5, 0.75, 1.0, 1.5, 2.0, 3.0, 5.0, 10.0, 30.0)
+
+
+def _format_value(value):
+    if value == math.inf:
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+def _format_labels(names, values, extra=()):
+    pairs = list(zip(names, values)) + list(extra)
+    if not pairs:
+        return ''
+    escaped = (str(v).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for _, v in pairs)
+    return '{' + ','.join(f'{k}="{v}"' for (k, _), v in zip(pairs, escaped)) + '}'
+
+
+class _CounterChild:
+    __slots__ = ('value',)
+
+    def __init__(self):
+        self.value = 0
+
+    def inc(self, amount=1):
+        self.value += amount
+
+
+class _GaugeChild:
+    __slots__ = ('value',)
+
+    def __init__(self):
+        self.value = 0.0
+
+    def set(self, value):
+        self.value = value
+
+    def inc(self, amount=1):
+        self.value += amount
+
+    def dec(self, amount=1):
+        self.value -= amount
+
+
+class _HistogramChild:
+    __slots__ = ('buckets', 'counts', 'sum', 'count')
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+
+class _Metric:
+    kind = None
+
+    def __init__(self, name, help, labels=()):
+        self.name = name
+        self.help = help
+        self.label_names = tuple(labels)
+        self._children = {}
+
+    def labels(self, *values):
+        """Child for one label set; keep it instead of calling labels() per update"""
+        child = self._children.get(values)
+        if child is None:
+            if len(values) != len(self.label_names):
+                raise ValueError(f"{self.name} expects labels {self.label_names}")
+            child = self._children[values] = self._new_child()
+        return child
+
+    def remove(self, *values):
+        self._children.pop(values, None)
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+        for values, child in list(self._children.items()):
+            lines.extend(self._render_child(values, child))
+        return lines
+
+
+class Counter(_Metric):
+    kind = 'counter'
+
+    def _new_child(self):
+        return _CounterChild()
+
+    def _render_child(self, values, child):
+        return [f"{self.name}{_format_labels(self.label_names, values)} {_format_value(child.value)}"]
+
+
+class Gauge(_Metric):
+    kind = 'gauge'
+
+    def _new_child(self):
+        return _GaugeChild()
+
+    def _render_child(self, values, child):
+        return [f"{self.name}{_format_labels(self.label_names, values)} {_format_value(child.value)}"]
+
+
+class Histogram(_Metric):
+    kind = 'histogram'
+
+    def __init__(self, name, help, labels=(), buckets=LATENCY_BUCKETS):
+        super().__init__(name, help, labels)
+        self.buckets = tuple(sorted(buckets))
+
+    def _new_child(self):
+        return _HistogramChild(self.buckets)
+
+    def _render_child(self, values, child):
+        lines = []
+        cumulative = 0
+        for bound, count in zip(self.buckets + (math.inf,), child.counts):
+            cumulative += count
+            labels = _format_labels(self.label_names, values, [('le', _format_value(float(bound)))])
+            lines.append(f"{self.name}_bucket{labels} {cumulative}")
+        labels = _format_labels(self.label_names, values)
+        lines.append(f"{self.name}_sum{labels} {_format_value(child.sum)}")
+        lines.append(f"{self.name}_count{labels} {child.count}")
+        return lines
+
+
+class Registry:
+    """Named metrics; get-or-create so modules can declare the same metric"""
+
+    def __init__(self):
+        self._metrics = {}
+
+    def _get(self, cls, name, help, labels, **kwargs):
+        metric = self._metrics.get(name)
+        if metric is None:
+            metric = self._metrics[name] = cls(name, help, labels, **kwargs)
+        elif not isinstance(metric, cls):
+            raise ValueError(f"Metric {name} already registered as a {metric.kind}")
+        return metric
+
+    def counter(self, name, help, labels=()):
+        return self._get(Counter, name, help, labels)
+
+    def gauge(self, name, help, labels=()):
+        return self._get(Gauge, name, help, labels)
+
+    def histogram(self, name, help, labels=(), buckets=LATENCY_BUCKETS):
+        return self._get(Histogram, name, help, labels, buckets=buckets)
+
+    def render(self):
+        lines = []
+        for metric in list(self._metrics.values()):
+            lines.extend(metric.render())
+        return '\n'.join(lines) + '\n'
+
+
+REGISTRY = Registry()
+
+
+class ChannelMetrics:
+    """The per-stage metric children of one channel"""
+
+    def __init__(self, channel, registry=REGISTRY):
+        self.channel = channel
+        r = registry
+        self.read_seconds = r.histogram(
+            'caption_source_read_seconds', 'Wait for each decoded source chunk', ('channel',)).labels(channel)
+        self.source_bytes = r.counter(
+            'caption_source_bytes_total', 'PCM bytes read from the source', ('channel',)).labels(channel)
+        self.source_restarts = r.counter(
+            'caption_source_restarts_total', 'ffmpeg restarts after losing the source',
+            ('channel',)).labels(channel)
+        self.source_outage_seconds = r.counter(
+            'caption_source_outage_seconds_total', 'Time without source audio before a restart succeeded',
+            ('channel',)).labels(channel)
+        self.dsp_seconds = r.histogram(
+            'caption_dsp_seconds', 'Audio processing time per chunk', ('channel',)).labels(channel)
+        self.send_seconds = r.histogram(
+            'caption_send_seconds', 'send_audio_event time per chunk', ('channel',)).labels(channel)
+        self.sent_bytes = r.counter(
+            'caption_sent_bytes_total', 'PCM bytes sent to Transcribe', ('channel',)).labels(channel)
+        self.send_chunk_seconds = r.gauge(
+            'caption_send_chunk_seconds', 'Audio event duration chosen from the latency target',
+            ('channel',)).labels(channel)
+        self.queue_depth = r.gauge(
+            'caption_queue_depth', 'Chunks queued for the Transcribe session', ('channel',)).labels(channel)
+        self.drift = r.gauge(
+            'caption_pacing_drift_seconds', 'Pacer drift, positive when lagging', ('channel',)).labels(channel)
+        self.event_seconds = r.histogram(
+            'caption_handle_event_seconds', 'Handler time per TranscriptEvent', ('channel',)).labels(channel)
+        latency = r.histogram(
+            'caption_result_latency_seconds', 'Audio sent minus result end time on arrival',
+            ('channel', 'type'), buckets=RESULT_BUCKETS)
+        self.partial_latency = latency.labels(channel, 'partial')
+        self.final_latency = latency.labels(channel, 'final')
+        self.degradation_level = r.gauge(
+            'caption_degradation_level', 'Latency budget degradation step', ('channel',)).labels(channel)
+        self.skipped_denoise = r.counter(
+            'caption_skipped_denoise_total', 'Chunks sent without denoising', ('channel',)).labels(channel)
+        self.dropped_silence_seconds = r.counter(
+            'caption_dropped_silence_seconds_total', 'Silent audio dropped over budget',
+            ('channel',)).labels(channel)
+        self.shed_seconds = r.counter(
+            'caption_shed_seconds_total', 'Audio shed as older than the budget', ('channel',)).labels(channel)
+        # Seconds of audio sent on this channel's session; set by the sender
+        self.sent_seconds = 0.0
+
+
+_channels = {}
+
+
+def channel_metrics(channel):
+    """Shared ChannelMetrics for a channel name (restarts keep accumulating)"""
+    metrics = _channels.get(channel)
+    if metrics is None:
+        metrics = _channels[channel] = ChannelMetrics(channel)
+    return metrics
+
+
+async def timed_results(output_stream, metrics):
+    """
+    Pass a TranscriptResultStream through, recording result latency on
+    arrival and the time the consumer (the handler) spends on each event.
+    """
+    final_latency = metrics.final_latency
+    partial_latency = metrics.partial_latency
+    event_seconds = metrics.event_seconds
+    async for event in output_stream:
+        transcript = getattr(event, 'transcript', None)
+        if transcript is not None:
+            for result in transcript.results:
+                if result.end_time is not None:
+                    latency = metrics.sent_seconds - result.end_time
+                    (partial_latency if result.is_partial else final_latency).observe(max(0.0, latency))
+        started = time.perf_counter()
+        yield event
+        event_seconds.observe(time.perf_counter() - started)
+
+
+async def start_metrics_server(port=9108, host='127.0.0.1', registry=REGISTRY):
+    """Serve GET /metrics in Prometheus text format; returns the AppRunner"""
+    from aiohttp import web
+
+    async def handle(request):
+        return web.Response(body=registry.render().encode('utf-8'),
+                            headers={'Content-Type': CONTENT_TYPE})
+
+    app = web.Application()
+    app.router.add_get('/metrics', handle)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    await web.TCPSite(runner, host, port).start()
+    print(f"Metrics on http://{host}:{port}/metrics")
+    return runner
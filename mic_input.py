@@ -1,11 +1,18 @@
 import asyncio
+import os
 import platform
+from pcm_ring import PCMRingBuffer, open_pipe, close_pipe
+
 class MicrophoneInput:
     def __init__(self):
         """Initialize microphone input handler"""
         self._ffmpeg_process = None
+        self._stdout_fd = None
         self._setup_device_name()
         self._running = False
+        self.chunk_size = 2 * 1024  # 2KB chunks
+        # ffmpeg output is read in place into a preallocated ring
+        self.ring = PCMRingBuffer(chunk_size=self.chunk_size, n_chunks=32)
 
     def _setup_device_name(self):
         """Set up the audio input device name based on OS"""
@@ -41,30 +48,31 @@ class MicrophoneInput:
                 'pipe:1'                  # Output to pipe
             ]
 
-            # Start ffmpeg process
-            process = await asyncio.create_subprocess_exec(
-                *command,
-                stdout=asyncio.subprocess.PIPE,
-                stderr=asyncio.subprocess.PIPE
-            )
+            # Start ffmpeg process; stdout goes to a pipe we read with readv
+            read_fd, write_fd = open_pipe()
+            self._stdout_fd = read_fd
+            try:
+                process = await asyncio.create_subprocess_exec(
+                    *command,
+                    stdout=write_fd,
+                    stderr=asyncio.subprocess.PIPE
+                )
+            finally:
+                os.close(write_fd)
             self._ffmpeg_process = process
 
             print("Started microphone capture. Speaking into microphone...")
 
             # Read chunks from ffmpeg output
-            chunk_size = 2 * 1024  # 2KB chunks
-            while self._running:
-                try:
-                    chunk = await process.stdout.read(chunk_size)
-                    if not chunk:
+            try:
+                async for chunk in self.ring.chunks_from_fd(read_fd):
+                    if not self._running:
                         break
-                    
-                    # Directly yield the raw chunk without noise reduction
+                    # Directly yield the raw chunk (a ring buffer view) without noise reduction
                     yield chunk
 
-                except asyncio.CancelledError:
-                    self._running = False
-                    break
+            except asyncio.CancelledError:
+                self._running = False
 
         except GeneratorExit:
             self._running = False
@@ -76,6 +84,13 @@ class MicrophoneInput:
         finally:
             await self.close()
 
+    async def stop(self):
+        """Stop capture from another task; the stream generator closes the pipe"""
+        self._running = False
+        process = self._ffmpeg_process
+        if process is not None and process.returncode is None:
+            process.terminate()
+
     async def close(self):
         """Clean up resources"""
         self._running = False
@@ -87,3 +102,6 @@ class MicrophoneInput:
                 self._ffmpeg_process.kill()  # Force kill if termination takes too long
             finally:
                 self._ffmpeg_process = None
+        if self._stdout_fd is not None:
+            close_pipe(self._stdout_fd)
+            self._stdout_fd = None
@@ -0,0 +1,302 @@
+"""
+Cached, conditional-fetch loader for dynamic (live) MPD manifests.
+
+A refresh first revalidates with If-None-Match / If-Modified-Since (or the
+file's mtime for local manifests) and stops there on 304. A changed
+manifest is split into its Period elements at the byte level; periods whose
+bytes are identical to the previous refresh keep their parsed objects, and
+only new or changed periods are parsed (with iterparse). Representations
+are parsed lazily on attribute access.
+
+The resulting MPDDocument exposes the same fields as dash_player.MPD, so it
+can be passed to DashPlayer(mpd=...).
+"""
+
+import asyncio
+import io
+import os
+import re
+import urllib.parse
+import xml.etree.ElementTree as ET
+from dash_player import SegmentBase
+
+NS = '{urn:mpeg:dash:schema:mpd:2011}'
+_ROOT_TAG = re.compile(rb'<MPD\b[^>]*>')
+_PERIOD_START = re.compile(rb'<Period[\s/>]')
+
+
+class LazyRepresentation:
+    """Representation whose child elements are only parsed when accessed"""
+
+    __slots__ = ('_element', '_base_url', '_segment_base')
+
+    _UNSET = object()
+
+    def __init__(self, element):
+        self._element = element
+        self._base_url = self._UNSET
+        self._segment_base = None
+
+    @property
+    def id(self):
+        return self._element.get('id')
+
+    @property
+    def bandwidth(self):
+        return self._element.get('bandwidth')
+
+    @property
+    def mime_type(self):
+        return self._element.get('mimeType')
+
+    @property
+    def codecs(self):
+        return self._element.get('codecs')
+
+    @property
+    def base_url(self):
+        if self._base_url is self._UNSET:
+            elem = self._element.find(f'{NS}BaseURL')
+            self._base_url = elem.text if elem is not None else None
+        return self._base_url
+
+    @property
+    def segment_base(self):
+        if self._segment_base is None:
+            self._segment_base = SegmentBase(self._element.find(f'{NS}SegmentBase'))
+        return self._segment_base
+
+
+class LazyAdaptationSet:
+    __slots__ = ('content_type', 'mime_type', 'codecs', 'lang', 'representations')
+
+    def __init__(self, element):
+        self.content_type = element.get('contentType') or element.get('mimeType', '').split('/')[0]
+        self.mime_type = element.get('mimeType')
+        self.codecs = element.get('codecs')
+        self.lang = element.get('lang')
+        self.representations = [LazyRepresentation(rep)
+                                for rep in element.findall(f'{NS}Representation')]
+
+
+class PeriodEntry:
+    """A parsed Period together with the bytes it was parsed from"""
+
+    __slots__ = ('id', 'start', 'duration', 'adaptation_sets', 'raw')
+
+    def __init__(self, period_id, element, raw):
+        self.id = period_id
+        self.start = element.get('start')
+        self.duration = element.get('duration')
+        self.adaptation_sets = [LazyAdaptationSet(a) for a in element.findall(f'{NS}AdaptationSet')]
+        self.raw = raw
+
+
+class MPDDocument:
+    __slots__ = ('base_url', 'type', 'publish_time', 'minimum_update_period', 'attrib', 'periods')
+
+    def __init__(self, base_url, attrib, periods):
+        self.base_url = base_url
+        self.attrib = attrib
+        self.type = attrib.get('type', 'static')
+        self.publish_time = attrib.get('publishTime')
+        self.minimum_update_period = attrib.get('minimumUpdatePeriod')
+        self.periods = periods
+
+
+class MPDDiff:
+    """Period ids added, removed and changed by one refresh"""
+
+    __slots__ = ('modified', 'added', 'removed', 'changed', 'reused')
+
+    def __init__(self, modified=False):
+        self.modified = modified
+        self.added = []
+        self.removed = []
+        self.changed = []
+        self.reused = 0
+
+    def __bool__(self):
+        return bool(self.added or self.removed or self.changed)
+
+    def __repr__(self):
+        return (f"MPDDiff(added={self.added}, removed={self.removed}, "
+                f"changed={self.changed}, reused={self.reused})")
+
+
+def _split_periods(content):
+    """Return (header, [(start, end)]) byte spans of the top-level Period elements"""
+    spans = []
+    pos = 0
+    while True:
+        match = _PERIOD_START.search(content, pos)
+        if match is None:
+            break
+        start = match.start()
+        tag_end = content.index(b'>', start)
+        if content[tag_end - 1:tag_end] == b'/':
+            end = tag_end + 1
+        else:
+            end = content.index(b'</Period>', tag_end) + len(b'</Period>')
+        spans.append((start, end))
+        pos = end
+    header = content[:spans[0][0]] if spans else content
+    return header, spans
+
+
+def _root_attributes(content):
+    """Attributes of the MPD element and the MPD-level BaseURL, without parsing any Period"""
+    attrib = {}
+    base_url = None
+    depth = 0
+    for event, elem in ET.iterparse(io.BytesIO(content), events=('start', 'end')):
+        if event == 'start':
+            depth += 1
+            if depth == 1:
+                attrib = dict(elem.attrib)
+            elif depth == 2 and elem.tag == f'{NS}Period':
+                break
+        else:
+            if depth == 2 and elem.tag == f'{NS}BaseURL':
+                base_url = elem.text
+            depth -= 1
+    return attrib, base_url
+
+
+class MPDLoader:
+    """
+    Loads and refreshes one MPD URL (http(s)://, file:// or a local path),
+    reusing the parsed periods that did not change.
+    """
+
+    def __init__(self, url, session=None):
+        self.url = url
+        self.base_url = url.rsplit('/', 1)[0] + '/'
+        self.document = None
+        self._session = session
+        self._own_session = session is None
+        self._etag = None
+        self._last_modified = None
+        self._file_stamp = None
+        self._periods = {}
+
+        # Measurement counters
+        self.fetches = 0
+        self.not_modified = 0
+        self.periods_parsed = 0
+        self.periods_reused = 0
+
+    async def close(self):
+        if self._own_session and self._session is not None:
+            await self._session.close()
+        self._session = None
+
+    async def refresh(self):
+        """
+        Revalidate and, if the manifest changed, update self.document.
+        Returns an MPDDiff (falsy when nothing changed).
+        """
+        self.fetches += 1
+        content = await self._fetch()
+        if content is None:
+            self.not_modified += 1
+            return MPDDiff(modified=False)
+        return self.parse(content)
+
+    async def _fetch(self):
+        """Manifest bytes, or None when the cached copy is still valid"""
+        if '://' not in self.url or self.url.startswith('file://'):
+            path = urllib.parse.urlparse(self.url).path if self.url.startswith('file://') else self.url
+            stat = os.stat(path)
+            stamp = (stat.st_mtime_ns, stat.st_size)
+            if stamp == self._file_stamp and self.document is not None:
+                return None
+            self._file_stamp = stamp
+            with open(path, 'rb') as f:
+                return f.read()
+
+        if self._session is None:
+            import aiohttp
+            self._session = aiohttp.ClientSession()
+        headers = {}
+        if self.document is not None:
+            if self._etag:
+                headers['If-None-Match'] = self._etag
+            if self._last_modified:
+                headers['If-Modified-Since'] = self._last_modified
+        async with self._session.get(self.url, headers=headers) as response:
+            if response.status == 304:
+                return None
+            response.raise_for_status()
+            content = await response.read()
+            self._etag = response.headers.get('ETag')
+            self._last_modified = response.headers.get('Last-Modified')
+            if response.url is not None:
+                self.base_url = str(response.url).rsplit('/', 1)[0] + '/'
+        return content
+
+    def parse(self, content):
+        """Update self.document from manifest bytes; returns the MPDDiff"""
+        diff = MPDDiff(modified=True)
+        header, spans = _split_periods(content)
+        attrib, base_url = _root_attributes(header + b'</MPD>' if spans else content)
+        root_tag = _ROOT_TAG.search(header).group(0)
+
+        periods = []
+        seen = {}
+        for index, (start, end) in enumerate(spans):
+            raw = content[start:end]
+            match = re.match(rb'<Period\b[^>]*?\sid="([^"]*)"', raw)
+            period_id = match.group(1).decode() if match else f'#{index}'
+            cached = self._periods.get(period_id)
+            if cached is not None and cached.raw == raw:
+                period = cached
+                diff.reused += 1
+                self.periods_reused += 1
+            else:
+                period = self._parse_period(period_id, root_tag, raw)
+                (diff.changed if cached is not None else diff.added).append(period_id)
+                self.periods_parsed += 1
+            seen[period_id] = period
+            periods.append(period)
+        diff.removed = [pid for pid in self._periods if pid not in seen]
+        self._periods = seen
+
+        mpd_base = self.base_url
+        if base_url:
+            mpd_base = urllib.parse.urljoin(mpd_base, base_url)
+        self.document = MPDDocument(mpd_base, attrib, periods)
+        return diff
+
+    @staticmethod
+    def _parse_period(period_id, root_tag, raw):
+        # The root start tag carries the namespace declarations the period may use
+        source = io.BytesIO(root_tag + raw + b'</MPD>')
+        for _, elem in ET.iterparse(source, events=('end',)):
+            if elem.tag == f'{NS}Period':
+                return PeriodEntry(period_id, elem, raw)
+        raise ValueError(f"Period {period_id} could not be parsed")
+
+    async def watch(self, interval=None, stop_event=None):
+        """
+        Async generator yielding (document, diff) for every refresh that
+        changed the manifest, polling at minimumUpdatePeriod or `interval`.
+        """
+        while stop_event is None or not stop_event.is_set():
+            diff = await self.refresh()
+            if diff:
+                yield self.document, diff
+            await asyncio.sleep(interval or _duration_seconds(
+                self.document.minimum_update_period, default=2.0))
+
+
+def _duration_seconds(value, default=None):
+    """Parse an ISO 8601 duration such as PT1H2M3.5S into seconds"""
+    if not value:
+        return default
+    match = re.fullmatch(r'P(?:(\d+)D)?(?:T(?:(\d+)H)?(?:(\d+)M)?(?:([\d.]+)S)?)?', value)
+    if match is None:
+        return default
+    days, hours, minutes, seconds = match.groups()
+    return (int(days or 0) * 86400 + int(hours or 0) * 3600 + int(minutes or 0) * 60
+            + float(seconds or 0))
@@ -0,0 +1,269 @@
+import asyncio
+import time
+
+
+class Pacer:
+    """
+    Deadline-based pacing for sending audio to Amazon Transcribe.
+
+    Instead of sleeping a fixed chunk duration after every send, the pacer
+    tracks how much audio has been sent and compares it with the wall clock:
+    - live:  never sleeps; the source already delivers audio in real time
+    - file:  sleeps until the wall-clock deadline of the audio sent so far,
+             and skips sleeping after a stall until it has caught up
+    - burst: like file, but the deadline runs `speed` times faster
+    """
+
+    MODES = ('live', 'file', 'burst')
+
+    def __init__(self, mode='live', bytes_per_second=32000, speed=4.0,
+                 lag_warning=2.0, report_interval=10.0, name='stream'):
+        """
+        Args:
+            mode: 'live', 'file' or 'burst'
+            bytes_per_second: PCM byte rate of the audio being sent
+            speed: real-time multiple used in burst mode
+            lag_warning: backlog in seconds above which lag is reported
+            report_interval: minimum seconds between lag reports
+            name: label used in reports
+        """
+        if mode not in self.MODES:
+            raise ValueError(f"Unsupported pacing mode: {mode}")
+        self.mode = mode
+        self.bytes_per_second = bytes_per_second
+        self.speed = speed if mode == 'burst' else 1.0
+        self.lag_warning = lag_warning
+        self.report_interval = report_interval
+        self.name = name
+        self.reset()
+
+    def reset(self):
+        """Restart the clock; the next pace() call is time zero"""
+        self._start = None
+        self._last_report = None
+        self.sent_bytes = 0
+        self.sent_seconds = 0.0
+        self.slept_seconds = 0.0
+        self.drift = 0.0
+        self.max_drift = 0.0
+
+    @property
+    def elapsed(self):
+        """Wall-clock seconds since the first send"""
+        if self._start is None:
+            return 0.0
+        return time.monotonic() - self._start
+
+    @property
+    def backlog_seconds(self):
+        """Seconds of audio the sender is behind its schedule"""
+        return max(0.0, self.drift)
+
+    def start(self):
+        """Start the clock explicitly (otherwise the first pace() starts it)"""
+        if self._start is None:
+            self._start = time.monotonic()
+            self._last_report = self._start
+
+    async def pace(self, nbytes):
+        """
+        Account for `nbytes` just sent and wait until the next send is due.
+        Drift is wall-clock time minus scheduled time: positive means the
+        sender is lagging, negative means it is ahead of schedule.
+        """
+        self.start()
+        self.sent_bytes += nbytes
+        self.sent_seconds += nbytes / self.bytes_per_second
+        scheduled = self.sent_seconds / self.speed
+
+        now = time.monotonic()
+        self.drift = (now - self._start) - scheduled
+        if self.mode != 'live' and self.drift < 0:
+            delay = -self.drift
+            await asyncio.sleep(delay)
+            self.slept_seconds += delay
+            now = time.monotonic()
+            self.drift = (now - self._start) - scheduled
+
+        self.max_drift = max(self.max_drift, self.drift)
+        self._maybe_report(now)
+
+    def _maybe_report(self, now):
+        if self.drift < self.lag_warning:
+            return
+        if now - self._last_report < self.report_interval:
+            return
+        self._last_report = now
+        print(f"[{self.name}] lagging: backlog {self.backlog_seconds:.2f}s "
+              f"(sent {self.sent_seconds:.1f}s of audio in {now - self._start:.1f}s, mode={self.mode})")
+
+    def stats(self):
+        """Snapshot of pacing state"""
+        return {
+            'mode': self.mode,
+            'elapsed': self.elapsed,
+            'sent_bytes': self.sent_bytes,
+            'sent_seconds': self.sent_seconds,
+            'slept_seconds': self.slept_seconds,
+            'drift': self.drift,
+            'max_drift': self.max_drift,
+            'backlog_seconds': self.backlog_seconds,
+        }
+
+
+# Largest audio event Transcribe accepts
+MAX_EVENT_BYTES = 32 * 1024
+
+
+class ChunkSizer:
+    """
+    Chooses the duration of the audio events sent to Transcribe from a
+    latency target and the measured cost of a send.
+
+    Every audio event costs about the same to send whatever its size
+    (event-stream framing, a SigV4 signature chained to the previous one,
+    a write to the HTTP/2 stream), so short events spend a large share of
+    the sender's time on overhead, while a long event holds its first
+    sample back for the whole event. Audio is coalesced or split into
+    events of
+        chunk_seconds = latency_target - send_cost
+    the longest event whose first sample is still on the wire within the
+    target, which is also the cheapest one the target allows. The target
+    is a hard cap: when the send cost leaves less than min_seconds, or
+    sending at that size takes more than max_overhead of real time, the
+    limit is reported (printed once, and in stats()) rather than traded
+    against latency. send_cost is a moving average of observe().
+
+    Audio is never held back past chunk_seconds: the rest of a source chunk
+    that the next chunk would arrive too late for is sent with the events
+    cut from it, and audio a slow or gated source leaves waiting is sent
+    as a shorter event.
+    """
+
+    def __init__(self, latency_target=0.2, bytes_per_second=32000, min_seconds=0.02, max_seconds=0.5,
+                 max_overhead=0.05, smoothing=0.1):
+        """
+        Args:
+            latency_target: seconds an audio sample may wait to be sent
+            bytes_per_second: PCM byte rate of the audio being sent
+            min_seconds, max_seconds: bounds of the event duration
+            max_overhead: fraction of real time spent sending above which
+                          the target is reported as too tight
+            smoothing: weight of the newest send time in the average
+        """
+        self.latency_target = latency_target
+        self.bytes_per_second = bytes_per_second
+        self.min_seconds = min_seconds
+        self.max_seconds = min(max_seconds, MAX_EVENT_BYTES / bytes_per_second)
+        self.max_bytes = int(self.max_seconds * bytes_per_second) // 2 * 2
+        self.max_overhead = max_overhead
+        self.smoothing = smoothing
+        self.send_cost = 0.0
+        self.events = 0
+        self.sent_bytes = 0
+        self.limited = None     # None, 'latency' or 'overhead'
+        self._reported = set()
+        self._pending = bytearray()
+        self._pending_since = None
+        self._last_arrival = None
+        self._resize()
+
+    def _resize(self):
+        seconds = self.latency_target - self.send_cost
+        if seconds < self.min_seconds:
+            # Not even the shortest event reaches the wire within the target
+            self.limited = 'latency'
+        elif self.send_cost > self.max_overhead * min(seconds, self.max_seconds):
+            self.limited = 'overhead'
+        else:
+            self.limited = None
+        seconds = min(max(seconds, self.min_seconds), self.max_seconds)
+        self.chunk_bytes = max(2, round(seconds * self.bytes_per_second) // 2 * 2)
+        if self.limited and self.limited not in self._reported:
+            self._reported.add(self.limited)
+            cost_ms = self.send_cost * 1000
+            if self.limited == 'latency':
+                print(f"Latency target of {self.latency_target * 1000:.0f} ms cannot be met: a send takes "
+                      f"{cost_ms:.1f} ms, sending {self.chunk_seconds * 1000:.0f} ms events")
+            else:
+                print(f"Latency target of {self.latency_target * 1000:.0f} ms costs {self.overhead:.1%} of "
+                      f"real time in sends ({cost_ms:.1f} ms each), over the {self.max_overhead:.0%} budget")
+
+    @property
+    def chunk_seconds(self):
+        return self.chunk_bytes / self.bytes_per_second
+
+    @property
+    def pending_bytes(self):
+        return len(self._pending)
+
+    @property
+    def overhead(self):
+        """Fraction of real time spent sending at the current size"""
+        return self.send_cost / self.chunk_seconds
+
+    def feed(self, chunk, now=None):
+        """
+        Add audio (None for none); returns the events due now.
+
+        Args:
+            chunk: PCM bytes from the source, or None
+            now: arrival time (default: time.monotonic())
+        """
+        if now is None:
+            now = time.monotonic()
+        interval = None
+        if chunk:
+            # Expect the next chunk as far off as this one was after the last
+            interval = now - self._last_arrival if self._last_arrival is not None \
+                else len(chunk) / self.bytes_per_second
+            self._last_arrival = now
+            if not self._pending:
+                self._pending_since = now
+            self._pending += chunk
+        events = []
+        size = self.chunk_bytes
+        while len(self._pending) >= size:
+            events.append(bytes(self._pending[:size]))
+            del self._pending[:size]
+            self._pending_since = now if self._pending else None
+        if self._pending:
+            deadline = self._pending_since + self.chunk_seconds
+            if now >= deadline or (interval is not None and now + interval > deadline):
+                # Waiting for the next chunk would hold this audio past the
+                # target; it has all arrived, so it goes out with the last event
+                tail = self.flush()
+                if events and len(events[-1]) + len(tail) <= self.max_bytes:
+                    events[-1] += tail
+                else:
+                    events.append(tail)
+        return events
+
+    def flush(self):
+        """Whatever is still held back, or None"""
+        if not self._pending:
+            return None
+        chunk = bytes(self._pending)
+        self._pending.clear()
+        self._pending_since = None
+        return chunk
+
+    def observe(self, seconds, nbytes=0):
+        """Record the time one event took to send"""
+        self.events += 1
+        self.sent_bytes += nbytes
+        if self.events == 1:
+            self.send_cost = seconds
+        else:
+            self.send_cost += self.smoothing * (seconds - self.send_cost)
+        self._resize()
+
+    def stats(self):
+        return {
+            'chunk_seconds': self.chunk_seconds,
+            'send_cost': self.send_cost,
+            'overhead': self.overhead,
+            'limited': self.limited,
+            'events': self.events,
+            'average_event_seconds': self.sent_bytes / self.bytes_per_second / self.events if self.events else 0.0,
+        }
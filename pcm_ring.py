@@ -0,0 +1,215 @@
+import asyncio
+import os
+import numpy as np
+
+
+class PCMRingBuffer:
+    """
+    Preallocated ring buffer of raw PCM bytes.
+
+    Producers fill it in place (readinto / os.readv on a pipe), consumers get
+    fixed-size chunks as memoryviews of the underlying buffer, so no bytes
+    object is allocated per read. The capacity is a whole number of chunks
+    and reads are chunk aligned, so a chunk never wraps around the end.
+
+    A chunk view is valid until `n_chunks - 1` further chunks have been
+    read; consumers that keep chunks in flight (e.g. DSPExecutor) must keep
+    fewer than that outstanding.
+    """
+
+    def __init__(self, chunk_size=4096, n_chunks=32):
+        if chunk_size % 2:
+            raise ValueError("chunk_size must hold whole 16-bit samples")
+        self.chunk_size = chunk_size
+        self.n_chunks = n_chunks
+        self.capacity = chunk_size * n_chunks
+        self._buf = bytearray(self.capacity)
+        self._view = memoryview(self._buf)
+        self._read_pos = 0   # absolute byte counters; position = counter % capacity
+        self._write_pos = 0
+        self.eof = False
+
+        # Measurement counters
+        self.bytes_read = 0
+        self.read_calls = 0
+        self.chunks_out = 0
+
+    def available(self):
+        """Bytes written but not yet consumed"""
+        return self._write_pos - self._read_pos
+
+    def free(self):
+        return self.capacity - self.available()
+
+    def writable_view(self):
+        """Largest contiguous free region at the write position"""
+        start = self._write_pos % self.capacity
+        length = min(self.free(), self.capacity - start)
+        return self._view[start:start + length]
+
+    def commit(self, nbytes):
+        """Mark nbytes written into writable_view() as readable"""
+        self._write_pos += nbytes
+        self.bytes_read += nbytes
+        self.read_calls += 1
+
+    def readinto(self, fileobj):
+        """Fill from a file object with readinto(); returns bytes read (0 at EOF)"""
+        view = self.writable_view()
+        if not len(view):
+            raise BufferError("PCM ring buffer is full")
+        n = fileobj.readinto(view)
+        if not n:
+            self.eof = True
+            return 0
+        self.commit(n)
+        return n
+
+    async def fill_from_fd(self, fd):
+        """
+        Read whatever is ready on a non-blocking fd into the ring, waiting
+        for readability if needed. Returns bytes read (0 at EOF).
+        """
+        loop = asyncio.get_running_loop()
+        while True:
+            view = self.writable_view()
+            if not len(view):
+                raise BufferError("PCM ring buffer is full")
+            try:
+                n = os.readv(fd, [view])
+            except BlockingIOError:
+                await _wait_readable(loop, fd)
+                continue
+            if n == 0:
+                self.eof = True
+                return 0
+            self.commit(n)
+            return n
+
+    def next_chunk(self):
+        """
+        Consume the next chunk and return it as a memoryview, or None if a
+        full chunk is not buffered yet. After EOF the remaining partial chunk
+        (truncated to whole samples) is returned.
+        """
+        available = self.available()
+        size = self.chunk_size
+        consumed = size
+        if available < size:
+            if not self.eof or available < 2:
+                return None
+            size = available - available % 2
+            consumed = available
+        start = self._read_pos % self.capacity
+        self._read_pos += consumed
+        self.chunks_out += 1
+        return self._view[start:start + size]
+
+    async def chunks_from_fd(self, fd):
+        """Async generator of chunk views read from a non-blocking fd"""
+        while True:
+            chunk = self.next_chunk()
+            if chunk is not None:
+                yield chunk
+                continue
+            if self.eof:
+                return
+            await self.fill_from_fd(fd)
+
+    def restart(self):
+        """
+        Prepare for a new producer after EOF: buffered bytes are dropped and
+        reads resume at the next chunk boundary (views already handed out
+        stay valid as long as before)
+        """
+        aligned = -(-self._write_pos // self.chunk_size) * self.chunk_size
+        self._read_pos = self._write_pos = aligned
+        self.eof = False
+
+    def stats(self):
+        return {
+            'capacity': self.capacity,
+            'bytes_read': self.bytes_read,
+            'read_calls': self.read_calls,
+            'chunks_out': self.chunks_out,
+            'buffered': self.available(),
+        }
+
+
+def _wait_readable(loop, fd):
+    """Future that resolves once fd is readable"""
+    future = loop.create_future()
+
+    def on_readable():
+        loop.remove_reader(fd)
+        if not future.done():
+            future.set_result(None)
+
+    loop.add_reader(fd, on_readable)
+    future.add_done_callback(lambda _: loop.remove_reader(fd))
+    return future
+
+
+def open_pipe():
+    """Create a pipe for a subprocess' stdout; returns (read_fd, write_fd) with a non-blocking read end"""
+    read_fd, write_fd = os.pipe()
+    os.set_blocking(read_fd, False)
+    return read_fd, write_fd
+
+
+def close_pipe(fd):
+    """Close a read fd opened with open_pipe(), dropping any pending reader callback"""
+    try:
+        asyncio.get_running_loop().remove_reader(fd)
+    except RuntimeError:
+        pass  # No running loop
+    os.close(fd)
+
+
+class PCMScratch:
+    """
+    Reusable numpy buffers for int16 <-> float32 conversion.
+
+    Output chunks rotate through `slots` preallocated int16 slots and are
+    returned as byte memoryviews, each valid for `slots - 1` further calls.
+    """
+
+    def __init__(self, max_samples=16384, slots=8):
+        self.max_samples = max_samples
+        self.slots = slots
+        self._float = np.empty(max_samples, dtype=np.float32)
+        self._out = bytearray(max_samples * 2 * slots)
+        self._out_int16 = np.frombuffer(self._out, dtype=np.int16).reshape(slots, max_samples)
+        self._out_view = memoryview(self._out)
+        self._slot = 0
+        self.bytes_copied = 0
+
+    def to_float(self, pcm):
+        """int16 PCM bytes-like -> float32 view in [-1, 1) (valid until the next call)"""
+        samples = np.frombuffer(pcm, dtype=np.int16)
+        if len(samples) > self.max_samples:
+            raise ValueError(f"Chunk of {len(samples)} samples exceeds scratch size")
+        out = self._float[:len(samples)]
+        # Cast first, then scale in place: a mixed-type multiply would
+        # allocate a cast buffer on every call
+        np.copyto(out, samples)
+        np.multiply(out, np.float32(1.0 / 32768), out=out)
+        return out
+
+    def to_pcm(self, audio):
+        """
+        float array -> int16 PCM written into the next output slot.
+        `audio` is clipped and scaled in place, so it must be a buffer the
+        caller owns.
+        """
+        n = len(audio)
+        if n > self.max_samples:
+            raise ValueError(f"Chunk of {n} samples exceeds scratch size")
+        np.clip(audio, -1.0, 32767.0 / 32768.0, out=audio)
+        np.multiply(audio, 32768.0, out=audio)
+        slot = self._slot
+        self._slot = (slot + 1) % self.slots
+        np.copyto(self._out_int16[slot, :n], audio, casting='unsafe')
+        self.bytes_copied += n * 2
+        start = slot * self.max_samples * 2
+        return self._out_view[start:start + n * 2]
@@ -0,0 +1,797 @@
+"""
+Composable source -> stages -> sink pipelines.
+
+A Pipeline connects a Source, any number of Stages and a Sink with bounded
+channels, one task per node, so every node runs concurrently with the
+others and a slow node holds back the ones before it instead of growing
+memory. Each node declares the frames it takes and emits (FrameFormat:
+16-bit PCM of a rate and channel count, or caption cues); the chain is
+checked when the pipeline is built, so stages can be reordered, left out
+or added without touching the scripts, and a mismatch is a ValueError
+rather than garbled audio.
+
+Stages run their process() 'inline' on the event loop, on a 'thread' of
+their own, or in a 'process' of their own (the stage is pickled to the
+worker once and keeps its state there); each stage lists the modes it
+supports. Per stage, the pipeline records frames and bytes in and out,
+processing time and the time spent blocked on the next stage, as
+stats() / report() and as metrics:
+  caption_stage_seconds          processing time per frame, by pipeline and stage
+  caption_stage_queue_depth      frames waiting in front of a stage
+
+Example (TS source, denoise on a thread, compress silence, send, store):
+    pipeline = Pipeline(TSSource(url), [DenoiseStage(mode='thread'), VADStage(),
+                                        TranscribeStage('zh-CN')],
+                        CaptionSink(SubtitleSink('out', formats=('srt',))))
+    await pipeline.run()
+
+Benchmark stages on synthetic audio (or a capture file) at full speed:
+    python pipeline.py --stages convert,denoise@process,vad,rechunk --input-rate 48000 --input-channels 2
+"""
+
+import abc
+import argparse
+import asyncio
+import concurrent.futures
+import time
+from dsp_executor import to_bytes
+from metrics import REGISTRY
+
+
+class FrameFormat:
+    """What flows over a channel: 16-bit PCM of a rate and channel count, or caption cues"""
+
+    __slots__ = ('kind', 'sample_rate', 'channels')
+
+    def __init__(self, kind='pcm', sample_rate=16000, channels=1):
+        self.kind = kind
+        self.sample_rate = sample_rate if kind == 'pcm' else None
+        self.channels = channels if kind == 'pcm' else None
+
+    @property
+    def bytes_per_second(self):
+        return self.sample_rate * self.channels * 2 if self.kind == 'pcm' else None
+
+    def __eq__(self, other):
+        return (isinstance(other, FrameFormat) and
+                (self.kind, self.sample_rate, self.channels) == (other.kind, other.sample_rate, other.channels))
+
+    def __hash__(self):
+        return hash((self.kind, self.sample_rate, self.channels))
+
+    def __repr__(self):
+        if self.kind != 'pcm':
+            return self.kind
+        return f"pcm {self.sample_rate} Hz x{self.channels}"
+
+
+PCM16 = FrameFormat()               # 16 kHz mono, what Transcribe is sent
+CUES = FrameFormat('cues')          # caption_segmenter.Cue objects
+
+
+class TimelineChain:
+    """Several TimelineMaps applied in order, usable as one"""
+
+    def __init__(self, maps):
+        self.maps = [m for m in maps if m is not None]
+
+    def to_source(self, t):
+        for timeline in self.maps:
+            t = timeline.to_source(t)
+        return t
+
+
+class StageStats:
+    """Counters of one pipeline node, and its metric children"""
+
+    def __init__(self, pipeline, stage, registry=REGISTRY):
+        self.frames_in = 0
+        self.frames_out = 0
+        self.bytes_in = 0
+        self.bytes_out = 0
+        self.busy = 0.0
+        self.blocked = 0.0
+        self.seconds = registry.histogram(
+            'caption_stage_seconds', 'Processing time per frame and pipeline stage',
+            ('pipeline', 'stage')).labels(pipeline, stage)
+        self.queue_depth = registry.gauge(
+            'caption_stage_queue_depth', 'Frames waiting in front of a pipeline stage',
+            ('pipeline', 'stage')).labels(pipeline, stage)
+
+
+_END = object()
+
+
+class Channel:
+    """Bounded queue between two nodes; a consumer that stops also stops its producer"""
+
+    def __init__(self, maxsize, stats):
+        self._queue = asyncio.Queue(maxsize)
+        self.stats = stats
+        self.closed = False
+
+    async def put(self, frame):
+        """Queue a frame; False once the consumer is gone"""
+        if self.closed:
+            return False
+        await self._queue.put(frame)
+        self.stats.queue_depth.set(self._queue.qsize())
+        return not self.closed
+
+    async def end(self):
+        if not self.closed:
+            await self._queue.put(_END)
+
+    def close(self):
+        """Consumer side: unblock a waiting producer and refuse further frames"""
+        self.closed = True
+        while not self._queue.empty():
+            self._queue.get_nowait()
+
+    async def frames(self):
+        stats = self.stats
+        try:
+            while True:
+                frame = await self._queue.get()
+                stats.queue_depth.set(self._queue.qsize())
+                if frame is _END:
+                    return
+                stats.frames_in += 1
+                stats.bytes_in += len(frame) if isinstance(frame, (bytes, bytearray, memoryview)) else 0
+                yield frame
+        finally:
+            self.close()
+
+
+# Stages running in 'process' mode, by key, in the worker process that owns them
+_worker_stages = {}
+
+
+def _start_in_worker(key, stage):
+    stage.setup()
+    _worker_stages[key] = stage
+
+
+def _process_in_worker(key, frame):
+    return to_bytes(_worker_stages[key].process(frame))
+
+
+def _flush_in_worker(key):
+    return to_bytes(_worker_stages.pop(key).flush())
+
+
+async def _aclose(frames):
+    """Finalize an async generator now rather than when it is collected"""
+    aclose = getattr(frames, 'aclose', None)
+    if aclose is not None:
+        try:
+            await aclose()
+        except RuntimeError:
+            pass  # Still running in another task (e.g. a pending anext); it ends with that task
+
+
+class Source(abc.ABC):
+    """Where frames come from; subclasses implement frames()"""
+
+    name = 'source'
+    output_format = PCM16
+    # Frames are views of a buffer the source reuses (e.g. PCMRingBuffer)
+    borrowed = False
+    # TimelineMap of gaps in the source's own audio, if it keeps one
+    timeline = None
+    # Name the source's metrics are recorded under, if it has any
+    channel = None
+
+    @abc.abstractmethod
+    def frames(self):
+        """Async iterator of frames"""
+
+    async def close(self):
+        pass
+
+
+class IterSource(Source):
+    """Frames from any async iterable"""
+
+    def __init__(self, chunks, output_format=PCM16, borrowed=False, name='source'):
+        self.chunks = chunks
+        self.output_format = output_format
+        self.borrowed = borrowed
+        self.name = name
+
+    def frames(self):
+        return aiter(self.chunks)
+
+
+class TSSource(Source):
+    """A TS stream (TSPlayer) without its built-in denoising"""
+
+    name = 'ts'
+    borrowed = True
+
+    def __init__(self, url, input_rate=None, input_channels=None, convert=False, **player_args):
+        """
+        Args:
+            url: stream URL or path
+            input_rate, input_channels: PCM format ffmpeg decodes to (default 16 kHz mono)
+            convert: convert to 16 kHz mono in the player rather than emit the
+                     input format for a ConvertStage
+            player_args: further TSPlayer arguments (reconnect, capture, ...)
+        """
+        from ts_player import TSPlayer
+        self.player = TSPlayer(url, input_rate=input_rate, input_channels=input_channels, **player_args)
+        self.timeline = self.player.timeline
+        self.channel = self.player.metrics.channel
+        self.convert = convert
+        if not convert:
+            self.output_format = FrameFormat('pcm', input_rate or 16000, input_channels or 1)
+
+    def frames(self):
+        return self.player.get_source_stream(convert=self.convert)
+
+    async def close(self):
+        await self.player.close()
+
+
+class MicSource(Source):
+    """The microphone (MicrophoneInput)"""
+
+    name = 'mic'
+    borrowed = True
+    channel = 'mic'
+
+    def __init__(self):
+        from mic_input import MicrophoneInput
+        self.mic = MicrophoneInput()
+
+    def frames(self):
+        return self.mic.get_audio_stream()
+
+    async def close(self):
+        await self.mic.close()
+
+
+class CaptureSource(Source):
+    """Recorded audio from a capture file, at its recorded times or (speed=None) at once"""
+
+    name = 'capture'
+
+    def __init__(self, path, sent=False, speed=None):
+        """
+        Args:
+            path: capture file (capture.py)
+            sent: replay the audio as sent instead of the source audio before DSP
+            speed: real-time multiple, or None for no waiting
+        """
+        from capture import CaptureReader, SOURCE, SENT
+        self.reader = CaptureReader(path)
+        self.kind = SENT if sent else SOURCE
+        self.speed = speed
+
+    def frames(self):
+        from capture import replay_audio
+        return replay_audio(self.reader.chunks(self.kind), self.speed)
+
+    async def close(self):
+        self.reader.close()
+
+
+class Stage:
+    """
+    One step between two channels. Subclasses set input_format (None: any
+    PCM) and output_format (None: same as the input), the execution modes
+    they support, and implement process(frame) -> frame or None and, if
+    they hold audio back, flush(). State that cannot be pickled is made in
+    setup(), which runs where the stage runs. Stages that are not a function of one
+    frame (re-chunking, the Transcribe session) override run() instead.
+    """
+
+    name = 'stage'
+    input_format = PCM16
+    output_format = None
+    modes = ('inline', 'thread', 'process')
+    # Output frames are views of a buffer that later process() calls reuse
+    borrowed = False
+    timeline = None
+
+    def __init__(self, mode='inline', name=None):
+        if mode not in self.modes:
+            raise ValueError(f"{type(self).__name__} cannot run in {mode} mode "
+                             f"(supports {', '.join(self.modes)})")
+        self.mode = mode
+        if name:
+            self.name = name
+        self.stats = None
+        self._lane = None
+        self._key = None
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state['_lane'] = None
+        state['stats'] = None
+        return state
+
+    def bind(self, input_format):
+        """Check the upstream format; returns the format this stage emits"""
+        if self.input_format is not None and input_format != self.input_format:
+            raise ValueError(f"{self.name} takes {self.input_format}, but gets {input_format}")
+        if self.input_format is None and input_format.kind != 'pcm':
+            raise ValueError(f"{self.name} takes PCM, but gets {input_format}")
+        return self.output_format or input_format
+
+    def connect(self, upstream):
+        """Called with the source and the stages before this one"""
+
+    def setup(self):
+        """Create processing state (in the worker process for 'process' mode)"""
+
+    def process(self, frame):
+        return frame
+
+    def flush(self):
+        return None
+
+    async def start(self):
+        if self.mode != 'process':
+            self.setup()
+        if self.mode == 'thread':
+            self._lane = concurrent.futures.ThreadPoolExecutor(max_workers=1, thread_name_prefix=self.name)
+        elif self.mode == 'process':
+            self._lane = concurrent.futures.ProcessPoolExecutor(max_workers=1)
+            self._key = id(self)
+            await asyncio.get_running_loop().run_in_executor(self._lane, _start_in_worker, self._key, self)
+
+    async def close(self):
+        if self._lane is not None:
+            self._lane.shutdown(wait=False, cancel_futures=True)
+            self._lane = None
+
+    async def _call(self, frame):
+        if self.mode == 'inline':
+            return self.process(frame) if frame is not None else self.flush()
+        loop = asyncio.get_running_loop()
+        if self.mode == 'thread':
+            if frame is None:
+                return await loop.run_in_executor(self._lane, self.flush)
+            return await loop.run_in_executor(self._lane, self.process, frame)
+        if frame is None:
+            return await loop.run_in_executor(self._lane, _flush_in_worker, self._key)
+        return await loop.run_in_executor(self._lane, _process_in_worker, self._key, bytes(frame))
+
+    async def run(self, frames):
+        """Yield the output for an async iterable of frames, then what flush() holds back"""
+        stats = self.stats
+        async for frame in frames:
+            started = time.perf_counter()
+            out = await self._call(frame)
+            elapsed = time.perf_counter() - started
+            stats.busy += elapsed
+            stats.seconds.observe(elapsed)
+            if out:
+                yield out
+        started = time.perf_counter()
+        out = await self._call(None)
+        stats.busy += time.perf_counter() - started
+        if out:
+            yield out
+
+
+class ConvertStage(Stage):
+    """Downmix and resample to 16 kHz mono (resampler.PCMConverter)"""
+
+    name = 'convert'
+    output_format = PCM16
+
+    def __init__(self, input_rate, input_channels=1, mode='inline'):
+        super().__init__(mode)
+        self.input_format = FrameFormat('pcm', input_rate, input_channels)
+        self.converter = None
+
+    def setup(self):
+        from resampler import PCMConverter
+        self.converter = PCMConverter(self.input_format.sample_rate, self.input_format.channels)
+
+    def process(self, frame):
+        return self.converter.process(frame)
+
+
+class DenoiseStage(Stage):
+    """Noise reduction (AudioProcessor)"""
+
+    name = 'denoise'
+    borrowed = True
+
+    def __init__(self, streaming=True, mode='inline'):
+        super().__init__(mode)
+        self.streaming = streaming
+        self.processor = None
+
+    def setup(self):
+        from audio_processor import AudioProcessor
+        self.processor = AudioProcessor(streaming=self.streaming)
+
+    def process(self, frame):
+        return self.processor.process_chunk_sync(frame)
+
+    def flush(self):
+        return self.processor.flush()
+
+
+class VADStage(Stage):
+    """Suppress or compress non-speech (vad.VoiceActivityGate)"""
+
+    name = 'vad'
+    # The gate's timeline is read by the sender, so it must stay in this process
+    modes = ('inline', 'thread')
+
+    def __init__(self, vad_mode='compress', mode='inline', **gate_args):
+        super().__init__(mode)
+        from vad import VoiceActivityGate
+        self.gate = VoiceActivityGate(mode=vad_mode, **gate_args)
+        self.timeline = self.gate.timeline
+
+    def process(self, frame):
+        return self.gate.process(frame)
+
+    def flush(self):
+        print(self.gate.report())
+        return None
+
+
+class RechunkStage(Stage):
+    """Coalesce or split PCM into frames of `frame_ms` (the last one may be shorter)"""
+
+    name = 'rechunk'
+    input_format = None
+    modes = ('inline',)
+
+    def __init__(self, frame_ms=100, mode='inline'):
+        super().__init__(mode)
+        self.frame_ms = frame_ms
+        self.frame_bytes = None
+
+    def bind(self, input_format):
+        output_format = super().bind(input_format)
+        block = input_format.channels * 2
+        self.frame_bytes = max(block, int(input_format.bytes_per_second * self.frame_ms / 1000) // block * block)
+        return output_format
+
+    async def run(self, frames):
+        stats = self.stats
+        size = self.frame_bytes
+        pending = bytearray()
+        async for frame in frames:
+            started = time.perf_counter()
+            pending += frame
+            out = []
+            while len(pending) >= size:
+                out.append(bytes(pending[:size]))
+                del pending[:size]
+            elapsed = time.perf_counter() - started
+            stats.busy += elapsed
+            stats.seconds.observe(elapsed)
+            for chunk in out:
+                yield chunk
+        if pending:
+            yield bytes(pending)
+
+
+class _CueQueue:
+    """Caption sink handing cues to the next channel"""
+
+    def __init__(self, queue):
+        self.queue = queue
+
+    def write(self, cue):
+        self.queue.put_nowait(cue)
+
+    async def close(self):
+        pass
+
+
+class TranscribeStage(Stage):
+    """
+    A Transcribe session (transcribe_network_stream): takes 16 kHz mono PCM
+    and emits caption cues. Timelines of the source and of earlier stages
+    (e.g. VADStage) are applied, so cue times are source times.
+    """
+
+    name = 'transcribe'
+    output_format = CUES
+    modes = ('inline',)
+
+    def __init__(self, language_code='zh-CN', pacing='live', endpoint=None, client=None, capture=None,
+                 channel=None, chunk_latency=None):
+        super().__init__()
+        self.language_code = language_code
+        self.pacing = pacing
+        self.endpoint = endpoint
+        self.client = client
+        self.capture = capture
+        self.channel = channel
+        self.chunk_latency = chunk_latency
+        self.timelines = ()
+        self._accounted = 0.0
+
+    def connect(self, upstream):
+        # Session metrics go under the source's name unless one is given
+        if self.channel is None:
+            self.channel = upstream[0].channel
+        # Sent time is mapped back through the nearest stage first
+        self.timelines = tuple(node.timeline for node in reversed(upstream) if node.timeline is not None)
+
+    def _account(self, metrics, observe=True):
+        """Add the session's send and result handling time since the last call to busy"""
+        total = metrics.send_seconds.sum + metrics.event_seconds.sum
+        elapsed = total - self._accounted
+        self._accounted = total
+        self.stats.busy += elapsed
+        if observe:
+            self.stats.seconds.observe(elapsed)
+
+    async def _timed(self, frames, metrics):
+        """
+        Pass frames to the session, charging each the send and result handling
+        time since the frame before (pacing waits are not processing time)
+        """
+        first = True
+        async for frame in frames:
+            self._account(metrics, observe=not first)
+            first = False
+            yield frame
+
+    async def run(self, frames):
+        from metrics import channel_metrics
+        from transcribe_audio import transcribe_network_stream
+        channel = self.channel or self.language_code
+        metrics = channel_metrics(channel)
+        # The channel's metrics accumulate across sessions; count from here
+        self._accounted = metrics.send_seconds.sum + metrics.event_seconds.sum
+        cues = asyncio.Queue()
+        session = asyncio.create_task(transcribe_network_stream(
+            self._timed(frames, metrics), pacing=self.pacing, language_code=self.language_code,
+            endpoint=self.endpoint, sink=_CueQueue(cues), channel=channel,
+            timeline=TimelineChain(self.timelines) if self.timelines else None,
+            client=self.client, capture=self.capture, chunk_latency=self.chunk_latency))
+        session.add_done_callback(lambda _: cues.put_nowait(_END))
+        try:
+            while True:
+                cue = await cues.get()
+                if cue is _END:
+                    break
+                yield cue
+            await session
+            self._account(metrics)
+        finally:
+            if not session.done():
+                session.cancel()
+
+
+class Sink(abc.ABC):
+    """Where frames end up; subclasses implement consume()"""
+
+    name = 'sink'
+    input_format = CUES
+
+    def bind(self, input_format):
+        if self.input_format is not None and input_format != self.input_format:
+            raise ValueError(f"{self.name} takes {self.input_format}, but gets {input_format}")
+
+    @abc.abstractmethod
+    async def consume(self, frames):
+        """Take every frame of an async iterable"""
+
+
+class CaptionSink(Sink):
+    """Any caption sink (SubtitleSink, CaptionStore, CaptionChannel, SinkGroup)"""
+
+    name = 'captions'
+
+    def __init__(self, sink):
+        self.sink = sink
+
+    async def consume(self, frames):
+        try:
+            async for cue in frames:
+                self.sink.write(cue)
+        finally:
+            await self.sink.close()
+
+
+class NullSink(Sink):
+    """Discards whatever it gets (benchmarks)"""
+
+    name = 'null'
+    input_format = None
+
+    async def consume(self, frames):
+        async for _ in frames:
+            pass
+
+
+class Pipeline:
+    """A source, stages and a sink, connected by bounded channels"""
+
+    def __init__(self, source, stages=(), sink=None, name='pipeline', queue_size=8):
+        """
+        Args:
+            source: Source
+            stages: Stages in order
+            sink: Sink (default: NullSink)
+            name: pipeline label of the stage metrics
+            queue_size: frames each channel holds before its producer waits
+        """
+        self.source = source
+        self.stages = list(stages)
+        self.sink = sink or NullSink()
+        self.name = name
+        self.queue_size = queue_size
+        fmt = source.output_format
+        for i, stage in enumerate(self.stages):
+            fmt = stage.bind(fmt)
+            stage.connect([source] + self.stages[:i])
+        self.sink.bind(fmt)
+        self.nodes = [source] + self.stages + [self.sink]
+        seen = {}
+        self.names = []
+        for node in self.nodes:
+            count = seen[node.name] = seen.get(node.name, 0) + 1
+            self.names.append(node.name if count == 1 else f"{node.name}{count}")
+        self.stats = {label: StageStats(name, label) for label in self.names}
+        for stage, label in zip(self.stages, self.names[1:]):
+            stage.stats = self.stats[label]
+        self.elapsed = 0.0
+
+    async def _pump(self, frames, stats, out, borrowed, upstream=None, inputs=None):
+        """
+        Move frames into the next channel, counting them and the time it
+        made us wait. `upstream` is the channel feeding `frames` (through
+        the iterator `inputs`); it is closed when the node stops, so its
+        producer stops too.
+        """
+        try:
+            async for frame in frames:
+                if borrowed:
+                    frame = bytes(frame)
+                stats.frames_out += 1
+                if isinstance(frame, (bytes, bytearray, memoryview)):
+                    stats.bytes_out += len(frame)
+                started = time.perf_counter()
+                running = await out.put(frame)
+                stats.blocked += time.perf_counter() - started
+                if not running:
+                    break
+            await out.end()
+        finally:
+            await _aclose(frames)
+            if upstream is not None:
+                await _aclose(inputs)
+                upstream.close()
+
+    async def _consume(self, upstream):
+        inputs = upstream.frames()
+        try:
+            await self.sink.consume(inputs)
+        finally:
+            await _aclose(inputs)
+            upstream.close()
+
+    async def run(self):
+        """Run until the source ends, the sink stops or a node fails; returns stats()"""
+        channels = [Channel(self.queue_size, self.stats[label]) for label in self.names[1:]]
+        tasks = []
+        started = time.perf_counter()
+        try:
+            for stage in self.stages:
+                await stage.start()
+            tasks.append(asyncio.create_task(
+                self._pump(self.source.frames(), self.stats[self.names[0]], channels[0], self.source.borrowed)))
+            for i, stage in enumerate(self.stages):
+                inputs = channels[i].frames()
+                tasks.append(asyncio.create_task(self._pump(
+                    stage.run(inputs), self.stats[self.names[i + 1]], channels[i + 1], stage.borrowed,
+                    channels[i], inputs)))
+            tasks.append(asyncio.create_task(self._consume(channels[-1])))
+            done, pending = await asyncio.wait(tasks, return_when=asyncio.FIRST_EXCEPTION)
+            for task in done:
+                if task.exception() is not None:
+                    raise task.exception()
+        finally:
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            for stage in self.stages:
+                await stage.close()
+            await self.source.close()
+            self.elapsed = time.perf_counter() - started
+        return self.stats_dict()
+
+    def stats_dict(self):
+        return {label: {
+            'frames_in': s.frames_in, 'frames_out': s.frames_out,
+            'bytes_in': s.bytes_in, 'bytes_out': s.bytes_out,
+            'busy': s.busy, 'blocked': s.blocked,
+        } for label, s in self.stats.items()}
+
+    def report(self):
+        """Per node table: mode, frames, processing time per second of input audio, time blocked"""
+        lines = [f"{'node':12s} {'mode':8s} {'frames in':>10s} {'out':>8s} {'ms/audio s':>11s} {'blocked s':>10s}"]
+        fmt = self.source.output_format
+        for node, label in zip(self.nodes, self.names):
+            s = self.stats[label]
+            per_second = ''
+            if isinstance(node, Stage):
+                bps = (node.input_format or fmt).bytes_per_second
+                if bps and s.bytes_in and s.busy:
+                    per_second = f"{s.busy / (s.bytes_in / bps) * 1000:.2f}"
+                fmt = node.output_format or fmt
+            lines.append(f"{label:12s} {getattr(node, 'mode', ''):8s} {s.frames_in:10d} {s.frames_out:8d} "
+                         f"{per_second:>11s} {s.blocked:10.2f}")
+        lines.append(f"elapsed {self.elapsed:.2f}s")
+        return '\n'.join(lines)
+
+
+STAGES = {
+    'convert': ConvertStage,
+    'denoise': DenoiseStage,
+    'vad': VADStage,
+    'rechunk': RechunkStage,
+}
+
+
+def build_stages(spec, input_rate=None, input_channels=None):
+    """
+    Stages from a spec like "convert,denoise@thread,vad,rechunk": names of
+    STAGES in order, each optionally @inline, @thread or @process
+    """
+    stages = []
+    for item in spec.split(','):
+        item = item.strip()
+        if not item:
+            continue
+        name, _, mode = item.partition('@')
+        if name not in STAGES:
+            raise ValueError(f"Unknown stage {name!r} (one of {', '.join(STAGES)})")
+        kwargs = {'mode': mode or 'inline'}
+        if name == 'convert':
+            kwargs.update(input_rate=input_rate or 16000, input_channels=input_channels or 1)
+        stages.append(STAGES[name](**kwargs))
+    return stages
+
+
+async def synthetic_audio(seconds, rate=16000, channels=1, chunk_bytes=4096):
+    """Speech-like bursts over noise, unpaced"""
+    import numpy as np
+    rng = np.random.default_rng(0)
+    t = np.arange(int(rate * seconds)) / rate
+    signal = 0.2 * np.sin(2 * np.pi * 220 * t) * (np.sin(2 * np.pi * 0.3 * t) > 0)
+    signal = signal + 0.02 * rng.standard_normal(t.size)
+    pcm = (np.repeat(signal[:, None], channels, axis=1) * 32767).astype('<i2').tobytes()
+    for i in range(0, len(pcm), chunk_bytes):
+        yield pcm[i:i + chunk_bytes]
+        await asyncio.sleep(0)
+
+
+async def main():
+    parser = argparse.ArgumentParser(description='Run pipeline stages at full speed and report per-stage cost')
+    parser.add_argument('--stages', default='denoise,vad', help='e.g. convert,denoise@process,vad,rechunk')
+    parser.add_argument('--seconds', type=float, default=60.0, help='Synthetic audio duration')
+    parser.add_argument('--capture', default=None, help='Use the source audio of a capture file instead')
+    parser.add_argument('--input-rate', type=int, default=None)
+    parser.add_argument('--input-channels', type=int, default=None)
+    parser.add_argument('--queue-size', type=int, default=8)
+    args = parser.parse_args()
+
+    stages = build_stages(args.stages, args.input_rate, args.input_channels)
+    if args.capture:
+        source = CaptureSource(args.capture)
+    else:
+        fmt = FrameFormat('pcm', args.input_rate or 16000, args.input_channels or 1)
+        source = IterSource(synthetic_audio(args.seconds, fmt.sample_rate, fmt.channels), fmt, name='synthetic')
+    pipeline = Pipeline(source, stages, NullSink(), name='bench', queue_size=args.queue_size)
+    await pipeline.run()
+    print(pipeline.report())
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
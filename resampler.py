@@ -0,0 +1,146 @@
+"""
+In-process sample rate conversion and downmixing for the Transcribe input
+(16 kHz mono 16-bit PCM), so sources can be decoded at their native format
+without a resampling/downmix pass in ffmpeg.
+"""
+
+import math
+import numpy as np
+
+# Channel orders as decoded by ffmpeg (s16le, interleaved)
+LAYOUTS = {
+    1: ('FC',),
+    2: ('FL', 'FR'),
+    6: ('FL', 'FR', 'FC', 'LFE', 'BL', 'BR'),
+    8: ('FL', 'FR', 'FC', 'LFE', 'BL', 'BR', 'SL', 'SR'),
+}
+
+# Dialogue-focused weights: centre (where speech is mixed) dominates,
+# surrounds are attenuated and LFE is dropped
+DIALOGUE_WEIGHTS = {
+    'FC': 0.707, 'FL': 0.354, 'FR': 0.354, 'LFE': 0.0,
+    'BL': 0.177, 'BR': 0.177, 'SL': 0.177, 'SR': 0.177,
+}
+
+
+def downmix_weights(channels, mode='dialogue'):
+    """
+    Per-channel weights for a mono downmix.
+    'dialogue' is centre-weighted for 5.1/7.1; 'average' weights all channels equally.
+    """
+    if channels == 1:
+        return np.ones(1, dtype=np.float32)
+    layout = LAYOUTS.get(channels)
+    if mode == 'average' or layout is None or 'FC' not in layout:
+        return np.full(channels, 1.0 / channels, dtype=np.float32)
+    return np.array([DIALOGUE_WEIGHTS[name] for name in layout], dtype=np.float32)
+
+
+class StreamingResampler:
+    """
+    Polyphase FIR resampler for a rational ratio out_rate/in_rate = L/M.
+
+    The prototype low-pass (Kaiser-windowed sinc, `taps` taps per phase) is
+    split into L phases; output sample n uses phase (n*M) % L on the input
+    ending at (n*M) // L. The last taps-1 input samples and the output
+    position are kept between calls, so chunk boundaries are seamless and
+    the output equals resampling the whole signal at once.
+    """
+
+    def __init__(self, in_rate, out_rate=16000, taps=32, rolloff=0.9, beta=8.0):
+        """
+        Args:
+            in_rate, out_rate: sample rates (Hz)
+            taps: filter taps per output sample
+            rolloff: pass band edge as a fraction of the lower Nyquist frequency
+            beta: Kaiser window beta (stop band attenuation)
+        """
+        g = math.gcd(in_rate, out_rate)
+        self.in_rate = in_rate
+        self.out_rate = out_rate
+        self.up = out_rate // g
+        self.down = in_rate // g
+        self.taps = taps
+        self.filter = self._design(rolloff, beta)
+        self.reset()
+
+    def _design(self, rolloff, beta):
+        length = self.up * self.taps
+        cutoff = 0.5 * rolloff / max(self.up, self.down)   # cycles per upsampled sample
+        n = np.arange(length) - (length - 1) / 2.0
+        prototype = 2 * cutoff * np.sinc(2 * cutoff * n) * np.kaiser(length, beta)
+        # Unity gain per phase
+        prototype *= self.up / prototype.sum()
+        # phases[p, k] = prototype[p + k * up]
+        return prototype.reshape(self.taps, self.up).T.astype(np.float32).copy()
+
+    def reset(self):
+        self._history = np.zeros(self.taps - 1, dtype=np.float32)
+        self._consumed = 0      # input samples seen
+        self._produced = 0      # output samples produced
+
+    @property
+    def delay_seconds(self):
+        """Group delay of the filter"""
+        return (self.up * self.taps - 1) / 2.0 / (self.up * self.in_rate)
+
+    def process(self, samples):
+        """Resample a float32 mono chunk; returns the output samples it completes"""
+        samples = np.asarray(samples, dtype=np.float32)
+        if self.up == self.down:
+            return samples
+        buf = np.concatenate((self._history, samples))
+        total = self._consumed + len(samples)
+        # Outputs whose newest input sample has arrived: n * down // up <= total - 1
+        end = (total * self.up + self.down - 1) // self.down
+        n = np.arange(self._produced, end, dtype=np.int64)
+        position = n * self.down
+        newest = position // self.up - (self._consumed - (self.taps - 1))
+        index = newest[:, None] - np.arange(self.taps)[None, :]
+        out = np.einsum('ij,ij->i', buf[index], self.filter[position % self.up])
+
+        self._history = buf[len(buf) - (self.taps - 1):].copy()
+        self._consumed = total
+        self._produced = end
+        return out
+
+
+class PCMConverter:
+    """
+    Interleaved 16-bit PCM at any rate/channel count -> 16-bit mono at
+    `out_rate`: a weighted downmix followed by StreamingResampler.
+    Partial frames at the end of a chunk are carried to the next call.
+    """
+
+    def __init__(self, in_rate, in_channels, out_rate=16000, downmix='dialogue'):
+        self.in_rate = in_rate
+        self.in_channels = in_channels
+        self.out_rate = out_rate
+        self.frame_bytes = 2 * in_channels
+        self.weights = downmix_weights(in_channels, downmix)
+        self.resampler = StreamingResampler(in_rate, out_rate) if in_rate != out_rate else None
+        self._carry = b''
+        self.bytes_in = 0
+        self.bytes_out = 0
+
+    @property
+    def passthrough(self):
+        return self.in_channels == 1 and self.resampler is None
+
+    def process(self, pcm):
+        """Convert a bytes-like chunk; returns bytes (possibly empty)"""
+        if self.passthrough:
+            return pcm
+        self.bytes_in += len(pcm)
+        if self._carry:
+            pcm = self._carry + bytes(pcm)
+        usable = len(pcm) - len(pcm) % self.frame_bytes
+        self._carry = bytes(pcm[usable:])
+        frames = np.frombuffer(pcm, dtype=np.int16, count=usable // 2)
+        frames = frames.reshape(-1, self.in_channels).astype(np.float32)
+        mono = frames @ self.weights if self.in_channels > 1 else frames[:, 0]
+        if self.resampler is not None:
+            mono = self.resampler.process(mono)
+        out = np.clip(mono, -32768, 32767).astype(np.int16).tobytes()
+        self.bytes_out += len(out)
+        return out
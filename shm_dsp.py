@@ -0,0 +1,309 @@
+"""
+Process pool for AudioProcessor work that moves PCM through shared memory.
+
+Each worker process owns one multiprocessing.shared_memory segment divided
+into fixed-size slots. The ingest process copies a chunk into a free slot
+and sends only (request, key, slot, length) over a pipe; the worker
+processes the slot in place, writes the output back into it and replies
+with the output length and the CPU time it spent. Results are memoryviews
+of the slot, which stays reserved for `hold` further results of the same
+channel (the same contract as PCMScratch output).
+
+Channels are placed on the worker with the least measured DSP load, so
+busy channels spread across cores. SharedMemoryDSPPool can be passed to
+AudioProcessor wherever a DSPExecutor is accepted.
+"""
+
+import asyncio
+import collections
+import itertools
+import multiprocessing
+import os
+import time
+from multiprocessing import shared_memory
+from dsp_executor import map_ordered
+
+# Segments that could not be closed at shutdown because result views were still alive
+_unclosed = []
+
+
+def _attach(name):
+    try:
+        return shared_memory.SharedMemory(name=name, track=False)
+    except TypeError:
+        # Python < 3.13 has no track argument
+        return shared_memory.SharedMemory(name=name)
+
+
+def _worker_main(shm_name, slot_size, conn):
+    """Worker process: serve chunk/flush/release requests for the channels placed on it"""
+    from audio_processor import AudioProcessor
+
+    shm = _attach(shm_name)
+    buf = shm.buf
+    processors = {}
+    try:
+        while True:
+            message = conn.recv()
+            op = message[0]
+            if op == 'stop':
+                break
+            if op == 'release':
+                processor = processors.pop(message[1], None)
+                if processor is not None:
+                    processor.cleanup()
+                continue
+
+            _, request_id, key, slot, length, sample_rate, streaming = message
+            processor = processors.get(key)
+            if processor is None:
+                processor = processors[key] = AudioProcessor(sample_rate=sample_rate,
+                                                             streaming=streaming)
+            started = time.process_time()
+            offset = slot * slot_size
+            try:
+                if op == 'chunk':
+                    result = processor.process_chunk_sync(buf[offset:offset + length])
+                else:
+                    result = processor.flush()
+                if result is None or not len(result):
+                    out_length = -1
+                else:
+                    out_length = len(result)
+                    if out_length > slot_size:
+                        raise ValueError(f"Output of {out_length} bytes exceeds slot size {slot_size}")
+                    buf[offset:offset + out_length] = result
+                conn.send((request_id, out_length, time.process_time() - started, None))
+            except Exception as e:
+                conn.send((request_id, -1, time.process_time() - started, str(e)))
+    except (EOFError, KeyboardInterrupt):
+        pass
+    finally:
+        del buf
+        shm.close()
+
+
+class _Worker:
+    """Parent-side state of one worker process"""
+
+    def __init__(self, index, slots, slot_size, context):
+        self.index = index
+        self.slot_size = slot_size
+        self.shm = shared_memory.SharedMemory(create=True, size=slots * slot_size)
+        self.conn, child_conn = context.Pipe()
+        self.process = context.Process(target=_worker_main, name=f"shm-dsp-{index}",
+                                       args=(self.shm.name, slot_size, child_conn), daemon=True)
+        self.process.start()
+        child_conn.close()
+        self.free_slots = collections.deque(range(slots))
+        self.backlog = collections.deque()    # requests waiting for a free slot
+        self.pending = {}                     # request id -> (future, key, slot)
+        self.keys = set()
+        self.cpu_seconds = 0.0
+        self.requests = 0
+        self.reader_installed = False
+
+
+class SharedMemoryDSPPool:
+    """
+    AudioProcessor executor backed by worker processes and shared-memory
+    slots instead of pickled chunks.
+    """
+
+    def __init__(self, workers=None, slots_per_worker=64, slot_size=65536, max_in_flight=4,
+                 hold=2, load_decay=0.9):
+        """
+        Args:
+            workers: number of worker processes (defaults to the CPU count)
+            slots_per_worker: shared-memory slots per worker
+            slot_size: bytes per slot; must fit the largest processor output
+                       (the first output after the noise profile is ~1s + chunk)
+            max_in_flight: chunks per channel submitted ahead of the consumer
+            hold: delivered results per channel kept valid after the next one
+            load_decay: smoothing of the per-channel CPU load estimate
+        """
+        self.mode = 'shm'
+        self.max_workers = workers or os.cpu_count() or 1
+        self.slots_per_worker = slots_per_worker
+        self.slot_size = slot_size
+        self.max_in_flight = max(1, max_in_flight)
+        self.hold = max_in_flight + hold
+        self.load_decay = load_decay
+        self._context = multiprocessing.get_context()
+        self._workers = [_Worker(i, slots_per_worker, slot_size, self._context)
+                         for i in range(self.max_workers)]
+        self._worker_of = {}
+        self._key_load = {}                  # key -> CPU seconds per request (smoothed)
+        self._held = {}                      # key -> deque of slots backing delivered results
+        self._keys = itertools.count()
+        self._requests = itertools.count()
+        self.bytes_copied = 0
+
+    # Placement
+
+    def _worker_load(self, worker):
+        default = self._average_key_load()
+        return sum(self._key_load.get(k, default) for k in worker.keys)
+
+    def _average_key_load(self):
+        loads = self._key_load.values()
+        return sum(loads) / len(loads) if loads else 1.0
+
+    def new_key(self):
+        """Allocate a channel key on the worker with the least measured load"""
+        key = next(self._keys)
+        worker = min(self._workers, key=lambda w: (self._worker_load(w), len(w.keys)))
+        worker.keys.add(key)
+        self._worker_of[key] = worker
+        self._held[key] = collections.deque()
+        return key
+
+    def placement(self):
+        """Channel keys per worker index"""
+        return {w.index: sorted(w.keys) for w in self._workers}
+
+    # Requests
+
+    def submit_chunk(self, processor, chunk):
+        return self._submit('chunk', processor, chunk)
+
+    def submit_flush(self, processor):
+        return self._submit('flush', processor, None)
+
+    def _submit(self, op, processor, chunk):
+        loop = asyncio.get_running_loop()
+        key = processor.executor_key
+        worker = self._worker_of[key]
+        if chunk is not None and len(chunk) > self.slot_size:
+            raise ValueError(f"Chunk of {len(chunk)} bytes exceeds slot size {self.slot_size}")
+        if not worker.reader_installed:
+            loop.add_reader(worker.conn.fileno(), self._on_readable, worker)
+            worker.reader_installed = True
+        future = loop.create_future()
+        request = (op, key, processor.sample_rate, processor.streaming, chunk, future)
+        if worker.free_slots:
+            self._dispatch(worker, request)
+        else:
+            # Copy now: the caller's chunk (a ring view) may be reused before a slot frees up
+            worker.backlog.append(request[:4] + (bytes(chunk) if chunk is not None else None, future))
+        return future
+
+    def _dispatch(self, worker, request):
+        op, key, sample_rate, streaming, chunk, future = request
+        slot = worker.free_slots.popleft()
+        length = 0
+        if chunk is not None:
+            length = len(chunk)
+            offset = slot * self.slot_size
+            worker.shm.buf[offset:offset + length] = chunk
+            self.bytes_copied += length
+        request_id = next(self._requests)
+        worker.pending[request_id] = (future, key, slot)
+        worker.conn.send((op, request_id, key, slot, length, sample_rate, streaming))
+
+    def _on_readable(self, worker):
+        while worker.conn.poll():
+            try:
+                request_id, length, cpu_seconds, error = worker.conn.recv()
+            except EOFError:
+                self._fail_worker(worker)
+                return
+            future, key, slot = worker.pending.pop(request_id)
+            worker.cpu_seconds += cpu_seconds
+            worker.requests += 1
+            if key in self._worker_of:
+                previous = self._key_load.get(key)
+                self._key_load[key] = cpu_seconds if previous is None else (
+                    self.load_decay * previous + (1 - self.load_decay) * cpu_seconds)
+
+            if error is not None or length < 0 or future.cancelled():
+                self._free_slot(worker, slot)
+                if error is not None and not future.cancelled():
+                    future.set_exception(RuntimeError(f"DSP worker {worker.index}: {error}"))
+                elif not future.cancelled():
+                    future.set_result(None)
+                continue
+
+            held = self._held.get(key)
+            if held is None:
+                self._free_slot(worker, slot)   # Channel already released
+                future.set_result(None)
+                continue
+            held.append(slot)
+            if len(held) > self.hold:
+                self._free_slot(worker, held.popleft())
+            offset = slot * self.slot_size
+            future.set_result(worker.shm.buf[offset:offset + length])
+
+    def _free_slot(self, worker, slot):
+        worker.free_slots.append(slot)
+        while worker.backlog and worker.free_slots:
+            request = worker.backlog.popleft()
+            if not request[-1].cancelled():
+                self._dispatch(worker, request)
+
+    def _fail_worker(self, worker):
+        print(f"DSP worker {worker.index} exited")
+        self._remove_reader(worker)
+        for future, _, _ in worker.pending.values():
+            if not future.done():
+                future.set_exception(RuntimeError(f"DSP worker {worker.index} exited"))
+        worker.pending.clear()
+
+    def _remove_reader(self, worker):
+        if worker.reader_installed:
+            try:
+                asyncio.get_running_loop().remove_reader(worker.conn.fileno())
+            except (RuntimeError, ValueError, OSError):
+                pass
+            worker.reader_installed = False
+
+    def map_ordered(self, submit, items):
+        """Submit each item and yield results in order, max_in_flight outstanding"""
+        return map_ordered(submit, items, self.max_in_flight)
+
+    def release(self, processor):
+        """Drop a channel and its worker-side processor"""
+        key = processor.executor_key
+        worker = self._worker_of.pop(key, None)
+        if worker is None:
+            return
+        worker.keys.discard(key)
+        self._key_load.pop(key, None)
+        for slot in self._held.pop(key, ()):
+            self._free_slot(worker, slot)
+        try:
+            worker.conn.send(('release', key))
+        except (BrokenPipeError, OSError):
+            pass
+
+    def stats(self):
+        return [{
+            'worker': w.index,
+            'channels': len(w.keys),
+            'requests': w.requests,
+            'cpu_seconds': w.cpu_seconds,
+            'free_slots': len(w.free_slots),
+        } for w in self._workers]
+
+    def shutdown(self, wait=True):
+        """Stop the workers and unlink the shared memory"""
+        for worker in self._workers:
+            self._remove_reader(worker)
+            try:
+                worker.conn.send(('stop',))
+            except (BrokenPipeError, OSError):
+                pass
+        for worker in self._workers:
+            if wait:
+                worker.process.join(timeout=5)
+            if worker.process.is_alive():
+                worker.process.terminate()
+            worker.conn.close()
+            worker.shm.unlink()
+            try:
+                worker.shm.close()
+            except BufferError:
+                # A caller still holds a result view; keep the mapping until exit
+                _unclosed.append(worker.shm)
+        self._workers = []
@@ -4,12 +4,14 @@ import asyncio
 # It's not a dependency of the project but can be installed
 # with `pip install aiofile`.
 import aiofile
-import datetime
 
 from amazon_transcribe.client import TranscribeStreamingClient
 from amazon_transcribe.handlers import TranscriptResultStreamHandler
 from amazon_transcribe.model import TranscriptEvent, TranscriptResultStream
-from amazon_transcribe.utils import apply_realtime_delay
+from caption_segmenter import CaptionSegmenter
+from pacer import Pacer
+from resampler import PCMConverter
+from subtitle_sink import SubtitleSink, format_timestamp
 
 """
 Here's an example of a custom event handler you can extend to
@@ -20,6 +22,8 @@ handler will simply print the text out to your interpreter.
 SAMPLE_RATE = 44100 #16000
 BYTES_PER_SAMPLE = 2
 CHANNEL_NUMS = 1
+# Audio is resampled in process and sent at 16 kHz (~2.75x fewer bytes than 44.1 kHz)
+TRANSCRIBE_SAMPLE_RATE = 16000
 
 # An example file can be found at tests/integration/assets/原版-带噪音-中文-男声.wav
 AUDIO_PATH = "/Users/yexw/PycharmProjects/awsgists/stream_caption/right_test.wav"
@@ -28,82 +32,38 @@ REGION = "us-west-2"
 SRT_PATH = "match_test.srt"
 
 
-def convert_to_srt_time(seconds):
-    """
-    将秒数转换为 SRT 时间格式 (HH:MM:SS,MS)
-    """
-    dt = datetime.datetime(1900, 1, 1) + datetime.timedelta(seconds=seconds)
-    ms = dt.microsecond // 1000
-    return f"{dt.hour:02d}:{dt.minute:02d}:{dt.second:02d},{ms:03d}"
-
 """
 ffmpeg -i 原版-带噪音-中文-男声.wav -af "highpass=f=200" -f wav - | sox -t wav - -t wav output_voice.wav noisered
 """
-def write_srt(filename, text):
-    """
-    将字幕内容追加到 SRT 文件的末尾。
-    :param filename: SRT 文件的路径和文件名
-    :param text: 要写入的字幕文本
-    """
-    try:
-        with open(filename, 'a', encoding='utf-8') as f:
-            f.write(text + '\n')
-    except Exception as e:
-        print(f"Error writing to SRT file: {e}")
 
 
 class MyEventHandler(TranscriptResultStreamHandler):
-    def __init__(self, transcript_result_stream: TranscriptResultStream):
+    def __init__(self, transcript_result_stream: TranscriptResultStream, segmenter=None, sink=None):
         super(MyEventHandler, self).__init__(transcript_result_stream)
-        self.previous_sentence = ''
-        self.cc_fragments = []
-        self.current_sentence_length = 0
-        self.previous_time_range = None
-
-    def calculate_start_to_end(self, items):
-        start = None;
-        end = None;
-        for item in items:
-            c_start = item.start_time
-            c_end = item.end_time
-
-            if start is None:
-                start = c_start
-
-            if end is None:
-                end = c_end
-
-            if c_end > end:
-                end = c_end
-
-        return {
-            "s": start,
-            "e": end
-        }
+        # Cues are cut from stable partial results instead of waiting for
+        # the next utterance to start
+        self.segmenter = segmenter or CaptionSegmenter(max_latency=1.5, max_chars=42)
+        # SRT and WebVTT from the same cue stream, written off the event loop
+        self.sink = sink or SubtitleSink(SRT_PATH, formats=('srt', 'vtt'))
+
+    async def handle_events(self):
+        try:
+            await super(MyEventHandler, self).handle_events()
+            # Emit the last sentence even if the stream ended before it was final
+            for cue in self.segmenter.flush():
+                self.write_cue(cue)
+        finally:
+            await self.sink.close()
+
+    def write_cue(self, cue):
+        print(f"{format_timestamp(cue.start)} --> {format_timestamp(cue.end)} {cue.text}")
+        self.sink.write(cue)
 
     async def handle_transcript_event(self, transcript_event: TranscriptEvent):
-        # This handler can be implemented to handle transcriptions as needed.
-        # Here's an example to get started.
         results = transcript_event.transcript.results
-        # print(results)
         for result in results:
-            for alt in result.alternatives:
-                # print(alt.transcript)
-                time_range = self.calculate_start_to_end(alt.items)
-                # print(f"time range ---> {time_range}")
-                current_sentence = alt.transcript
-                current_sentence_length = len(current_sentence)
-                # print(len(alt.items))
-                previous_sentence_length = len(self.previous_sentence)
-                if current_sentence_length < previous_sentence_length:
-                    print(f"{self.previous_time_range}---{self.previous_sentence}")
-                    write_srt(SRT_PATH,
-                              f"{convert_to_srt_time(self.previous_time_range['s'])} --> {convert_to_srt_time(self.previous_time_range['e'])}")
-                    write_srt(SRT_PATH, f"{self.previous_sentence}")
-                    write_srt(SRT_PATH, "\n\n")
-
-                self.previous_sentence = current_sentence
-                self.previous_time_range = time_range
+            for cue in self.segmenter.feed(result):
+                self.write_cue(cue)
 
 
 async def basic_transcribe():
@@ -113,19 +73,27 @@ async def basic_transcribe():
     # Start transcription to generate our async stream
     stream = await client.start_stream_transcription(
         language_code="zh-CN",  # ar-SA
-        media_sample_rate_hz=SAMPLE_RATE,
+        media_sample_rate_hz=TRANSCRIBE_SAMPLE_RATE,
         media_encoding="pcm",
+        enable_partial_results_stabilization=True,
+        partial_results_stability="high",
     )
 
     async def write_chunks():
         # NOTE: For pre-recorded files longer than 5 minutes, the sent audio
         # chunks should be rate limited to match the realtime bitrate of the
         # audio stream to avoid signing issues.
+        converter = PCMConverter(SAMPLE_RATE, CHANNEL_NUMS, out_rate=TRANSCRIBE_SAMPLE_RATE)
+        pacer = Pacer(mode="file", bytes_per_second=SAMPLE_RATE * BYTES_PER_SAMPLE * CHANNEL_NUMS)
         async with aiofile.AIOFile(AUDIO_PATH, "rb") as afp:
             reader = aiofile.Reader(afp, chunk_size=CHUNK_SIZE)
-            await apply_realtime_delay(
-                stream, reader, BYTES_PER_SAMPLE, SAMPLE_RATE, CHANNEL_NUMS
-            )
+            async for chunk in reader:
+                converted = converter.process(chunk)
+                if converted:
+                    await stream.input_stream.send_audio_event(audio_chunk=converted)
+                # Paced on the source bytes, i.e. in real time
+                await pacer.pace(len(chunk))
+        print(f"Sent {converter.bytes_out} bytes for {converter.bytes_in} source bytes")
         await stream.input_stream.end_stream()
 
     # Instantiate our handler and start processing events
@@ -133,6 +101,7 @@ async def basic_transcribe():
     await asyncio.gather(write_chunks(), handler.handle_events())
 
 
-loop = asyncio.get_event_loop()
-loop.run_until_complete(basic_transcribe())
-loop.close()
+if __name__ == "__main__":
+    loop = asyncio.get_event_loop()
+    loop.run_until_complete(basic_transcribe())
+    loop.close()
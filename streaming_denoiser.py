@@ -0,0 +1,116 @@
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+
+
+class StreamingDenoiser:
+    """
+    Streaming spectral-gating noise reduction.
+
+    The noise threshold is computed once from the noise sample. Audio is
+    analysed in overlapping STFT frames and resynthesised with weighted
+    overlap-add; the unfinished frame tail is carried across `process`
+    calls, so chunk boundaries are filtered with full context and the output
+    lags the input by a fixed `latency_samples` (n_fft - hop_length).
+    """
+
+    def __init__(self, noise_sample, sample_rate=16000, n_fft=1024, hop_length=256,
+                 prop_decrease=0.75, n_std_thresh=1.5, freq_smooth_hz=100,
+                 time_smooth_ms=50):
+        if n_fft % hop_length:
+            raise ValueError("n_fft must be a multiple of hop_length")
+
+        self.sample_rate = sample_rate
+        self.n_fft = n_fft
+        self.hop_length = hop_length
+        self.prop_decrease = prop_decrease
+        self.latency_samples = n_fft - hop_length
+
+        # sqrt-Hann analysis and synthesis windows: their product is a
+        # periodic Hann window, which sums to a constant at this overlap
+        self._window = np.sqrt(np.hanning(n_fft + 1)[:-1]).astype(np.float32)
+        self._ola_scale = np.float32(hop_length / np.sum(self._window ** 2))
+
+        # Mask smoothing across neighbouring bins and (causally) across frames
+        bin_hz = sample_rate / n_fft
+        self._freq_smooth_bins = max(1, int(freq_smooth_hz / bin_hz)) | 1
+        self._time_smooth_coef = float(
+            np.exp(-hop_length / (sample_rate * time_smooth_ms / 1000.0))
+        ) if time_smooth_ms > 0 else 0.0
+
+        self._threshold_db = self._compute_noise_threshold(noise_sample, n_std_thresh)
+        self.reset()
+
+    def reset(self):
+        """Drop all carried state; the next call starts a fresh stream"""
+        # Prime the input with zeros so the first real sample gets full overlap
+        self._pending = np.zeros(self.latency_samples, dtype=np.float32)
+        self._ola = np.zeros(self.n_fft, dtype=np.float32)
+        self._prev_mask = np.ones(self.n_fft // 2 + 1, dtype=np.float32)
+
+    def _frames(self, audio):
+        """Windowed analysis frames of `audio` (one per hop)"""
+        return sliding_window_view(audio, self.n_fft)[::self.hop_length] * self._window
+
+    def _compute_noise_threshold(self, noise_sample, n_std_thresh):
+        """Per-bin dB gate threshold: mean + n_std * std of the noise spectrum"""
+        noise = np.asarray(noise_sample, dtype=np.float32)
+        if len(noise) < self.n_fft:
+            noise = np.pad(noise, (0, self.n_fft - len(noise)))
+        spec = np.fft.rfft(self._frames(noise), axis=1)
+        noise_db = 20 * np.log10(np.abs(spec) + 1e-10)
+        return (noise_db.mean(axis=0) + n_std_thresh * noise_db.std(axis=0)).astype(np.float32)
+
+    def _smooth_mask(self, mask):
+        """Box-smooth the mask over frequency, then one-pole smooth over time"""
+        width = self._freq_smooth_bins
+        if width > 1:
+            half = width // 2
+            padded = np.pad(mask, ((0, 0), (half + 1, half)), mode='edge')
+            csum = np.cumsum(padded, axis=1)
+            mask = (csum[:, width:] - csum[:, :-width]) / width
+
+        coef = self._time_smooth_coef
+        if coef:
+            prev = self._prev_mask
+            for i in range(len(mask)):
+                prev = coef * prev + (1.0 - coef) * mask[i]
+                mask[i] = prev
+            self._prev_mask = prev
+        return mask
+
+    def process(self, audio):
+        """
+        Feed float samples in [-1, 1] and return the samples that are now
+        final. Output length is a multiple of hop_length and may be zero.
+        """
+        buf = np.concatenate((self._pending, np.asarray(audio, dtype=np.float32)))
+        n_frames = (len(buf) - self.n_fft) // self.hop_length + 1 if len(buf) >= self.n_fft else 0
+        if n_frames <= 0:
+            self._pending = buf
+            return np.zeros(0, dtype=np.float32)
+
+        hop = self.hop_length
+        spec = np.fft.rfft(self._frames(buf)[:n_frames], axis=1)
+        spec_db = 20 * np.log10(np.abs(spec) + 1e-10)
+        mask = self._smooth_mask((spec_db > self._threshold_db).astype(np.float32))
+        gain = 1.0 - self.prop_decrease * (1.0 - mask)
+        frames = np.fft.irfft(spec * gain, n=self.n_fft, axis=1).astype(np.float32) * self._window
+
+        out = np.empty(n_frames * hop, dtype=np.float32)
+        ola = self._ola
+        for i in range(n_frames):
+            ola += frames[i]
+            out[i * hop:(i + 1) * hop] = ola[:hop]
+            ola[:-hop] = ola[hop:]
+            ola[-hop:] = 0.0
+        out *= self._ola_scale
+
+        self._pending = buf[n_frames * hop:]
+        return out
+
+    def flush(self):
+        """Return the samples still held back by the algorithmic latency"""
+        remaining = len(self._pending)
+        tail = self.process(np.zeros(self.latency_samples + self.hop_length, dtype=np.float32))
+        self.reset()
+        return tail[:remaining]
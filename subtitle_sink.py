@@ -0,0 +1,253 @@
+import asyncio
+import concurrent.futures
+import os
+import time
+from xml.sax.saxutils import escape
+
+
+def format_timestamp(seconds, separator=','):
+    """
+    Format seconds as HH:MM:SS,mmm (SRT) or HH:MM:SS.mmm (WebVTT, separator='.').
+    Integer arithmetic only; hours are not wrapped at 24.
+    """
+    ms = int(round((seconds or 0) * 1000))
+    hours, ms = divmod(ms, 3600000)
+    minutes, ms = divmod(ms, 60000)
+    secs, ms = divmod(ms, 1000)
+    return f"{hours:02d}:{minutes:02d}:{secs:02d}{separator}{ms:03d}"
+
+
+class SRTFormat:
+    extension = 'srt'
+    header = ''
+    footer = ''
+
+    def cue(self, index, cue):
+        return (f"{index}\n{format_timestamp(cue.start)} --> {format_timestamp(cue.end)}\n"
+                f"{cue.text}\n\n")
+
+
+class WebVTTFormat:
+    extension = 'vtt'
+    header = 'WEBVTT\n\n'
+    footer = ''
+
+    def cue(self, index, cue):
+        return (f"{index}\n{format_timestamp(cue.start, '.')} --> {format_timestamp(cue.end, '.')}\n"
+                f"{cue.text}\n\n")
+
+
+class TTMLFormat:
+    extension = 'ttml'
+    header = ('<?xml version="1.0" encoding="UTF-8"?>\n'
+              '<tt xmlns="http://www.w3.org/ns/ttml"><body><div>\n')
+    footer = '</div></body></tt>\n'
+
+    def cue(self, index, cue):
+        return (f'<p xml:id="c{index}" begin="{format_timestamp(cue.start, ".")}" '
+                f'end="{format_timestamp(cue.end, ".")}">{escape(cue.text)}</p>\n')
+
+
+FORMATS = {
+    'srt': SRTFormat,
+    'vtt': WebVTTFormat,
+    'webvtt': WebVTTFormat,
+    'ttml': TTMLFormat,
+}
+
+
+class _FormatFile:
+    """Write state of one output format"""
+
+    def __init__(self, base_path, fmt):
+        self.fmt = fmt
+        self.path = f"{base_path}.{fmt.extension}"
+        self.base_path = base_path
+        self.buffer = []
+        self.index = 0          # cue number within the current file
+        self.file = None
+
+
+class SubtitleSink:
+    """
+    Buffered subtitle writer fed by one cue stream, producing SRT, WebVTT
+    and/or TTML files.
+
+    Formatted cues collect in an in-memory buffer and are written by a
+    dedicated writer thread once `flush_every` cues are pending or
+    `flush_interval` seconds have passed, optionally followed by fsync.
+    With `rotate_seconds` the live file is closed (TTML footer written) and
+    atomically renamed to `<base>.<n>.<ext>` every `rotate_seconds` of cue
+    time, and a new live file is started.
+    """
+
+    def __init__(self, base_path, formats=('srt',), flush_every=16, flush_interval=0.5,
+                 fsync=False, rotate_seconds=None):
+        """
+        Args:
+            base_path: output path without extension (an extension matching a
+                       format, e.g. "match_test.srt", is stripped)
+            formats: any of 'srt', 'vtt', 'ttml'
+            flush_every: flush once this many cues are buffered
+            flush_interval: flush buffered cues at most this many seconds late
+            fsync: fsync after every flush
+            rotate_seconds: rotate output files every N seconds of cue time
+        """
+        root, ext = os.path.splitext(base_path)
+        if ext[1:].lower() in FORMATS:
+            base_path = root
+        self.base_path = base_path
+        self.files = [_FormatFile(base_path, FORMATS[f.lower()]()) for f in formats]
+        self.flush_every = flush_every
+        self.flush_interval = flush_interval
+        self.fsync = fsync
+        self.rotate_seconds = rotate_seconds
+        self.segment = 0
+        self.cues_written = 0
+        self._pending = 0
+        self._last_flush = time.monotonic()
+        self._flush_handle = None
+        self._last_future = None
+        self._writer = concurrent.futures.ThreadPoolExecutor(
+            max_workers=1, thread_name_prefix="subtitle-sink"
+        )
+
+    def write(self, cue):
+        """Queue one cue; never blocks on file I/O when called from the event loop"""
+        if self.rotate_seconds and cue.start is not None:
+            segment = int(cue.start // self.rotate_seconds)
+            if segment > self.segment:
+                self._submit(self._take_buffers(), rotate_segment=self.segment)
+                self.segment = segment
+                for f in self.files:
+                    f.index = 0
+
+        for f in self.files:
+            f.index += 1
+            f.buffer.append(f.fmt.cue(f.index, cue))
+        self.cues_written += 1
+        self._pending += 1
+
+        if self._pending >= self.flush_every or time.monotonic() - self._last_flush >= self.flush_interval:
+            self.flush_nowait()
+        elif self._flush_handle is None:
+            self._schedule_timer()
+
+    def _schedule_timer(self):
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            return  # Synchronous use: flushed by count or on close
+        self._flush_handle = loop.call_later(self.flush_interval, self.flush_nowait)
+
+    def _take_buffers(self):
+        """Detach buffered text per format (index-aligned with self.files)"""
+        chunks = []
+        for f in self.files:
+            chunks.append(''.join(f.buffer))
+            f.buffer = []
+        self._pending = 0
+        return chunks
+
+    def _submit(self, chunks, rotate_segment=None, close=False):
+        self._last_future = self._writer.submit(self._write_sync, chunks, rotate_segment, close)
+        return self._last_future
+
+    def flush_nowait(self):
+        """Hand buffered cues to the writer thread"""
+        if self._flush_handle is not None:
+            self._flush_handle.cancel()
+            self._flush_handle = None
+        self._last_flush = time.monotonic()
+        if self._pending:
+            return self._submit(self._take_buffers())
+        return self._last_future
+
+    async def flush(self):
+        """Flush buffered cues and wait until they are on disk"""
+        future = self.flush_nowait()
+        if future is not None:
+            await asyncio.wrap_future(future)
+
+    async def close(self):
+        """Flush, finalize files and stop the writer thread"""
+        if self._flush_handle is not None:
+            self._flush_handle.cancel()
+            self._flush_handle = None
+        await asyncio.wrap_future(self._submit(self._take_buffers(), close=True))
+        self._writer.shutdown(wait=True)
+
+    def close_sync(self):
+        """close() for code without a running event loop"""
+        self._submit(self._take_buffers(), close=True).result()
+        self._writer.shutdown(wait=True)
+
+    # Writer thread
+
+    def _open(self, f):
+        f.file = open(f.path, 'w', encoding='utf-8')
+        f.file.write(f.fmt.header)
+
+    def _finish(self, f):
+        """Write the footer and make the live file durable"""
+        if f.file is None:
+            return
+        f.file.write(f.fmt.footer)
+        f.file.flush()
+        os.fsync(f.file.fileno())
+        f.file.close()
+        f.file = None
+
+    def _write_sync(self, chunks, rotate_segment, close):
+        try:
+            for f, text in zip(self.files, chunks):
+                if text:
+                    if f.file is None:
+                        self._open(f)
+                    f.file.write(text)
+                    f.file.flush()
+                    if self.fsync:
+                        os.fsync(f.file.fileno())
+
+            if rotate_segment is not None:
+                for f in self.files:
+                    if f.file is None:
+                        continue
+                    self._finish(f)
+                    # Atomic rename: readers see either the old live file or the complete segment
+                    os.replace(f.path, f"{f.base_path}.{rotate_segment:04d}.{f.fmt.extension}")
+
+            if close:
+                for f in self.files:
+                    self._finish(f)
+        except Exception as e:
+            print(f"Error writing subtitles: {e}")
+
+
+class SinkGroup:
+    """Caption sink writing every cue to several sinks (e.g. files and a CaptionStore)"""
+
+    def __init__(self, *sinks):
+        self.sinks = [s for s in sinks if s is not None]
+
+    def write(self, cue):
+        for sink in self.sinks:
+            sink.write(cue)
+
+    def end_session(self, t):
+        for sink in self.sinks:
+            mark_session_end(sink, t)
+
+    async def close(self):
+        for sink in self.sinks:
+            await sink.close()
+
+
+def mark_session_end(sink, t):
+    """
+    Tell a caption sink the session time its audio ended at, for sinks that
+    continue a timeline across sessions (CaptionStore's end_session)
+    """
+    end_session = getattr(sink, 'end_session', None)
+    if end_session is not None:
+        end_session(t)
@@ -1,9 +1,16 @@
 import asyncio
 import argparse
 import signal
-from transcribe_audio import transcribe_network_stream
+from transcribe_audio import transcribe_network_stream, prewarm
+from language_fanout import transcribe_fanout
 from ts_player import TSPlayer
 from mic_input import MicrophoneInput
+from dsp_executor import create_executor
+from vad import VoiceActivityGate
+from channel_supervisor import ChannelSupervisor
+from metrics import start_metrics_server
+from capture import CaptureWriter
+from pipeline import Pipeline, TSSource, MicSource, ConvertStage, TranscribeStage, build_stages
 
 class StreamManager:
     def __init__(self):
@@ -23,14 +30,24 @@ class StreamManager:
         if self.current_task:
             self.current_task.cancel()
 
-async def transcribe_from_ts(url, manager):
-    """Transcribe from TS stream"""
+async def transcribe_from_ts(url, manager, executor=None, pacing='live', vad=None, languages=('zh-CN',),
+                             input_rate=None, input_channels=None, latency_budget=None, max_outage=30.0,
+                             capture=None, chunk_latency=None, channel=None):
+    """Transcribe from TS stream, in parallel sessions when several languages are given"""
     player = None
     try:
         print("Starting transcription from TS stream...")
-        player = TSPlayer(url)
+        player = TSPlayer(url, executor=executor, input_rate=input_rate, input_channels=input_channels,
+                          latency_budget=latency_budget, max_outage=max_outage, capture=capture,
+                          channel=channel)
         manager.current_task = asyncio.current_task()
-        await transcribe_network_stream(player.get_audio_stream())
+        if len(languages) > 1:
+            await transcribe_fanout(player.get_audio_stream(), languages, pacing=pacing, vad=vad,
+                                    timeline=player.timeline, channel=channel)
+        else:
+            await transcribe_network_stream(player.get_audio_stream(), pacing=pacing, vad=vad,
+                                            language_code=languages[0], timeline=player.timeline,
+                                            capture=capture, chunk_latency=chunk_latency, channel=channel)
     except asyncio.CancelledError:
         print("TS stream transcription cancelled")
     except Exception as e:
@@ -42,14 +59,19 @@ async def transcribe_from_ts(url, manager):
             except Exception as e:
                 print(f"Error closing TS player: {str(e)}")
 
-async def transcribe_from_mic(manager):
+async def transcribe_from_mic(manager, vad=None, languages=('zh-CN',), capture=None, chunk_latency=None,
+                              channel='mic'):
     """Transcribe from microphone input"""
     mic = None
     try:
         print("Starting transcription from microphone...")
         mic = MicrophoneInput()
         manager.current_task = asyncio.current_task()
-        await transcribe_network_stream(mic.get_audio_stream())
+        if len(languages) > 1:
+            await transcribe_fanout(mic.get_audio_stream(), languages, vad=vad, channel=channel)
+        else:
+            await transcribe_network_stream(mic.get_audio_stream(), vad=vad, language_code=languages[0],
+                                            capture=capture, chunk_latency=chunk_latency, channel=channel)
     except asyncio.CancelledError:
         print("Microphone transcription cancelled")
     except Exception as e:
@@ -61,6 +83,31 @@ async def transcribe_from_mic(manager):
             except Exception as e:
                 print(f"Error closing microphone: {str(e)}")
 
+async def transcribe_with_stages(args, manager, language_code, capture=None, channel=None):
+    """Transcribe through a pipeline.Pipeline built from --stages (one language)"""
+    pipeline = None
+    try:
+        stages = build_stages(args.stages, args.input_rate, args.input_channels)
+        if args.source == 'ts':
+            # Without a convert stage the player converts to 16 kHz mono itself
+            convert = not any(isinstance(stage, ConvertStage) for stage in stages)
+            source = TSSource(args.url, input_rate=args.input_rate, input_channels=args.input_channels,
+                              convert=convert, max_outage=args.max_outage, capture=capture, channel=channel)
+        else:
+            source = MicSource()
+        stages.append(TranscribeStage(language_code, pacing=args.pacing, capture=capture,
+                                      channel=channel, chunk_latency=args.chunk_latency))
+        pipeline = Pipeline(source, stages, name=language_code)
+        manager.current_task = asyncio.current_task()
+        await pipeline.run()
+    except asyncio.CancelledError:
+        print("Pipeline transcription cancelled")
+    except Exception as e:
+        print(f"Error in pipeline transcription: {str(e)}")
+    finally:
+        if pipeline is not None:
+            print(pipeline.report())
+
 async def cleanup(manager):
     """Cleanup function to handle graceful shutdown"""
     if manager.current_task and not manager.current_task.done():
@@ -77,19 +124,82 @@ async def main():
                        help='Audio source: "ts" for TS stream or "mic" for microphone input')
     parser.add_argument('--url', default='http://example.com/stream.ts',
                        help='URL of the TS stream (only used if source is "ts")')
+    parser.add_argument('--pacing', choices=['live', 'file', 'burst'], default='live',
+                       help='Send pacing for TS sources: "file" for recorded streams read faster than real time')
+    parser.add_argument('--vad', choices=['off', 'suppress', 'compress'], default='off',
+                       help='Gate non-speech before sending: drop it or shorten silent runs')
+    parser.add_argument('--dsp', choices=['inline', 'thread', 'process', 'shm'], default='inline',
+                       help='Where to run noise reduction: on the event loop, a thread, a worker process '
+                            'or shared-memory worker processes')
+    parser.add_argument('--dsp-workers', type=int, default=None,
+                       help='Number of DSP worker lanes (defaults to CPU count)')
+    parser.add_argument('--languages', default='zh-CN',
+                       help='Comma separated Transcribe language codes; more than one captions '
+                            'the same decoded audio in parallel sessions')
+    parser.add_argument('--input-rate', type=int, default=None,
+                       help='Decode TS audio at this rate and resample to 16 kHz in process')
+    parser.add_argument('--input-channels', type=int, default=None,
+                       help='Decode TS audio with this many channels (6 for 5.1) and downmix in process')
+    parser.add_argument('--metrics-port', type=int, default=None,
+                       help='Serve per-stage Prometheus metrics on this port')
+    parser.add_argument('--latency-budget', type=float, default=None,
+                       help='Seconds of delay a live TS source may build up before it degrades')
+    parser.add_argument('--max-outage', type=float, default=30.0,
+                       help='Seconds a lost network TS source is reconnected and bridged before giving up')
+    parser.add_argument('--chunk-latency', type=float, default=None,
+                       help='Seconds audio may wait to be sent; audio event size then adapts to the send cost')
+    parser.add_argument('--capture', default=None,
+                       help='Record the sent audio and transcript events to this file (see capture.py)')
+    parser.add_argument('--stages', default=None,
+                       help='Run source -> stages -> Transcribe as a pipeline, e.g. "denoise@thread,vad" '
+                            '(see pipeline.py); --dsp, --vad and --latency-budget do not apply')
+    parser.add_argument('--config', default=None,
+                       help='JSON channel configuration; runs all channels under a ChannelSupervisor')
     
     args = parser.parse_args()
+    if args.config:
+        supervisor = ChannelSupervisor.from_config(args.config)
+        supervisor.install_signal_handlers()
+        await supervisor.run()
+        return
+
+    # One name for the source and its sessions, in metrics and for the client
+    channel = args.url if args.source == 'ts' else 'mic'
+    # Credentials and the Transcribe connection are set up while the rest starts
+    warm = asyncio.create_task(prewarm(channel=channel))
+    metrics_runner = await start_metrics_server(args.metrics_port) if args.metrics_port else None
     manager = StreamManager()
+    executor = create_executor(args.dsp, args.dsp_workers)
+    vad = VoiceActivityGate(mode=args.vad) if args.vad != 'off' else None
+    languages = [code.strip() for code in args.languages.split(',') if code.strip()]
+    capture = None
+    if args.capture:
+        if len(languages) > 1:
+            print("--capture records a single-language session; ignored for several languages")
+        else:
+            capture = CaptureWriter(args.capture, language_code=languages[0], source=channel)
     
     try:
-        if args.source == 'ts':
-            await transcribe_from_ts(args.url, manager)
+        if args.stages:
+            await transcribe_with_stages(args, manager, languages[0], capture, channel)
+        elif args.source == 'ts':
+            await transcribe_from_ts(args.url, manager, executor, args.pacing, vad, languages,
+                                     args.input_rate, args.input_channels, args.latency_budget, args.max_outage,
+                                     capture, args.chunk_latency, channel)
         else:
-            await transcribe_from_mic(manager)
+            await transcribe_from_mic(manager, vad, languages, capture, args.chunk_latency, channel)
     except Exception as e:
         print(f"Error in main: {str(e)}")
     finally:
         await cleanup(manager)
+        warm.cancel()
+        if capture is not None:
+            capture.close()
+            print(f"Capture written to {args.capture}")
+        if executor:
+            executor.shutdown()
+        if metrics_runner is not None:
+            await metrics_runner.cleanup()
 
 def run():
     """Entry point with proper event loop handling"""
@@ -5,13 +5,17 @@ It supports PCM audio files and handles streaming with proper rate limiting for
 """
 
 import asyncio
-import aiofile
-import boto3
+from urllib.parse import urlparse
 from amazon_transcribe.client import TranscribeStreamingClient
+from amazon_transcribe.endpoints import StaticEndpointResolver
 from amazon_transcribe.handlers import TranscriptResultStreamHandler
 from amazon_transcribe.model import TranscriptEvent
-from amazon_transcribe.utils import apply_realtime_delay
+from caption_segmenter import CaptionHandler
 import time
+from metrics import channel_metrics, timed_results
+from pacer import Pacer, ChunkSizer
+from subtitle_sink import mark_session_end
+from vad import remap_result_times
 
 # Audio configuration constants
 SAMPLE_RATE = 16000
@@ -22,6 +26,13 @@ CHUNK_SIZE = 1024 * 4  # Reduced to match mic_input.py
 # AWS and file path configuration
 REGION = "us-west-2"
 AUDIO_PATH = "/stream_caption/chinese.wav"
+CREDENTIALS_TTL = 300.0  # seconds a successful credential check is reused
+
+# Credential check state shared by all sessions of the process
+_credentials_valid_until = 0.0
+_credentials_check = None
+# Clients per endpoint and channel (see get_client)
+_clients = {}
 
 
 class TranscriptionHandler(TranscriptResultStreamHandler):
@@ -29,6 +40,17 @@ class TranscriptionHandler(TranscriptResultStreamHandler):
     Custom handler for processing transcription results from Amazon Transcribe.
     Extends TranscriptResultStreamHandler to process real-time transcription events.
     """
+
+    def __init__(self, transcript_result_stream, timeline=None, timelines=()):
+        """
+        Args:
+            transcript_result_stream: Output stream of the transcription session
+            timeline: Optional vad.TimelineMap; result times are mapped back
+                      to the source timeline when silence was gated out
+            timelines: Further TimelineMaps applied after `timeline`, in order
+        """
+        super().__init__(transcript_result_stream)
+        self.timelines = [t for t in (timeline, *timelines) if t is not None]
     
     async def handle_transcript_event(self, transcript_event: TranscriptEvent):
         """
@@ -39,36 +61,132 @@ class TranscriptionHandler(TranscriptResultStreamHandler):
         """
         results = transcript_event.transcript.results
         for result in results:
+            for timeline in self.timelines:
+                remap_result_times(result, timeline)
             for alt in result.alternatives:
                 print(f"Transcription: {alt.transcript}")
 
 
-async def check_aws_credentials():
-    """Check if AWS credentials are properly configured"""
+def is_local_endpoint(endpoint):
+    """True for ws:// endpoints of the local stand-in (local_transcribe.py)"""
+    return bool(endpoint) and endpoint.startswith(('ws://', 'wss://'))
+
+
+def create_client(endpoint=None):
+    """
+    Transcribe streaming client for REGION, or for an explicit endpoint URL
+    (e.g. a regional or FIPS endpoint) when one is given. A ws:// endpoint
+    gets a client for the local stand-in, which needs no AWS credentials.
+    """
+    if is_local_endpoint(endpoint):
+        from local_transcribe import LocalTranscribeClient
+        return LocalTranscribeClient(endpoint)
+    if endpoint:
+        return TranscribeStreamingClient(region=REGION, endpoint_resolver=StaticEndpointResolver(endpoint))
+    return TranscribeStreamingClient(region=REGION)
+
+
+def get_client(endpoint=None, channel=None):
+    """
+    Client shared by the sessions of one channel (e.g. its languages), so
+    they reuse its credential chain and HTTP/2 connection. Channels get
+    clients of their own: a dropped connection ends only the sessions of
+    the channel it carried.
+    """
+    key = (endpoint, channel)
+    client = _clients.get(key)
+    if client is None:
+        client = _clients[key] = create_client(endpoint)
+    return client
+
+
+def _get_caller_identity():
+    import boto3  # Deferred: importing boto3 costs ~0.15s of startup
+    return boto3.client('sts').get_caller_identity()
+
+
+async def check_aws_credentials(ttl=CREDENTIALS_TTL):
+    """
+    Check if AWS credentials are properly configured.
+    The blocking STS call runs in a thread, concurrent callers share one
+    call and a success is reused for `ttl` seconds.
+    """
+    global _credentials_valid_until, _credentials_check
+    if time.monotonic() < _credentials_valid_until:
+        return True
+    check = _credentials_check
+    if check is None or check.get_loop() is not asyncio.get_running_loop():
+        check = _credentials_check = asyncio.ensure_future(asyncio.to_thread(_get_caller_identity))
     try:
-        boto3.client('sts').get_caller_identity()
+        await asyncio.shield(check)
+        _credentials_valid_until = time.monotonic() + ttl
         return True
     except Exception as e:
         print(f"AWS Credentials Error: {str(e)}")
         print("Please configure AWS credentials with appropriate permissions")
         return False
+    finally:
+        if check.done() and _credentials_check is check:
+            _credentials_check = None
+
+
+async def _open_connection(client):
+    """
+    Resolve credentials and open the client's HTTP/2 connection ahead of its
+    first session. The SDK has no public call for this, so it goes through
+    its internals; returns False, doing nothing, when they are not there.
+    """
+    resolver = getattr(client, '_credential_resolver', None)
+    endpoints = getattr(client, '_endpoint_resolver', None)
+    get_connection = getattr(getattr(client, '_session_manager', None), '_get_connection', None)
+    if resolver is None or endpoints is None or get_connection is None:
+        return False
+    await resolver.get_credentials()
+    url = await endpoints.resolve(client.region)
+    await get_connection(urlparse(url))
+    return True
 
 
-async def transcribe_audio_stream():
+async def prewarm(endpoint=None, channel=None):
+    """
+    Do the first session's setup work ahead of time: the credential check,
+    the channel's client and, for AWS where the SDK allows it, opening its
+    HTTP/2 connection. Run it concurrently with source startup. Failures are
+    only reported; the session will hit them again.
+    """
+    started = time.perf_counter()
+    client = get_client(endpoint, channel)
+    if is_local_endpoint(endpoint):
+        return client
+    if not await check_aws_credentials():
+        return client
+    try:
+        if await _open_connection(client):
+            print(f"Transcribe connection ready in {time.perf_counter() - started:.2f}s")
+    except Exception as e:
+        print(f"Could not pre-warm the Transcribe connection: {e}")
+    return client
+
+
+async def transcribe_audio_stream(vad=None, language_code="ar-SA"):
     """
     Main transcription function that sets up the streaming client and processes audio data.
     Handles both the audio streaming and transcription result processing.
+
+    Args:
+        vad: Optional vad.VoiceActivityGate applied before sending
+        language_code: Transcribe language of the audio
     """
     if not await check_aws_credentials():
         return
 
     try:
         # Initialize the transcription client
-        client = TranscribeStreamingClient(region=REGION)
+        client = get_client()
 
         # Start the transcription stream
         stream = await client.start_stream_transcription(
-            language_code="ar-SA",  # Changed to Arabic (Saudi Arabia)
+            language_code=language_code,
             media_sample_rate_hz=SAMPLE_RATE,
             media_encoding="pcm",
         )
@@ -77,82 +195,189 @@ async def transcribe_audio_stream():
             """
             Stream audio data from file to Amazon Transcribe with proper rate limiting.
             """
+            import aiofile
+            from amazon_transcribe.utils import apply_realtime_delay
+
             async with aiofile.AIOFile(AUDIO_PATH, "rb") as afp:
                 reader = aiofile.Reader(afp, chunk_size=CHUNK_SIZE)
-                await apply_realtime_delay(
-                    stream, 
-                    reader, 
-                    BYTES_PER_SAMPLE, 
-                    SAMPLE_RATE, 
-                    CHANNEL_NUMS
-                )
+                if vad is None:
+                    await apply_realtime_delay(
+                        stream, 
+                        reader, 
+                        BYTES_PER_SAMPLE, 
+                        SAMPLE_RATE, 
+                        CHANNEL_NUMS
+                    )
+                else:
+                    # Pace on source audio: gated silence is not sent, but its time still passes
+                    pacer = Pacer(mode="file", bytes_per_second=SAMPLE_RATE * BYTES_PER_SAMPLE * CHANNEL_NUMS)
+                    async for chunk in reader:
+                        gated = vad.process(chunk)
+                        if gated is not None:
+                            await stream.input_stream.send_audio_event(audio_chunk=gated)
+                        await pacer.pace(len(chunk))
+                    print(vad.report())
             await stream.input_stream.end_stream()
 
         # Set up handler and process events
-        handler = TranscriptionHandler(stream.output_stream)
+        handler = TranscriptionHandler(stream.output_stream, timeline=vad.timeline if vad else None)
         await asyncio.gather(stream_audio_chunks(), handler.handle_events())
 
     except Exception as e:
         print(f"Transcription Error: {str(e)}")
 
 
-async def transcribe_network_stream(audio_stream):
+async def _close_unstarted(first_chunk, audio_iter):
+    """Stop a source whose first chunk was prefetched for a session that never started"""
+    first_chunk.cancel()
+    await asyncio.gather(first_chunk, return_exceptions=True)
+    aclose = getattr(audio_iter, 'aclose', None)
+    if aclose is not None:
+        await aclose()
+
+
+async def transcribe_network_stream(audio_stream, pacing="live", vad=None, language_code="zh-CN",
+                                    endpoint=None, sink=None, channel=None, timeline=None,
+                                    client=None, capture=None, chunk_latency=None,
+                                    partial_results_stability="high"):
     """
     Transcribe audio from a network stream (e.g., ffmpeg output).
     
     Args:
         audio_stream: An async iterator that yields chunks of PCM audio data
                      (16000 Hz, 16-bit, mono)
+        pacing: Pacer mode - "live" for real-time sources, "file" to pace a
+               recorded source at real time, "burst" for faster than real time
+        vad: Optional vad.VoiceActivityGate; non-speech is suppressed or
+             compressed before sending and caption times are mapped back
+        language_code: Transcribe language of the audio; see
+                       language_fanout.transcribe_fanout for several at once
+        endpoint: Optional endpoint override (see create_client)
+        sink: Optional caption sink (write(cue), async close()); finals are
+              segmented into cues and written to it
+        channel: Name stage metrics are recorded under (default: language_code);
+                 pass the source's name (e.g. TSPlayer's channel) so one stream
+                 reports under one label
+        timeline: Optional TimelineMap of gaps in audio_stream itself (e.g.
+                  TSPlayer.timeline under a latency budget)
+        client: Optional Transcribe client to use instead of get_client(endpoint, channel)
+                (e.g. capture.ReplayClient)
+        capture: Optional capture.CaptureWriter; sent audio and received
+                 events are recorded to it
+        chunk_latency: Optional latency target in seconds; audio events are
+                       then coalesced or split to a duration chosen from it
+                       and the measured send cost (pacer.ChunkSizer)
+        partial_results_stability: Stabilization level ("low", "medium" or
+                                   "high") of partial results; stable items
+                                   let the caption segmenter emit early
     """
-    if not await check_aws_credentials():
+    # Start the source (ffmpeg, noise profile) while credentials are checked
+    # and the session is set up, not after
+    audio_iter = aiter(audio_stream)
+    first_chunk = asyncio.ensure_future(anext(audio_iter, b''))
+    if client is None and not is_local_endpoint(endpoint) and not await check_aws_credentials():
+        await _close_unstarted(first_chunk, audio_iter)
         return
 
-    client = None
+    metrics = channel_metrics(channel or language_code)
     stream = None
     stream_task = None
     handler_task = None
 
     try:
         print("Initializing transcription client...")
-        client = TranscribeStreamingClient(region=REGION)
+        if client is None:
+            client = get_client(endpoint, channel)
         
         print("Starting transcription stream...")
         stream = await client.start_stream_transcription(
-            language_code="zh-CN",
+            language_code=language_code,
             media_sample_rate_hz=SAMPLE_RATE,
             media_encoding="pcm",
+            enable_partial_results_stabilization=True,
+            partial_results_stability=partial_results_stability,
         )
+        # Result times are relative to this session's audio
+        metrics.sent_seconds = 0.0
+
+        async def source():
+            yield await first_chunk
+            async for chunk in audio_iter:
+                yield chunk
 
         async def stream_audio():
             """
             Stream audio data from network source to Amazon Transcribe with rate limiting.
             """
             bytes_per_second = SAMPLE_RATE * BYTES_PER_SAMPLE * CHANNEL_NUMS
-            chunk_duration = CHUNK_SIZE / bytes_per_second
+            pacer = Pacer(mode=pacing, bytes_per_second=bytes_per_second)
+            sizer = None
+            if chunk_latency:
+                sizer = ChunkSizer(latency_target=chunk_latency, bytes_per_second=bytes_per_second)
+
+            async def send(event):
+                started = time.perf_counter()
+                await stream.input_stream.send_audio_event(audio_chunk=event)
+                elapsed = time.perf_counter() - started
+                metrics.send_seconds.observe(elapsed)
+                metrics.sent_bytes.inc(len(event))
+                metrics.sent_seconds += len(event) / bytes_per_second
+                if capture is not None:
+                    capture.sent_audio(event)
+                if sizer is not None:
+                    sizer.observe(elapsed, len(event))
+                    metrics.send_chunk_seconds.set(sizer.chunk_seconds)
             
             try:
                 print("Starting to stream audio chunks...")
-                async for chunk in audio_stream:
+                async for chunk in source():
                     if not chunk:
                         break
                     
                     try:
-                        # Send chunk to transcribe
-                        await stream.input_stream.send_audio_event(audio_chunk=chunk)
+                        # Send chunk to transcribe, minus any gated silence
+                        gated = vad.process(chunk) if vad is not None else chunk
+                        if sizer is not None:
+                            for event in sizer.feed(gated):
+                                await send(event)
+                        elif gated is not None:
+                            await send(gated)
                         
-                        # Rate limiting to maintain real-time pace
-                        await asyncio.sleep(chunk_duration)
+                        # Pace against the wall clock (on source audio, not sent audio)
+                        await pacer.pace(len(chunk))
+                        metrics.drift.set(pacer.drift)
                     except asyncio.CancelledError:
                         break
                     except Exception as e:
                         print(f"Error sending audio chunk: {e}")
                         break
+
+                if sizer is not None:
+                    tail = sizer.flush()
+                    if tail:
+                        try:
+                            await send(tail)
+                        except Exception as e:
+                            print(f"Error sending audio chunk: {e}")
+                    sizing = sizer.stats()
+                    print(f"Audio events of {sizing['average_event_seconds'] * 1000:.0f} ms on average, "
+                          f"now {sizing['chunk_seconds'] * 1000:.0f} ms (send cost "
+                          f"{sizing['send_cost'] * 1000:.2f} ms, {sizing['overhead']:.1%} of real time)"
+                          + (f", limited by {sizing['limited']}" if sizing['limited'] else ""))
                     
             except GeneratorExit:
                 print("Audio stream generator closed")
             except Exception as e:
                 print(f"Error streaming audio: {e}")
             finally:
+                stats = pacer.stats()
+                print(f"Sent {stats['sent_seconds']:.1f}s of audio in {stats['elapsed']:.1f}s "
+                      f"(max drift {stats['max_drift']:.2f}s)")
+                # The source audio consumed, on the source timeline, not just up to the last caption
+                end = stats['sent_seconds']
+                mark_session_end(sink, timeline.to_source(end) if timeline is not None else end)
+                if vad is not None:
+                    print(vad.report())
                 if stream and stream.input_stream:
                     try:
                         print("Ending audio stream...")
@@ -161,7 +386,16 @@ async def transcribe_network_stream(audio_stream):
                         print(f"Error ending stream: {e}")
 
         print("Setting up transcription handler...")
-        handler = TranscriptionHandler(stream.output_stream)
+        output_stream = stream.output_stream
+        if capture is not None:
+            from capture import record_events
+            output_stream = record_events(output_stream, capture)
+        if sink is not None:
+            handler = CaptionHandler(timed_results(output_stream, metrics), sink,
+                                     timelines=(vad.timeline if vad else None, timeline), label=language_code)
+        else:
+            handler = TranscriptionHandler(timed_results(output_stream, metrics),
+                                           timeline=vad.timeline if vad else None, timelines=(timeline,))
         
         # Create tasks for streaming and handling
         stream_task = asyncio.create_task(stream_audio())
@@ -174,6 +408,9 @@ async def transcribe_network_stream(audio_stream):
         print(f"Transcription Error: {str(e)}")
     finally:
         # Clean up tasks
+        if stream_task is None:
+            # The session never started; the source was started for it all the same
+            await _close_unstarted(first_chunk, audio_iter)
         if stream_task and not stream_task.done():
             stream_task.cancel()
             try:
@@ -0,0 +1,88 @@
+"""
+Conversion between Transcribe TranscriptEvents and their JSON wire shape
+(Transcript.Results[].Alternatives[].Items[]), used to record, replay and
+script transcription sessions.
+"""
+
+import json
+from amazon_transcribe.model import TranscriptEvent, Transcript, Result, Alternative, Item
+
+
+def event_from_dict(node):
+    """Build a TranscriptEvent from the service's JSON shape"""
+    results = []
+    for r in node.get("Transcript", {}).get("Results", []):
+        alternatives = []
+        for a in r.get("Alternatives", []):
+            items = [
+                Item(
+                    start_time=i.get("StartTime"),
+                    end_time=i.get("EndTime"),
+                    item_type=i.get("Type"),
+                    content=i.get("Content"),
+                    vocabulary_filter_match=i.get("VocabularyFilterMatch"),
+                    speaker=i.get("Speaker"),
+                    confidence=i.get("Confidence"),
+                    stable=i.get("Stable"),
+                )
+                for i in a.get("Items", [])
+            ]
+            alternatives.append(Alternative(a.get("Transcript"), items, None))
+        results.append(Result(
+            result_id=r.get("ResultId"),
+            start_time=r.get("StartTime"),
+            end_time=r.get("EndTime"),
+            is_partial=r.get("IsPartial"),
+            alternatives=alternatives,
+            channel_id=r.get("ChannelId"),
+            language_code=r.get("LanguageCode"),
+        ))
+    return TranscriptEvent(Transcript(results))
+
+
+def event_to_dict(event):
+    """Inverse of event_from_dict (None fields are omitted)"""
+    def strip(d):
+        return {k: v for k, v in d.items() if v is not None}
+
+    results = []
+    for r in event.transcript.results:
+        alternatives = []
+        for a in r.alternatives or []:
+            items = [strip({
+                "StartTime": i.start_time,
+                "EndTime": i.end_time,
+                "Type": i.item_type,
+                "Content": i.content,
+                "VocabularyFilterMatch": i.vocabulary_filter_match,
+                "Speaker": i.speaker,
+                "Confidence": i.confidence,
+                "Stable": i.stable,
+            }) for i in a.items or []]
+            alternatives.append({"Transcript": a.transcript, "Items": items})
+        results.append(strip({
+            "ResultId": r.result_id,
+            "StartTime": r.start_time,
+            "EndTime": r.end_time,
+            "IsPartial": r.is_partial,
+            "Alternatives": alternatives,
+            "ChannelId": r.channel_id,
+            "LanguageCode": r.language_code,
+        }))
+    return {"Transcript": {"Results": results}}
+
+
+def load_event_log(path):
+    """
+    Read a JSON-lines event log. Each line is a wire-shape event plus "t",
+    the arrival time in seconds from the start of the audio.
+    Returns a list of (t, TranscriptEvent).
+    """
+    events = []
+    with open(path, encoding='utf-8') as f:
+        for line in f:
+            line = line.strip()
+            if line:
+                node = json.loads(line)
+                events.append((node.get("t", 0.0), event_from_dict(node)))
+    return events
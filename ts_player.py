@@ -1,17 +1,193 @@
 import asyncio
-import aiohttp
-import subprocess
-import io
+import collections
+import os
+import re
+import time
 from audio_processor import AudioProcessor
+from backpressure import BackpressurePipeline, DegradationController
+from metrics import channel_metrics
+from pcm_ring import PCMRingBuffer, open_pipe, close_pipe
+from resampler import PCMConverter
+from vad import TimelineMap
+
+# ashowinfo log line of one decoded frame (source PTS with -copyts)
+_FRAME_INFO = re.compile(r'pts_time:(-?[\d.]+).*?rate:(\d+).*?nb_samples:(\d+)')
+# Differences between the source gap and the silence sent that are ignored
+GAP_TOLERANCE = 0.1
+PTS_GAP_SLACK = 2.0     # seconds a PTS gap may differ from the outage and still be trusted
+
 
 class TSPlayer:
-    def __init__(self, url):
-        """Initialize TSPlayer with stream URL"""
+    def __init__(self, url, executor=None, input_rate=None, input_channels=None, channel=None,
+                 latency_budget=None, reconnect=None, max_outage=30.0, max_gap_fill=10.0, capture=None):
+        """
+        Initialize TSPlayer with stream URL.
+        An optional DSPExecutor moves noise reduction off the event loop.
+        With input_rate/input_channels (e.g. 48000 and 6 for 5.1) ffmpeg
+        only decodes, and the dialogue-weighted downmix and resampling to
+        16 kHz mono happen in process (resampler.PCMConverter).
+        Stage metrics are recorded under `channel` (default: the URL).
+        With latency_budget (seconds, live sources only) ingest, DSP and
+        send are decoupled by bounded queues and the stream degrades when
+        audio waits longer than the budget (see backpressure.py).
+
+        With reconnect (default: on for network URLs) ffmpeg is restarted
+        with backoff when it exits or fails, for up to `max_outage` seconds,
+        and the stream goes on: the outage is filled with silence in real
+        time so the Transcribe session stays open. Once audio is back, the
+        source PTS (or the wall clock) tells how much was really missed; a
+        remainder up to `max_gap_fill` seconds is filled with silence too,
+        anything else becomes an offset in `timeline`, as do jumps in the
+        PTS while ffmpeg keeps running (a stalled connection resuming at the
+        live edge). Pass `timeline` to the transcriber so captions keep
+        source times.
+
+        With capture (capture.CaptureWriter) the 16 kHz mono source audio is
+        recorded before DSP, so it can be denoised again on replay.
+        """
         self.url = url
+        self.converter = None
+        if input_rate or input_channels:
+            self.converter = PCMConverter(input_rate or 16000, input_channels or 1)
         self._ffmpeg_process = None
-        self.audio_processor = AudioProcessor()
+        self._stdout_fd = None
+        self._stderr_task = None
+        self._stderr_tail = collections.deque(maxlen=20)
+        self.metrics = channel_metrics(channel or url)
+        self.audio_processor = AudioProcessor(executor=executor, metrics=self.metrics)
+        self.latency_budget = latency_budget
+        self.controller = None
+        if reconnect is None:
+            reconnect = '://' in url and not url.startswith('file:')
+        self.reconnect = reconnect
+        self.max_outage = max_outage
+        self.max_gap_fill = max_gap_fill
+        self.backoff_base = 0.5
+        self.backoff_max = 8.0
+        self.restarts = 0
+        self.timeline = TimelineMap() if latency_budget or reconnect else None
+        self.capture = capture
         self._running = False
         self.chunk_size = 4 * 1024  # 4KB chunks to match other components
+        # Format of the chunks handed out: 16 kHz mono unless get_source_stream(convert=False)
+        self.convert = True
+        self.sample_rate = 16000
+        self.channels = 1
+        # ffmpeg output is read in place into a preallocated ring
+        self.ring = PCMRingBuffer(chunk_size=self.chunk_size, n_chunks=32)
+        self._chunks = None
+        # Source PTS of the current ffmpeg run, from its ashowinfo log, and
+        # PTS jumps within it as (seconds of run audio before, gap)
+        self._first_pts = None
+        self._end_pts = None
+        self._pts_seen = asyncio.Event()
+        self._run_decoded = 0.0
+        self._run_output = 0.0
+        self._run_gaps = collections.deque()
+        # Position of the stream handed out so far, and the source time it
+        # corresponds to (they differ by the gaps recorded in timeline)
+        self._stream_time = 0.0
+        self._source_time = 0.0
+        self.chunk_source_time = 0.0
+
+    def _command(self):
+        """ffmpeg command line for the current settings"""
+        command = ['ffmpeg', '-nostats']
+        if self.reconnect:
+            # Keep the source PTS so a restarted run tells how much was missed
+            command += ['-copyts']
+            if self.url.startswith(('http://', 'https://')):
+                # Let ffmpeg retry short HTTP drops itself, and give up on a
+                # stalled connection instead of hanging
+                command += ['-reconnect', '1', '-reconnect_streamed', '1',
+                            '-reconnect_delay_max', '2', '-rw_timeout', '5000000']
+        command += [
+            '-i', self.url,           # Input from TS stream
+            '-vn',                    # Disable video
+        ]
+        if self.reconnect:
+            command += ['-af', 'ashowinfo']  # Logs the PTS of every decoded frame
+        command += [
+            '-acodec', 'pcm_s16le',   # Convert to 16-bit PCM
+            '-ar', str(self.converter.in_rate if self.converter else 16000),  # 16000 Hz unless converted in process
+            '-ac', str(self.converter.in_channels if self.converter else 1),  # Mono unless downmixed in process
+            '-f', 's16le',           # Output format
+            '-bufsize', '4k',         # Match chunk size
+            '-probesize', '32k',      # Smaller probe size for faster start
+            '-analyzeduration', '0',  # Minimize analysis time
+            '-thread_queue_size', '4096',  # Prevent buffer issues
+            'pipe:1'                  # Output to pipe
+        ]
+        return command
+
+    async def _start_ffmpeg(self):
+        # stdout goes to a pipe we read with readv; stderr is drained so a
+        # chatty ffmpeg never blocks on it
+        read_fd, write_fd = open_pipe()
+        self._stdout_fd = read_fd
+        try:
+            process = await asyncio.create_subprocess_exec(
+                *self._command(),
+                stdout=write_fd,
+                stderr=asyncio.subprocess.PIPE
+            )
+        finally:
+            os.close(write_fd)
+        self._ffmpeg_process = process
+        self._first_pts = self._end_pts = None
+        self._pts_seen.clear()
+        self._run_decoded = self._run_output = 0.0
+        self._run_gaps.clear()
+        self._stderr_tail.clear()
+        self._stderr_task = asyncio.create_task(self._drain_stderr(process.stderr))
+        self.ring.restart()
+        self._chunks = self.ring.chunks_from_fd(read_fd)
+
+    async def _drain_stderr(self, stderr):
+        """Keep the last lines of ffmpeg's log and track the source PTS"""
+        async for line in stderr:
+            line = line.decode(errors='replace').rstrip()
+            if 'pts_time:' in line:
+                frame = _FRAME_INFO.search(line)
+                if frame:
+                    pts = float(frame.group(1))
+                    duration = int(frame.group(3)) / int(frame.group(2))
+                    if self._first_pts is None:
+                        self._first_pts = pts
+                        self._pts_seen.set()
+                    elif pts - self._end_pts > GAP_TOLERANCE:
+                        # The source skipped ahead (e.g. a stalled connection resumed live)
+                        self._run_gaps.append((self._run_decoded, pts - self._end_pts))
+                    self._end_pts = pts + duration
+                    self._run_decoded += duration
+                continue
+            self._stderr_tail.append(line)
+
+    async def _stop_ffmpeg(self):
+        process, self._ffmpeg_process = self._ffmpeg_process, None
+        if process is not None:
+            try:
+                # Try graceful termination first
+                if process.returncode is None:
+                    process.terminate()
+                try:
+                    await asyncio.wait_for(process.wait(), timeout=2.0)
+                except asyncio.TimeoutError:
+                    print("Forcing ffmpeg process to close...")
+                    process.kill()  # Force kill if termination takes too long
+                    await process.wait()
+            except Exception as e:
+                print(f"Error closing ffmpeg process: {str(e)}")
+        if self._stderr_task is not None:
+            try:
+                await asyncio.wait_for(self._stderr_task, timeout=1.0)
+            except (asyncio.TimeoutError, asyncio.CancelledError):
+                pass
+            self._stderr_task = None
+        if self._stdout_fd is not None:
+            close_pipe(self._stdout_fd)
+            self._stdout_fd = None
+        self._chunks = None
 
     async def get_audio_stream(self):
         """
@@ -23,51 +199,40 @@ class TSPlayer:
         """
         try:
             self._running = True
-            # Set up ffmpeg command with optimized parameters for streaming
-            command = [
-                'ffmpeg',
-                '-i', self.url,           # Input from TS stream
-                '-vn',                    # Disable video
-                '-acodec', 'pcm_s16le',   # Convert to 16-bit PCM
-                '-ar', '16000',           # Set sample rate to 16000 Hz
-                '-ac', '1',               # Convert to mono
-                '-f', 's16le',           # Output format
-                '-bufsize', '4k',         # Match chunk size
-                '-probesize', '32k',      # Smaller probe size for faster start
-                '-analyzeduration', '0',  # Minimize analysis time
-                '-thread_queue_size', '4096',  # Prevent buffer issues
-                'pipe:1'                  # Output to pipe
-            ]
-
-            # Start ffmpeg process
-            process = await asyncio.create_subprocess_exec(
-                *command,
-                stdout=asyncio.subprocess.PIPE,
-                stderr=asyncio.subprocess.PIPE
-            )
-            self._ffmpeg_process = process
+            await self._start_ffmpeg()
 
             print("Started TS stream capture...")
             print("Collecting noise profile (analyzing first second of audio)...")
 
-            # Read chunks from ffmpeg output
-            while self._running:
-                try:
-                    chunk = await process.stdout.read(self.chunk_size)
-                    if not chunk:
-                        break
-                    
-                    # Process chunk with noise reduction
-                    processed_chunk = await self.audio_processor.process_chunk(chunk)
-                    if processed_chunk is not None:
-                        yield processed_chunk
-
-                except asyncio.CancelledError:
-                    print("TS stream reading cancelled")
-                    break
-                except Exception as e:
-                    print(f"Error reading stream chunk: {str(e)}")
-                    break
+            # Read chunks from ffmpeg output and process them with noise reduction
+            source = self._read_chunks()
+            if self.capture is not None:
+                from capture import record_source
+                source = record_source(source, self.capture)
+            try:
+                if self.latency_budget:
+                    self.controller = DegradationController(self.latency_budget, name=self.metrics.channel,
+                                                            metrics=self.metrics)
+                    pipeline = BackpressurePipeline(source, self.audio_processor,
+                                                    self.controller, timeline=self.timeline,
+                                                    metrics=self.metrics,
+                                                    source_clock=lambda: self.chunk_source_time)
+                    async for chunk in pipeline.chunks():
+                        yield chunk
+                    return
+
+                async for processed_chunk in self.audio_processor.process_stream(source):
+                    yield processed_chunk
+
+                # Emit what the denoiser still holds back
+                tail = await self.audio_processor.drain()
+                if tail is not None:
+                    yield tail
+
+            except asyncio.CancelledError:
+                print("TS stream reading cancelled")
+            except Exception as e:
+                print(f"Error reading stream chunk: {str(e)}")
 
         except Exception as e:
             print(f"Error in TSPlayer: {str(e)}")
@@ -75,24 +240,223 @@ class TSPlayer:
         finally:
             await self.close()
 
+    async def get_source_stream(self, convert=True):
+        """
+        Stream the source audio without noise reduction, for pipelines where
+        denoising is a stage of its own (pipeline.TSSource). Chunks are ring
+        buffer views; outages are bridged as in get_audio_stream.
+        latency_budget does not apply here.
+
+        Args:
+            convert: False to hand out audio in the input_rate/input_channels
+                     format rather than 16 kHz mono, for a conversion stage
+                     downstream; the source audio is then not captured
+        """
+        try:
+            if not convert and self.converter is not None:
+                self.convert = False
+                self.sample_rate = self.converter.in_rate
+                self.channels = self.converter.in_channels
+                self.capture = None
+            self._running = True
+            await self._start_ffmpeg()
+            print("Started TS stream capture...")
+            source = self._read_chunks()
+            if self.capture is not None:
+                from capture import record_source
+                source = record_source(source, self.capture)
+            async for chunk in source:
+                yield chunk
+        finally:
+            await self.close()
+
+    @property
+    def bytes_per_second(self):
+        """Byte rate of the chunks handed out"""
+        return self.sample_rate * self.channels * 2
+
+    def _advance(self, chunk):
+        """Account for a chunk about to be handed out"""
+        duration = len(chunk) / self.bytes_per_second
+        self.chunk_source_time = self._source_time
+        self._stream_time += duration
+        self._source_time += duration
+
+    def _advance_source(self, chunk):
+        """_advance for a chunk from ffmpeg, first applying PTS jumps it has reached"""
+        while self._run_gaps and self._run_gaps[0][0] <= self._run_output + 1e-3:
+            _, gap = self._run_gaps.popleft()
+            self._offset(gap)
+            print(f"[{self.metrics.channel}] source skipped {gap:.2f}s")
+        self._run_output += len(chunk) / self.bytes_per_second
+        self._advance(chunk)
+
+    def _offset(self, gap):
+        """Continue the source timeline `gap` seconds later than the stream"""
+        self._source_time += gap
+        if not self.latency_budget:
+            self.timeline.add(self._stream_time, self._source_time)
+
+    async def _read_chunks(self):
+        """
+        Yield PCM chunks (ring buffer views) from ffmpeg stdout until EOF or
+        close(); with reconnect, outages are bridged (see _bridge_outage)
+        """
+        read_seconds = self.metrics.read_seconds
+        source_bytes = self.metrics.source_bytes
+        while self._running:
+            started = time.perf_counter()
+            try:
+                async for chunk in self._chunks:
+                    read_seconds.observe(time.perf_counter() - started)
+                    source_bytes.inc(len(chunk))
+                    if not self._running:
+                        break
+                    if self.converter is not None and self.convert:
+                        chunk = self.converter.process(chunk)
+                        if not chunk:
+                            started = time.perf_counter()
+                            continue
+                    self._advance_source(chunk)
+                    yield chunk
+                    started = time.perf_counter()
+            except OSError as e:
+                print(f"[{self.metrics.channel}] error reading from ffmpeg: {e}")
+            if not self._running or not self.reconnect:
+                return
+            async for chunk in self._bridge_outage():
+                yield chunk
+
+    async def _bridge_outage(self):
+        """
+        Restart ffmpeg with backoff while sending silence in real time, then
+        reconcile the silence with the gap in the source. Yields the silence
+        and the first chunk of the new run; leaves _running False on giving up.
+        """
+        name = self.metrics.channel
+        process = self._ffmpeg_process
+        if process is not None:
+            # Let ffmpeg exit and the log catch up with the last frames of the run
+            pending = [asyncio.ensure_future(process.wait())]
+            if self._stderr_task is not None:
+                pending.append(self._stderr_task)
+            await asyncio.wait(pending, timeout=0.5)
+            pending[0].cancel()
+        returncode = process.returncode if process is not None else None
+        print(f"[{name}] source lost (ffmpeg {'running' if returncode is None else f'exited with {returncode}'}: "
+              f"{self._last_error()}), reconnecting")
+        end_pts = self._end_pts
+        outage_start = time.monotonic()
+        frame_bytes = self.channels * 2
+        silence = bytes(self.chunk_size // frame_bytes * frame_bytes)
+        silence_seconds = len(silence) / self.bytes_per_second
+        filled = 0.0
+        first = None
+        attempt = 0
+        restart = None
+        try:
+            while first is None:
+                elapsed = time.monotonic() - outage_start
+                if not self._running:
+                    return
+                if elapsed > self.max_outage:
+                    print(f"[{name}] source down for {elapsed:.0f}s, giving up")
+                    self._running = False
+                    return
+                delay = min(self.backoff_max, self.backoff_base * 2 ** attempt)
+                if attempt:
+                    print(f"[{name}] restart failed: {self._last_error()}; retrying in {delay:.1f}s")
+                attempt += 1
+                restart = asyncio.create_task(self._restart(delay))
+                while True:
+                    # Keep the session fed with silence at the pace the audio would have come
+                    due = outage_start + filled + silence_seconds - time.monotonic()
+                    done, _ = await asyncio.wait({restart}, timeout=max(0.0, due))
+                    if done or not self._running:
+                        break
+                    self._advance(silence)
+                    filled += silence_seconds
+                    yield silence
+                if not self._running:
+                    return
+                first = restart.result()
+            restart = None
+        finally:
+            if restart is not None:
+                restart.cancel()
+
+        outage = time.monotonic() - outage_start
+        if end_pts is not None:
+            try:
+                await asyncio.wait_for(self._pts_seen.wait(), timeout=0.5)
+            except asyncio.TimeoutError:
+                pass
+        gap, measured = outage, 'wall clock'
+        if end_pts is not None and self._first_pts is not None:
+            # A source that restarts its clock (WAV, a restarted encoder) gives a
+            # PTS gap that is negative or unrelated to the outage; ignore it then
+            pts_gap = self._first_pts - end_pts
+            if 0 <= pts_gap and abs(pts_gap - outage) <= max(PTS_GAP_SLACK, outage / 2):
+                gap, measured = pts_gap, 'source PTS'
+            else:
+                print(f"[{name}] source PTS moved by {pts_gap:.2f}s over a {outage:.1f}s outage, "
+                      f"using the wall clock")
+        remaining = gap - filled
+        if 0 < remaining <= self.max_gap_fill:
+            while remaining > GAP_TOLERANCE:
+                fill = silence[:min(len(silence), int(remaining * self.sample_rate) * frame_bytes)]
+                self._advance(fill)
+                remaining -= len(fill) / self.bytes_per_second
+                yield fill
+        elif abs(remaining) > GAP_TOLERANCE:
+            # Too much to fill (or the source went back): record an offset instead
+            self._offset(remaining)
+        self.restarts += 1
+        self.metrics.source_restarts.inc()
+        self.metrics.source_outage_seconds.inc(outage)
+        print(f"[{name}] source back after {outage:.1f}s: gap {gap:.2f}s by {measured}, "
+              f"{filled:.1f}s bridged with silence")
+        self._advance_source(first)
+        yield first
+
+    async def _restart(self, delay):
+        """Start a new ffmpeg run after `delay`; returns its first chunk, or None"""
+        await asyncio.sleep(delay)
+        await self._stop_ffmpeg()
+        if not self._running:
+            return None
+        await self._start_ffmpeg()
+        async for chunk in self._chunks:
+            self.metrics.source_bytes.inc(len(chunk))
+            if self.converter is not None and self.convert:
+                chunk = self.converter.process(chunk)
+            if len(chunk):
+                return chunk
+        return None
+
+    def _last_error(self):
+        return self._stderr_tail[-1] if self._stderr_tail else 'no output'
+
+    async def stop(self):
+        """
+        Stop the stream from another task: ffmpeg is terminated and the
+        reader ends at EOF. The pipe and the DSP lane are released by the
+        stream generator itself (close() in its finally), never under a read.
+        """
+        self._running = False
+        process = self._ffmpeg_process
+        if process is None or process.returncode is not None:
+            return
+        process.terminate()
+        try:
+            await asyncio.wait_for(asyncio.shield(process.wait()), timeout=2.0)
+        except asyncio.TimeoutError:
+            process.kill()
+
     async def close(self):
         """Clean up resources"""
         self._running = False
-        
-        if self._ffmpeg_process:
-            try:
-                # Try graceful termination first
-                self._ffmpeg_process.terminate()
-                try:
-                    await asyncio.wait_for(self._ffmpeg_process.wait(), timeout=2.0)
-                except asyncio.TimeoutError:
-                    print("Forcing ffmpeg process to close...")
-                    self._ffmpeg_process.kill()  # Force kill if termination takes too long
-                    await self._ffmpeg_process.wait()
-            except Exception as e:
-                print(f"Error closing ffmpeg process: {str(e)}")
-            finally:
-                self._ffmpeg_process = None
+        await self._stop_ffmpeg()
 
         # Clean up audio processor
         if hasattr(self, 'audio_processor'):
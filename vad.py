@@ -0,0 +1,218 @@
+import bisect
+import numpy as np
+
+OFFSET_EPSILON = 1e-6     # seconds; offsets closer than this are the same
+
+
+class TimelineMap:
+    """
+    Maps time in the audio actually sent to Transcribe back to time in the
+    original source, after the VAD gate has removed or shortened silences.
+
+    The map is a sorted list of breakpoints (sent_time, source_time); between
+    breakpoints sent and source time advance together.
+    """
+
+    def __init__(self):
+        self._sent = [0.0]
+        self._source = [0.0]
+
+    def add(self, sent_time, source_time):
+        """
+        Record that sent audio from sent_time on continues at source_time.
+        A breakpoint that keeps the current offset is not stored, so the map
+        only grows where audio was actually removed or skipped.
+        """
+        if sent_time == self._sent[-1]:
+            self._sent.pop()
+            self._source.pop()
+        if self._sent and abs((source_time - sent_time) - (self._source[-1] - self._sent[-1])) < OFFSET_EPSILON:
+            return
+        self._sent.append(sent_time)
+        self._source.append(source_time)
+
+    def to_source(self, sent_time):
+        """Convert a timestamp reported by Transcribe to source time"""
+        if sent_time is None:
+            return None
+        i = bisect.bisect_right(self._sent, sent_time) - 1
+        return self._source[i] + (sent_time - self._sent[i])
+
+    def __len__(self):
+        return len(self._sent)
+
+
+def remap_result_times(result, timeline):
+    """Rewrite a Transcribe Result's result/item timestamps to source time in place"""
+    result.start_time = timeline.to_source(result.start_time)
+    result.end_time = timeline.to_source(result.end_time)
+    for alt in result.alternatives or []:
+        for item in alt.items or []:
+            item.start_time = timeline.to_source(item.start_time)
+            item.end_time = timeline.to_source(item.end_time)
+
+
+class VoiceActivityGate:
+    """
+    Energy / spectral-flatness voice activity gate for 16-bit mono PCM.
+
+    Frames are classified in a vectorized pass: a frame is speech when its
+    energy is `energy_margin_db` above a tracked noise floor and its spectrum
+    is not flat (noise-like). Speech is extended by a hangover so word tails
+    are kept. Non-speech is then either
+    - 'suppress'ed: dropped, except a short keepalive of silence every
+      `keepalive_interval` seconds so the Transcribe session stays open, or
+    - 'compress'ed: every silent run is shortened to `keep_silence_ms`.
+
+    `timeline` maps sent time back to source time for caption timestamps.
+    """
+
+    MODES = ('suppress', 'compress')
+
+    def __init__(self, sample_rate=16000, mode='compress', frame_ms=20,
+                 energy_margin_db=9.0, flatness_threshold=0.45, hangover_ms=300,
+                 keep_silence_ms=300, keepalive_interval=5.0, keepalive_ms=100,
+                 floor_rise_db_per_second=3.0):
+        if mode not in self.MODES:
+            raise ValueError(f"Unsupported VAD mode: {mode}")
+        self.sample_rate = sample_rate
+        self.mode = mode
+        self.frame_len = int(sample_rate * frame_ms / 1000)
+        self.energy_margin_db = energy_margin_db
+        self.flatness_threshold = flatness_threshold
+        self.hangover_frames = int(hangover_ms / frame_ms)
+        self.keep_silence_frames = int(keep_silence_ms / frame_ms)
+        self.keepalive_frames = int(keepalive_interval * 1000 / frame_ms)
+        self.keepalive_len = int(sample_rate * keepalive_ms / 1000)
+        self.floor_rise_db = floor_rise_db_per_second * frame_ms / 1000
+        self.timeline = TimelineMap()
+        self.reset()
+
+    def reset(self):
+        self._pending = np.zeros(0, dtype=np.int16)
+        self._noise_floor_db = None
+        self._frames_since_speech = self.hangover_frames + 1
+        self.source_samples = 0
+        self.sent_samples = 0
+        self.speech_frames = 0
+        self.total_frames = 0
+
+    @property
+    def suppressed_percent(self):
+        """Percentage of source audio that was not sent"""
+        if not self.source_samples:
+            return 0.0
+        return 100.0 * (1 - self.sent_samples / self.source_samples)
+
+    def _classify(self, frames):
+        """Vectorized speech/non-speech decision per frame"""
+        x = frames.astype(np.float32) / 32768.0
+        energy_db = 10 * np.log10(np.mean(x * x, axis=1) + 1e-10)
+
+        power = np.abs(np.fft.rfft(x, axis=1)) ** 2 + 1e-12
+        flatness = np.exp(np.mean(np.log(power), axis=1)) / np.mean(power, axis=1)
+
+        # Noise floor follows the quietest frames down immediately and rises slowly
+        if self._noise_floor_db is None:
+            self._noise_floor_db = float(np.min(energy_db))
+        rise = self.floor_rise_db * np.arange(1, len(frames) + 1)
+        floor = np.minimum.accumulate(np.minimum(energy_db - rise, self._noise_floor_db)) + rise
+        self._noise_floor_db = float(floor[-1])
+
+        return (energy_db > floor + self.energy_margin_db) & (flatness < self.flatness_threshold)
+
+    def _keep_mask(self, speech):
+        """Apply hangover and the suppress/compress policy to a speech mask"""
+        n = len(speech)
+        idx = np.arange(n)
+        # Distance (in frames) to the most recent speech frame, carrying state
+        last_speech = np.where(speech, idx, -1 - self._frames_since_speech)
+        last_speech = np.maximum.accumulate(last_speech)
+        since_speech = idx - last_speech
+        voiced = since_speech <= self.hangover_frames
+        self._frames_since_speech = int(since_speech[-1])
+
+        # Position within the current silent run (counted after the hangover)
+        silent_pos = since_speech - self.hangover_frames
+        if self.mode == 'compress':
+            keep = voiced | (silent_pos <= self.keep_silence_frames)
+        else:
+            keep = voiced.copy()
+        return voiced, keep, silent_pos
+
+    def process(self, chunk):
+        """
+        Gate one chunk of int16 PCM. Returns the bytes-like audio to send,
+        or None if the whole chunk is suppressed.
+        """
+        samples = np.frombuffer(chunk, dtype=np.int16)
+        if len(self._pending):
+            samples = np.concatenate((self._pending, samples))
+        n_frames = len(samples) // self.frame_len
+        self._pending = samples[n_frames * self.frame_len:].copy()
+        if not n_frames:
+            return None
+
+        frames = samples[:n_frames * self.frame_len].reshape(n_frames, self.frame_len)
+        voiced, keep, silent_pos = self._keep_mask(self._classify(frames))
+        self.speech_frames += int(np.count_nonzero(voiced))
+
+        # (frame index, source frames to send or None for keepalive silence)
+        blocks = [(int(a), int(b)) for a, b in _runs(keep)]
+        if self.mode == 'suppress' and self.keepalive_frames:
+            keepalive = (silent_pos > 0) & (silent_pos % self.keepalive_frames == 0) & ~keep
+            blocks.extend((int(i), None) for i in np.flatnonzero(keepalive))
+            blocks.sort()
+
+        out = []
+        sent = self.sent_samples
+        for start, end in blocks:
+            source_time = (self.source_samples + start * self.frame_len) / self.sample_rate
+            self.timeline.add(sent / self.sample_rate, source_time)
+            if end is None:
+                block = np.zeros(self.keepalive_len, dtype=np.int16)
+            else:
+                block = frames[start:end].reshape(-1)
+            out.append(block)
+            sent += len(block)
+
+        self.total_frames += n_frames
+        self.source_samples += n_frames * self.frame_len
+        self.sent_samples = sent
+        if not out:
+            return None
+        return np.concatenate(out).view(np.uint8).data
+
+    def has_speech(self, chunk):
+        """
+        Classify a chunk without gating it: True when any of its frames is
+        speech or within the hangover after speech. Trailing partial frames
+        are ignored. Uses the same noise floor state as process().
+        """
+        samples = np.frombuffer(chunk, dtype=np.int16)
+        n_frames = len(samples) // self.frame_len
+        if not n_frames:
+            return True
+        frames = samples[:n_frames * self.frame_len].reshape(n_frames, self.frame_len)
+        voiced, _, _ = self._keep_mask(self._classify(frames))
+        return bool(voiced.any())
+
+    def stats(self):
+        return {
+            'mode': self.mode,
+            'source_seconds': self.source_samples / self.sample_rate,
+            'sent_seconds': self.sent_samples / self.sample_rate,
+            'speech_percent': 100.0 * self.speech_frames / self.total_frames if self.total_frames else 0.0,
+            'suppressed_percent': self.suppressed_percent,
+        }
+
+    def report(self):
+        stats = self.stats()
+        return (f"VAD ({stats['mode']}): sent {stats['sent_seconds']:.1f}s of "
+                f"{stats['source_seconds']:.1f}s, suppressed {stats['suppressed_percent']:.1f}%")
+
+
+def _runs(mask):
+    """(start, end) index pairs of the True runs in a boolean array"""
+    edges = np.flatnonzero(np.diff(np.concatenate(([False], mask, [False])).astype(np.int8)))
+    return zip(edges[::2], edges[1::2])